@@ -0,0 +1,1222 @@
+#!/usr/bin/env python3
+"""
+Reddit Sports Search Benchmarks
+
+Micro-benchmarks and parity checks for the search and indexing pipeline.
+Run a single benchmark by name, e.g. `python benchmark.py pagerank`.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+import numpy as np
+
+# Fix for numpy float type compatibility
+np.float_ = np.float64
+
+from elasticsearch import TransportError, helpers
+from elasticsearch.serializer import JSONSerializer
+from fastapi.testclient import TestClient
+
+from es_client import get_client
+from search_cache import LRUSearchCache
+from local_index import build_local_index, open_local_index, reset_local_index
+from signal_store import SignalStore, SignalStoreWriter
+from semantic_index import build_semantic_index, open_semantic_index, reset_semantic_index
+from near_duplicates import DuplicateDetector, page_redundancy
+from indexer import (BULK_LOAD_SETTINGS, INDEX_PROFILES, create_es_index, finalize_index,
+                     index_documents_in_es, prepare_document)
+import indexer
+import search_index
+from main import app
+from reranking import DEFAULT_SCORER, FEATURES, feature_matrix, hit_signals, rerank
+from search_index import (build_search_query, calculate_pagerank_score, search_batch_async,
+                          search_documents, search_documents_async, search_facets_async, suggest_async)
+
+
+def _legacy_pagerank(posts, damping_factor=0.85):
+    """
+    Reference copy of the original pure-Python PageRank loop, kept for parity checks.
+
+    Args:
+        posts (list): Hits as returned by Elasticsearch
+        damping_factor (float): Damping factor
+
+    Returns:
+        dict: Mapping of post IDs to PageRank scores
+    """
+    scores = {}
+    post_ids = []
+    for post in posts:
+        post_id = post.get('_id', '')
+        metadata = post.get('_source', {}).get('metadata', {})
+        post_ids.append(post_id)
+        comment_factor = np.log1p(metadata.get('num_comments', 0))
+        vote_factor = np.log1p(metadata.get('score', 0))
+        scores[post_id] = 0.5 * comment_factor + 0.5 * vote_factor
+
+    total_score = sum(scores.values()) or 1
+    for post_id in scores:
+        scores[post_id] /= total_score
+
+    for _ in range(10):
+        new_scores = {post_id: (1 - damping_factor) / len(posts) for post_id in post_ids}
+        for i, post1 in enumerate(posts):
+            post1_id = post1.get('_id', '')
+            post1_comments = post1.get('_source', {}).get('metadata', {}).get('num_comments', 0)
+            outgoing_score = 0
+            for j, post2 in enumerate(posts):
+                if i == j:
+                    continue
+                post2_id = post2.get('_id', '')
+                post2_comments = post2.get('_source', {}).get('metadata', {}).get('num_comments', 0)
+                similarity = min(post1_comments, post2_comments) / max(max(post1_comments, post2_comments), 1)
+                new_scores[post2_id] += damping_factor * scores[post1_id] * similarity
+                outgoing_score += similarity
+            if outgoing_score < 0.001:
+                for post2_id in post_ids:
+                    if post1_id != post2_id:
+                        new_scores[post2_id] += damping_factor * scores[post1_id] / (len(posts) - 1)
+        scores = new_scores
+
+    return scores
+
+
+def make_synthetic_hits(n, seed=42):
+    """
+    Generate Elasticsearch-shaped hits with Reddit-like vote and comment distributions.
+
+    Args:
+        n (int): Number of hits to generate
+        seed (int): Random seed
+
+    Returns:
+        list: Synthetic hits with `_id`, `_score` and `_source.metadata`
+    """
+    rng = np.random.default_rng(seed)
+    comments = rng.zipf(1.8, n).clip(max=50000) - 1
+    votes = rng.zipf(1.6, n).clip(max=200000) - 1
+    return [
+        {
+            "_id": str(i),
+            "_score": float(n - i),
+            "_source": {
+                "metadata": {
+                    "post_id": f"p{i}",
+                    "num_comments": int(comments[i]),
+                    "score": int(votes[i]),
+                }
+            },
+        }
+        for i in range(n)
+    ]
+
+
+def make_synthetic_posts(n, seed=42):
+    """
+    Generate raw Reddit post objects in the format written by the crawler.
+
+    Args:
+        n (int): Number of posts to generate
+        seed (int): Random seed
+
+    Returns:
+        list: Post objects as found in posts.json
+    """
+    rng = np.random.default_rng(seed)
+    words = np.array(["nba", "trade", "premier", "league", "goal", "keeper", "mistake", "playoffs",
+                      "injury", "transfer", "season", "coach", "final", "record", "fans", "match"])
+    sports = ["basketball", "soccer", "football", "baseball", "hockey"]
+    posts = []
+    for i in range(n):
+        sport = sports[i % len(sports)]
+        posts.append({
+            "Subreddit": f"{sport}_sub{i % 20}",
+            "Subreddit URL": f"https://www.reddit.com/r/{sport}_sub{i % 20}/",
+            "Title": " ".join(rng.choice(words, 8)),
+            "Post Text": " ".join(rng.choice(words, int(rng.integers(0, 200)))),
+            "ID": f"p{i:07d}",
+            "Score": int(rng.zipf(1.6) - 1),
+            "Total Comments": int(rng.zipf(1.8) - 1),
+            "Post URL": f"https://www.reddit.com/r/{sport}_sub{i % 20}/comments/p{i:07d}/",
+            "Sports category": sport,
+            "Upvote Ratio": float(rng.uniform(0.5, 1.0)),
+            "Awards": int(rng.poisson(0.2)),
+            "Time": f"2025-{1 + i % 12:02d}-{1 + i % 28:02d} 12:00:00",
+        })
+    return posts
+
+
+def make_topical_posts(n, topics=200, seed=42):
+    """
+    Generate posts whose words come from a few hundred overlapping topics.
+
+    make_synthetic_posts draws every word from one small list, so its posts
+    have no topics for the semantic index to find; these posts are grouped
+    like real discussions, each mixing a topic's vocabulary with common words.
+
+    Args:
+        n (int): Number of posts to generate
+        topics (int): Number of topics
+        seed (int): Random seed
+
+    Returns:
+        tuple: (post objects as found in posts.json, list of the words of each topic)
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array([f"w{i:05d}" for i in range(20 * topics)])
+    common = np.array(["game", "team", "season", "fans", "win", "play", "coach", "league"])
+    topic_words = [rng.choice(vocabulary, 40, replace=False) for _ in range(topics)]
+    posts = make_synthetic_posts(n, seed)
+    for post, topic in zip(posts, rng.integers(0, topics, n)):
+        length = int(rng.integers(5, 120))
+        words = np.where(rng.random(length) < 0.7, rng.choice(topic_words[topic], length), rng.choice(common, length))
+        post["Title"] = " ".join(words[:8])
+        post["Post Text"] = " ".join(words[8:])
+    return posts, topic_words
+
+
+def _time_call(func, *args, repeat=3):
+    """Return the best wall-clock time in seconds over `repeat` calls."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark_pagerank(sizes=(10, 100, 1000, 5000), legacy_limit=1000):
+    """
+    Compare the vectorized PageRank against the original loop and check ranking parity.
+
+    Args:
+        sizes (tuple): Hit-set sizes to benchmark
+        legacy_limit (int): Largest size at which the O(n^2) legacy loop is still timed
+    """
+    print(f"{'n':>6} {'vectorized (ms)':>16} {'legacy (ms)':>12} {'speedup':>8}  parity")
+    for n in sizes:
+        hits = make_synthetic_hits(n)
+        fast = _time_call(calculate_pagerank_score, hits)
+
+        if n > legacy_limit:
+            print(f"{n:>6} {fast * 1000:>16.2f} {'-':>12} {'-':>8}  skipped")
+            continue
+
+        start = time.perf_counter()
+        expected = _legacy_pagerank(hits)
+        slow = time.perf_counter() - start
+        actual = calculate_pagerank_score(hits, tolerance=0)
+        same_values = np.allclose([actual[k] for k in expected], list(expected.values()), rtol=1e-9)
+        # Early exit may only reorder posts whose legacy scores are tied
+        converged = calculate_pagerank_score(hits)
+        ranked = [converged[k] for k in sorted(expected, key=expected.get, reverse=True)]
+        same_order = all(a >= b * (1 - 1e-9) for a, b in zip(ranked, ranked[1:]))
+        parity = "ok" if same_values and same_order else "MISMATCH"
+        print(f"{n:>6} {fast * 1000:>16.2f} {slow * 1000:>12.2f} {slow / fast:>7.0f}x  {parity}")
+
+
+def benchmark_bulk_load(n=50000):
+    """
+    Compare bulk-load time with default index settings and with BULK_LOAD_SETTINGS.
+
+    Requires a running cluster. Uses temporary indices that are deleted afterwards.
+
+    Args:
+        n (int): Number of synthetic documents to load
+    """
+    es = get_client()
+    documents = [prepare_document(post) for post in make_synthetic_posts(n)]
+    print(f"{'settings':>12} {'load (s)':>9} {'finalize (s)':>13} {'docs/sec':>9}")
+    for label, settings in (("default", None), ("bulk-load", BULK_LOAD_SETTINGS)):
+        index_name = f"benchmark_bulk_load_{label}"
+        es.indices.delete(index=index_name, ignore=[404])
+        create_es_index(es, index_name, settings=settings)
+        try:
+            start = time.perf_counter()
+            index_documents_in_es(es, index_name, iter(documents))
+            loaded = time.perf_counter() - start
+            finalize_start = time.perf_counter()
+            if settings:
+                finalize_index(es, index_name)
+            else:
+                es.indices.refresh(index=index_name)
+            finalized = time.perf_counter() - finalize_start
+            print(f"{label:>12} {loaded:>9.2f} {finalized:>13.2f} {n / (loaded + finalized):>9.0f}")
+        finally:
+            es.indices.delete(index=index_name, ignore=[404])
+
+
+SAMPLE_QUERIES = ["nba trade", "premier league", "goal keeper", "playoffs", "injury update",
+                  "transfer news", "world series", "stanley cup", "coach fired", "record"]
+
+
+async def _search_load(search, concurrency, total_requests):
+    """Run `total_requests` searches with `concurrency` concurrent clients; return requests/sec."""
+    queue = asyncio.Queue()
+    for i in range(total_requests):
+        queue.put_nowait(SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)])
+
+    async def client():
+        while not queue.empty():
+            await search(queue.get_nowait())
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return total_requests / (time.perf_counter() - start)
+
+
+def benchmark_search_concurrency(concurrency_levels=(1, 16, 64), total_requests=640):
+    """
+    Compare search throughput of the blocking and the async search path under concurrency.
+
+    "blocking" calls search_documents from coroutines, as the API did before, which
+    blocks the event loop for every round trip; "async" awaits search_documents_async.
+    Requires a running cluster.
+
+    Args:
+        concurrency_levels (tuple): Numbers of concurrent clients
+        total_requests (int): Searches per measurement
+    """
+    async def blocking(query):
+        return search_documents(query, count=10)
+
+    async def non_blocking(query):
+        return await search_documents_async(query, count=10)
+
+    async def run():
+        search_index.open_async_client()
+        try:
+            for concurrency in concurrency_levels:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    before = await _search_load(blocking, concurrency, total_requests)
+                    after = await _search_load(non_blocking, concurrency, total_requests)
+                print(f"{concurrency:>12} {before:>15.1f} {after:>12.1f}")
+        finally:
+            await search_index.close_async_client()
+
+    print(f"{'concurrency':>12} {'blocking req/s':>15} {'async req/s':>12}")
+    asyncio.run(run())
+
+
+def _legacy_unique_hits(hits):
+    """Reference copy of the original Python dedup loop (by metadata url/id, else _id)."""
+    unique_hits = []
+    seen_identifiers = set()
+    for hit in hits:
+        metadata = hit.get('_source', {}).get('metadata', {})
+        identifier = metadata.get('url') or metadata.get('id') or hit.get('_id')
+        if identifier is not None and identifier not in seen_identifiers:
+            seen_identifiers.add(identifier)
+            unique_hits.append(hit)
+    return unique_hits
+
+
+def _legacy_combined_query(query, count=10, weight_score=1.0, weight_time=1.0):
+    """Reference copy of the original function_score body of the combined sort."""
+    return {
+        "query": {
+            "function_score": {
+                "query": {"query_string": {"query": query}},
+                "functions": [
+                    {"field_value_factor": {"field": "metadata.score", "factor": weight_score,
+                                            "modifier": "log1p", "missing": 1}},
+                    {"gauss": {"metadata.time": {"scale": "30d", "decay": 0.5, "offset": "7d"}}, "weight": weight_time}
+                ],
+                "boost_mode": "multiply",
+                "score_mode": "sum"
+            }
+        },
+        "size": count,
+        "collapse": {"field": "metadata.post_id"}
+    }
+
+
+def _collapsed(body, collapse):
+    """Copy of a search body with or without the collapse on the post ID."""
+    body = {key: value for key, value in body.items() if key != "collapse"}
+    if collapse:
+        body["collapse"] = {"field": "metadata.post_id"}
+    return body
+
+
+def benchmark_combined(n=100000, count=10, repeat=30):
+    """
+    Compare the rank_feature based combined sort with the original function_score version.
+
+    Loads `n` synthetic posts into a temporary index and replays broad queries
+    that match most of the corpus, where function_score has to score every
+    match. Both are run with and without collapsing on the post ID, since the
+    collapse also makes Elasticsearch score every match. Requires a running cluster.
+
+    Args:
+        n (int): Number of synthetic documents to load
+        count (int): Results per search
+        repeat (int): Searches per query and approach
+    """
+    es = get_client()
+    index_name = "benchmark_combined"
+    es.indices.delete(index=index_name, ignore=[404])
+    create_es_index(es, index_name, settings=BULK_LOAD_SETTINGS)
+    try:
+        index_documents_in_es(es, index_name, (prepare_document(post) for post in make_synthetic_posts(n)))
+        finalize_index(es, index_name)
+
+        broad_queries = ["trade", "season OR final", "fans match", "league goal coach", "record OR playoffs OR injury"]
+        matches = [es.count(index=index_name, body={"query": {"query_string": {"query": query}}})["count"]
+                   for query in broad_queries]
+        print(f"Broad queries match {np.mean(matches) / n:.0%} of the corpus on average\n")
+        print(f"{'approach':>15} {'collapse':>9} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+        for label, build in (
+            ("function_score", lambda query: _legacy_combined_query(query, count)),
+            ("rank_feature", lambda query: build_search_query(query, count, sort_method="combined")),
+        ):
+            for collapse in (True, False):
+                latencies = []
+                for query in broad_queries:
+                    body = _collapsed(build(query), collapse)
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        es.search(index=index_name, body=body, request_cache=False)
+                        latencies.append(time.perf_counter() - start)
+                p50, p95 = np.percentile(latencies, [50, 95]) * 1000
+                print(f"{label:>15} {'yes' if collapse else 'no':>9} {p50:>9.2f} {p95:>9.2f}")
+    finally:
+        es.indices.delete(index=index_name, ignore=[404])
+
+
+def benchmark_dedup(n=20000, copies=3, count=10, repeat=20):
+    """
+    Compare Python-side deduplication with field collapsing on metadata.post_id.
+
+    Loads `n` synthetic posts, each indexed `copies` times under generated IDs
+    as older indices were, then reports unique posts returned, response size and
+    median latency for both approaches. Requires a running cluster; the
+    temporary index is deleted afterwards.
+
+    Args:
+        n (int): Number of distinct posts
+        copies (int): Times each post is indexed
+        count (int): Results requested per search
+        repeat (int): Searches per query and approach
+    """
+    es = get_client()
+    index_name = "benchmark_dedup"
+    documents = [prepare_document(post) for post in make_synthetic_posts(n)]
+    es.indices.delete(index=index_name, ignore=[404])
+    create_es_index(es, index_name, settings=BULK_LOAD_SETTINGS)
+    try:
+        helpers.bulk(es, ({"_index": index_name, "_source": doc} for doc in documents for _ in range(copies)))
+        finalize_index(es, index_name)
+
+        print(f"{'approach':>9} {'unique/req':>11} {'bytes/req':>10} {'median (ms)':>12}")
+        for label in ("python", "collapse"):
+            unique, sizes, latencies = [], [], []
+            for query in SAMPLE_QUERIES:
+                body = build_search_query(query, count=count)
+                if label == "python":
+                    body.pop("collapse")
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    response = es.search(index=index_name, body=body, request_cache=False)
+                    hits = response['hits']['hits']
+                    if label == "python":
+                        hits = _legacy_unique_hits(hits)
+                    latencies.append(time.perf_counter() - start)
+                sizes.append(len(json.dumps(response)))
+                unique.append(len({hit['_source']['metadata']['post_id'] for hit in hits}))
+            print(f"{label:>9} {np.mean(unique):>11.1f} {np.mean(sizes):>10.0f} "
+                  f"{np.median(latencies) * 1000:>12.2f}")
+    finally:
+        es.indices.delete(index=index_name, ignore=[404])
+
+
+def benchmark_facets(count=10, repeat=20):
+    """
+    Measure the latency facets add to a search.
+
+    Compares a plain search, the same search with its facet request run
+    concurrently (as /search?facets=true does), and the facet request alone.
+    After the first run of each query the size 0 facet request is served from
+    the shard request cache. Runs against the live index, so it must have been
+    built first.
+
+    Args:
+        count (int): Results per search
+        repeat (int): Searches per query and approach
+    """
+    async def plain(query):
+        await search_documents_async(query, count=count)
+
+    async def with_facets(query):
+        await asyncio.gather(search_documents_async(query, count=count), search_facets_async(query))
+
+    async def facets_only(query):
+        await search_facets_async(query)
+
+    async def run():
+        search_index.open_async_client()
+        try:
+            timings = {}
+            for label, func in (("search", plain), ("search+facets", with_facets), ("facets only", facets_only)):
+                timings[label] = []
+                for query in SAMPLE_QUERIES:
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        await func(query)
+                        timings[label].append(time.perf_counter() - start)
+            return timings
+        finally:
+            await search_index.close_async_client()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        timings = asyncio.run(run())
+    print(f"{'approach':>14} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+    for label, values in timings.items():
+        p50, p95 = np.percentile(values, [50, 95]) * 1000
+        print(f"{label:>14} {p50:>9.2f} {p95:>9.2f}")
+
+
+def benchmark_filters(n=50000, count=10, repeat=50):
+    """
+    Compare sport/subreddit/time filters in filter context with the same
+    restrictions written into the query string.
+
+    Loads `n` synthetic posts into a temporary index and reports the median
+    latency of repeated searches, with the shard request cache disabled so the
+    filter bitset cache is what is measured. Requires a running cluster.
+
+    Args:
+        n (int): Number of synthetic documents to load
+        count (int): Results per search
+        repeat (int): Searches per query and approach
+    """
+    es = get_client()
+    index_name = "benchmark_filters"
+    es.indices.delete(index=index_name, ignore=[404])
+    create_es_index(es, index_name, settings=BULK_LOAD_SETTINGS)
+    try:
+        index_documents_in_es(es, index_name, (prepare_document(post) for post in make_synthetic_posts(n)))
+        finalize_index(es, index_name)
+
+        restrictions = [
+            ({"sport": "basketball"}, "metadata.sport:basketball"),
+            ({"sport": "soccer", "subreddit": "soccer_sub1"}, 'metadata.sport:soccer AND metadata.subreddit:"soccer_sub1"'),
+            ({"time_from": "2025-03-01", "time_to": "2025-06-30"}, "metadata.time:[2025-03-01 TO 2025-06-30]"),
+        ]
+        print(f"{'approach':>13} {'median (ms)':>12}")
+        timings = {"query string": [], "filter": []}
+        for filters, lucene in restrictions:
+            for query in SAMPLE_QUERIES:
+                for label, body in (
+                    ("query string", build_search_query(f"({query}) AND {lucene}", count)),
+                    ("filter", build_search_query(query, count, **filters)),
+                ):
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        es.search(index=index_name, body=body, request_cache=False)
+                        timings[label].append(time.perf_counter() - start)
+        for label, values in timings.items():
+            print(f"{label:>13} {np.median(values) * 1000:>12.2f}")
+    finally:
+        es.indices.delete(index=index_name, ignore=[404])
+
+
+# User input that the Lucene query_string parser rejects
+MALFORMED_QUERIES = ["nba AND (", "\"unbalanced quote", "trade OR", "goal/keeper", "[2024 TO", "coach^", "fans:"]
+
+
+def benchmark_index_profile(n=50000, count=10, repeat=20):
+    """
+    Compare the "standard" and "lean" mapping profiles.
+
+    Loads the same `n` synthetic posts with each profile and reports index bytes
+    per document after the force-merge, indexing throughput, and search latency
+    in both query modes, plus how many top results the profiles share.
+    Requires a running cluster; the temporary indices are deleted afterwards.
+
+    Args:
+        n (int): Number of synthetic documents to load
+        count (int): Results per search
+        repeat (int): Searches per query, mode and profile
+    """
+    es = get_client()
+    posts = make_synthetic_posts(n)
+    top_hits = {}
+    print(f"{'profile':>9} {'bytes/doc':>10} {'docs/sec':>9} {'query_string p50':>17} {'targeted p50':>13}")
+    for profile in INDEX_PROFILES:
+        index_name = f"benchmark_profile_{profile}"
+        documents = [prepare_document(post, profile=profile) for post in posts]
+        es.indices.delete(index=index_name, ignore=[404])
+        create_es_index(es, index_name, settings=BULK_LOAD_SETTINGS, profile=profile)
+        try:
+            start = time.perf_counter()
+            index_documents_in_es(es, index_name, iter(documents))
+            finalize_index(es, index_name)
+            throughput = n / (time.perf_counter() - start)
+            store = es.indices.stats(index=index_name, metric="store")["_all"]["primaries"]["store"]["size_in_bytes"]
+
+            medians = []
+            for query_mode in ("query_string", "targeted"):
+                latencies = []
+                for query in SAMPLE_QUERIES:
+                    body = build_search_query(query, count, query_mode=query_mode)
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        response = es.search(index=index_name, body=body, request_cache=False)
+                        latencies.append(time.perf_counter() - start)
+                    top_hits[profile, query_mode, query] = {hit["_id"] for hit in response["hits"]["hits"]}
+                medians.append(np.median(latencies) * 1000)
+            print(f"{profile:>9} {store / n:>10.0f} {throughput:>9.0f} {medians[0]:>17.2f} {medians[1]:>13.2f}")
+        finally:
+            es.indices.delete(index=index_name, ignore=[404])
+
+    for query_mode in ("query_string", "targeted"):
+        shared = [len(top_hits["standard", query_mode, query] & top_hits["lean", query_mode, query]) / count
+                  for query in SAMPLE_QUERIES]
+        print(f"shared top-{count} results ({query_mode}): {np.mean(shared):.0%}")
+
+
+def benchmark_query_mode(n=50000, count=10, repeat=20):
+    """
+    Replay the sample and malformed queries in the 'query_string' and 'targeted' query modes.
+
+    Loads `n` synthetic posts into a temporary index and reports, per mode, the
+    median and p95 latency of the sample queries, how many malformed queries
+    failed, and how many top results the modes share. Also prints the index
+    size; targeted mode reads the existing fields, so it needs no extra
+    storage. Requires a running cluster.
+
+    Args:
+        n (int): Number of synthetic documents to load
+        count (int): Results per search
+        repeat (int): Searches per query and mode
+    """
+    es = get_client()
+    index_name = "benchmark_query_mode"
+    es.indices.delete(index=index_name, ignore=[404])
+    create_es_index(es, index_name, settings=BULK_LOAD_SETTINGS)
+    try:
+        index_documents_in_es(es, index_name, (prepare_document(post) for post in make_synthetic_posts(n)))
+        finalize_index(es, index_name)
+        store = es.indices.stats(index=index_name, metric="store")["_all"]["primaries"]["store"]["size_in_bytes"]
+        print(f"index size: {store / 1024 / 1024:.1f} MB ({store / n:.0f} bytes/doc)\n")
+
+        top_hits = {}
+        print(f"{'mode':>13} {'p50 (ms)':>9} {'p95 (ms)':>9} {'parse errors':>13}")
+        for query_mode in ("query_string", "targeted"):
+            latencies = []
+            for query in SAMPLE_QUERIES:
+                body = build_search_query(query, count, query_mode=query_mode)
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    response = es.search(index=index_name, body=body, request_cache=False)
+                    latencies.append(time.perf_counter() - start)
+                top_hits[query_mode, query] = [hit["_id"] for hit in response["hits"]["hits"]]
+            errors = 0
+            for query in MALFORMED_QUERIES:
+                try:
+                    es.search(index=index_name, body=build_search_query(query, count, query_mode=query_mode))
+                except TransportError:
+                    errors += 1
+            p50, p95 = np.percentile(latencies, [50, 95]) * 1000
+            print(f"{query_mode:>13} {p50:>9.2f} {p95:>9.2f} {errors:>6}/{len(MALFORMED_QUERIES)}")
+
+        shared = [len(set(top_hits["query_string", query]) & set(top_hits["targeted", query])) / count
+                  for query in SAMPLE_QUERIES]
+        print(f"\nshared top-{count} results: {np.mean(shared):.0%}")
+    finally:
+        es.indices.delete(index=index_name, ignore=[404])
+
+
+def benchmark_response_size(count=10, repeat=20):
+    """
+    Compare full and compact /search results: response bytes and p95 latency.
+
+    Latency covers the search, result formatting and JSON encoding, as served
+    by the API. Runs against the live index, so it must have been built first.
+
+    Args:
+        count (int): Results per search
+        repeat (int): Searches per query and mode
+    """
+    print(f"{'mode':>8} {'bytes/req':>10} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+    for compact in (False, True):
+        sizes, latencies = [], []
+        for query in SAMPLE_QUERIES:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    results = search_documents(query, count=count, compact=compact)
+                body = json.dumps({"status": "success", "data": results}, default=str)
+                latencies.append(time.perf_counter() - start)
+            sizes.append(len(body.encode("utf-8")))
+        label = "compact" if compact else "full"
+        p50, p95 = np.percentile(latencies, [50, 95]) * 1000
+        print(f"{label:>8} {np.mean(sizes):>10.0f} {p50:>9.2f} {p95:>9.2f}")
+
+
+def benchmark_batch_search(batch_size=20, repeat=10):
+    """
+    Compare a /search/batch style multi-search with the same searches run one by one.
+
+    Reports the median time of the sequential searches (sum), of the slowest
+    single search, and of one multi-search for the whole batch. Runs against
+    the live index, so it must have been built first.
+
+    Args:
+        batch_size (int): Searches per batch
+        repeat (int): Measurements per approach
+    """
+    searches = [
+        {"query": SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)], "count": 10,
+         "sort_method": ("relevance", "score", "time", "combined")[i % 4], "use_pagerank": i % 2 == 1}
+        for i in range(batch_size)
+    ]
+
+    async def run():
+        search_index.open_async_client()
+        try:
+            sequential, slowest, batched = [], [], []
+            for _ in range(repeat):
+                timings = []
+                for search in searches:
+                    start = time.perf_counter()
+                    await search_documents_async(**search)
+                    timings.append(time.perf_counter() - start)
+                sequential.append(sum(timings))
+                slowest.append(max(timings))
+                start = time.perf_counter()
+                await search_batch_async(searches)
+                batched.append(time.perf_counter() - start)
+            return sequential, slowest, batched
+        finally:
+            await search_index.close_async_client()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        sequential, slowest, batched = asyncio.run(run())
+    print(f"{'approach':>16} {'median (ms)':>12}")
+    for label, timings in (("sequential sum", sequential), ("slowest single", slowest), ("multi-search", batched)):
+        print(f"{label:>16} {np.median(timings) * 1000:>12.2f}")
+
+
+def benchmark_suggest(users=16, keystroke_interval=0.1, rounds=5):
+    """
+    Measure /suggest latency while simulated users type the sample queries.
+
+    Each user sends one suggestion request per keystroke, `keystroke_interval`
+    seconds apart. Reports p50/p99 of the suggester itself and of the endpoint's
+    path through the prefix cache. Runs against the live index, so it must have
+    been built first.
+
+    Args:
+        users (int): Concurrent typing users
+        keystroke_interval (float): Seconds between keystrokes of one user
+        rounds (int): Times each user types every sample query
+    """
+    async def run():
+        search_index.open_async_client()
+        cache = LRUSearchCache()
+        try:
+            suggester, cached_path = [], []
+
+            async def user(offset):
+                for i in range(rounds * len(SAMPLE_QUERIES)):
+                    query = SAMPLE_QUERIES[(offset + i) % len(SAMPLE_QUERIES)]
+                    for end in range(1, len(query) + 1):
+                        prefix = query[:end]
+                        start = time.perf_counter()
+                        await suggest_async(prefix)
+                        suggester.append(time.perf_counter() - start)
+
+                        start = time.perf_counter()
+                        suggestions, generation = cache.get(prefix)
+                        if suggestions is None:
+                            cache.set(prefix, await suggest_async(prefix), generation)
+                        cached_path.append(time.perf_counter() - start)
+                        await asyncio.sleep(keystroke_interval)
+
+            await asyncio.gather(*(user(offset) for offset in range(users)))
+            return suggester, cached_path
+        finally:
+            await search_index.close_async_client()
+
+    suggester, cached_path = asyncio.run(run())
+    print(f"{'path':>10} {'requests':>9} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    for label, values in (("suggester", suggester), ("cached", cached_path)):
+        p50, p99 = np.percentile(values, [50, 99]) * 1000
+        print(f"{label:>10} {len(values):>9} {p50:>9.2f} {p99:>9.2f}")
+
+
+def benchmark_rerank(sizes=(100, 1000, 5000), count=10):
+    """
+    Time the second stage of the rerank sort and check its top-k selection.
+
+    Splits the cost between reading the hit signals and scoring the feature
+    matrix, and checks that the partial selection returns the same hits as a
+    full sort of the scores.
+
+    Args:
+        sizes (tuple): Candidate-set sizes to benchmark
+        count (int): Results returned per search
+    """
+    print(f"{'n':>6} {'signals (ms)':>13} {'scoring (ms)':>13} {'total (ms)':>11}  parity")
+    for n in sizes:
+        hits = make_synthetic_hits(n)
+        for i, hit in enumerate(hits):
+            hit["_source"]["metadata"]["time"] = f"2024-{1 + i % 12:02d}-{1 + i % 28:02d} 12:00:00"
+        pagerank_scores = calculate_pagerank_score(hits)
+        names = list(FEATURES)
+        group_weights = {"relevance": 1.0, "popularity": 1.0, "recency": 1.0}
+
+        signals_time = _time_call(hit_signals, hits, pagerank_scores)
+        signals = hit_signals(hits, pagerank_scores)
+        matrix = feature_matrix(signals, names)
+        scoring_time = _time_call(lambda: DEFAULT_SCORER.score(feature_matrix(signals, names), names, group_weights))
+        total_time = _time_call(rerank, hits, count, 1.0, 1.0, 1.0, pagerank_scores)
+
+        top, _ = rerank(hits, count, 1.0, 1.0, 1.0, pagerank_scores)
+        scores = DEFAULT_SCORER.score(matrix, names, group_weights)
+        expected = [hits[i]["_id"] for i in np.argsort(-scores, kind="stable")[:count]]
+        parity = "ok" if [hit["_id"] for hit in top] == expected else "MISMATCH"
+        print(f"{n:>6} {signals_time * 1000:>13.2f} {scoring_time * 1000:>13.2f} {total_time * 1000:>11.2f}  {parity}")
+
+
+def benchmark_signal_store(sizes=(100, 1000, 5000), corpus=200000):
+    """
+    Compare reading ranking signals from hit metadata with the memory-mapped signal store.
+
+    Writes a store for a synthetic corpus, then times signal extraction and the
+    per-request PageRank for candidate sets read either way, and reports the
+    JSON size of candidates with card fields versus IDs and scores only.
+
+    Args:
+        sizes (tuple): Candidate-set sizes to benchmark
+        corpus (int): Number of posts in the store
+    """
+    hits = make_synthetic_hits(corpus)
+    for i, hit in enumerate(hits):
+        hit["_source"]["metadata"].update(post_id=hit["_id"], time=f"2024-{1 + i % 12:02d}-{1 + i % 28:02d} 12:00:00",
+                                          upvote_ratio=0.9, awards=i % 3, title=f"Post {i}", subreddit="nba", sport="basketball")
+    with tempfile.TemporaryDirectory() as directory:
+        writer = SignalStoreWriter()
+        for hit in hits:
+            writer.add(hit["_source"]["metadata"])
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            writer.save("benchmark", directory)
+        print(f"Wrote {corpus} posts in {(time.perf_counter() - start) * 1000:.0f} ms\n")
+        store = SignalStore(f"{directory}/benchmark")
+
+        print(f"{'n':>6} {'metadata (ms)':>14} {'store (ms)':>11} {'pagerank md (ms)':>17} {'pagerank store (ms)':>20}"
+              f" {'source (KB)':>12} {'ids only (KB)':>14}  parity")
+        rng = np.random.default_rng(0)
+        for n in sizes:
+            candidates = [hits[i] for i in rng.choice(corpus, n, replace=False)]
+            bare = [{"_id": hit["_id"], "_score": hit["_score"]} for hit in candidates]
+            from_metadata = _time_call(hit_signals, candidates)
+            from_store = _time_call(hit_signals, bare, None, store)
+            pagerank_metadata = _time_call(calculate_pagerank_score, candidates)
+            pagerank_store = _time_call(lambda: calculate_pagerank_score(bare, store=store))
+
+            expected, actual = hit_signals(candidates), hit_signals(bare, None, store)
+            same = all(np.allclose(expected[name], actual[name], rtol=1e-6, equal_nan=True) for name in expected)
+            source_kb = len(json.dumps(candidates)) / 1024
+            bare_kb = len(json.dumps(bare)) / 1024
+            print(f"{n:>6} {from_metadata * 1000:>14.2f} {from_store * 1000:>11.2f} {pagerank_metadata * 1000:>17.2f}"
+                  f" {pagerank_store * 1000:>20.2f} {source_kb:>12.1f} {bare_kb:>14.1f}  {'ok' if same else 'MISMATCH'}")
+
+
+def benchmark_local_index(n=50000, count=10, repeat=20):
+    """
+    Compare the embedded local index with Elasticsearch on the same synthetic corpus.
+
+    Reports build time, load time and size on disk of the local index, then
+    latency and single-client throughput per sort method. When a cluster is
+    reachable, the same posts are loaded into a temporary index and searched
+    too, and the overlap of the top results is reported.
+
+    Args:
+        n (int): Number of synthetic documents
+        count (int): Results per search
+        repeat (int): Searches per query, method and backend
+    """
+    documents = [prepare_document(post) for post in make_synthetic_posts(n)]
+    queries = ["trade", "premier league", "goal keeper mistake", "nba AND playoffs", "injury -transfer"]
+    methods = ["relevance", "score", "time", "combined", "rerank"]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "local_index")
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            build_local_index(documents, path)
+        build_time = time.perf_counter() - start
+        start = time.perf_counter()
+        open_local_index(path)
+        load_time = time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+        print(f"Local index: {n} posts, built in {build_time:.1f} s, loaded in {load_time * 1000:.1f} ms, "
+              f"{size / 1024 / 1024:.1f} MB on disk\n")
+
+        backends = [("local", lambda query, method: search_index.search_local(query, count, method))]
+        es, index_name = None, "benchmark_local_index"
+        try:
+            es = get_client()
+            if not es.ping():
+                es = None
+        except Exception:
+            es = None
+        if es is None:
+            print("⚠️ Elasticsearch is not reachable; timing the local index only.\n")
+        else:
+            es.indices.delete(index=index_name, ignore=[404])
+            create_es_index(es, index_name, settings=BULK_LOAD_SETTINGS)
+            index_documents_in_es(es, index_name, iter(documents))
+            finalize_index(es, index_name)
+            backends.append(("elasticsearch", lambda query, method: search_documents(query, index_name, count, method)))
+
+        try:
+            print(f"{'backend':>14} {'method':>10} {'p50 (ms)':>9} {'p95 (ms)':>9} {'searches/s':>11} {'overlap':>8}")
+            for method in methods:
+                top_ids = {}
+                for label, search in backends:
+                    latencies = []
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        top_ids[label] = [{hit["id"] for hit in search(query, method)} for query in queries]
+                        for query in queries:
+                            for _ in range(repeat):
+                                start = time.perf_counter()
+                                search(query, method)
+                                latencies.append(time.perf_counter() - start)
+                    p50, p95 = np.percentile(latencies, [50, 95]) * 1000
+                    overlap = "-"
+                    if label != "local":
+                        shared = [len(a & b) / max(len(a | b), 1) for a, b in zip(top_ids["local"], top_ids[label])]
+                        overlap = f"{np.mean(shared):.0%}"
+                    print(f"{label:>14} {method:>10} {p50:>9.2f} {p95:>9.2f} {len(latencies) / sum(latencies):>11.0f} {overlap:>8}")
+        finally:
+            reset_local_index()
+            if es is not None:
+                es.indices.delete(index=index_name, ignore=[404])
+
+
+def benchmark_semantic(n=100000, count=10, repeat=20, probes=(8, 32, 128)):
+    """
+    Measure the semantic index and the hybrid sort on a topical synthetic corpus.
+
+    Reports build time and the memory of each index array, then the latency of
+    vector searches per number of probed clusters with their recall@count
+    against an exact scan, and the latency of hybrid searches on the local
+    backend next to plain relevance.
+
+    Args:
+        n (int): Number of synthetic documents
+        count (int): Results per search
+        repeat (int): Searches per query and setting
+        probes (tuple): Numbers of clusters scanned per query
+    """
+    posts, topic_words = make_topical_posts(n)
+    documents = [prepare_document(post) for post in posts]
+    rng = np.random.default_rng(0)
+    queries = [" ".join(rng.choice(words, 2, replace=False)) for words in topic_words[:10]]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "semantic_index")
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            build_semantic_index(documents, path)
+        build_time = time.perf_counter() - start
+        semantic = open_semantic_index(path)
+        report = semantic.memory_report()
+        float_size = semantic.vectors.size * 4
+        print(f"Semantic index: {n} posts, {semantic.vectors.shape[1]} dimensions, "
+              f"{len(semantic.centroids)} clusters, built in {build_time:.1f} s")
+        for name, size in report.items():
+            print(f"  {name:>14}: {size / 1024 / 1024:8.2f} MB")
+        print(f"  (float32 vectors would take {float_size / 1024 / 1024:.2f} MB)\n")
+
+        # Synthetic posts share their words, so many vectors tie: a result counts
+        # as recalled when it is at least as similar as the exact count-th best
+        exact = {query: semantic.search(query, count, probes=None)[1][-1] for query in queries}
+        print(f"{'probes':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'recall@' + str(count):>10}")
+        for setting in list(probes) + [None]:
+            latencies, recalls = [], []
+            for query in queries:
+                similarities = semantic.search(query, count, probes=setting)[1]
+                recalls.append(np.mean(similarities >= exact[query] - 1e-6))
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    semantic.search(query, count, probes=setting)
+                    latencies.append(time.perf_counter() - start)
+            p50, p95 = np.percentile(latencies, [50, 95]) * 1000
+            label = "exact" if setting is None else str(setting)
+            print(f"{label:>8} {p50:>9.2f} {p95:>9.2f} {np.mean(recalls):>10.0%}")
+
+        local_path = os.path.join(directory, "local_index")
+        with contextlib.redirect_stdout(io.StringIO()):
+            build_local_index(documents, local_path)
+        open_local_index(local_path)
+        try:
+            print(f"\n{'method':>10} {'p50 (ms)':>9} {'p95 (ms)':>9} {'new in top ' + str(count):>12}")
+            top_ids = {}
+            for method in ["relevance", "hybrid"]:
+                latencies = []
+                with contextlib.redirect_stdout(io.StringIO()):
+                    top_ids[method] = [{hit["id"] for hit in search_index.search_local(query, count, method)} for query in queries]
+                    for query in queries:
+                        for _ in range(repeat):
+                            start = time.perf_counter()
+                            search_index.search_local(query, count, method)
+                            latencies.append(time.perf_counter() - start)
+                p50, p95 = np.percentile(latencies, [50, 95]) * 1000
+                new = "-"
+                if method == "hybrid":
+                    new = f"{np.mean([len(b - a) for a, b in zip(top_ids['relevance'], top_ids['hybrid'])]):.1f}"
+                print(f"{method:>10} {p50:>9.2f} {p95:>9.2f} {new:>12}")
+        finally:
+            reset_local_index()
+            reset_semantic_index()
+
+
+def make_cross_posts(posts, share=0.2, seed=7):
+    """
+    Add cross-posts and reposts of a share of the posts, as the crawler collects them.
+
+    Each copy gets a new ID and subreddit; half keep the title and body exactly,
+    the others have one word of the body changed.
+
+    Args:
+        posts (list): Post objects to copy from
+        share (float): Copies to add, as a share of the posts
+        seed (int): Random seed
+
+    Returns:
+        tuple: (posts with the copies appended, dict of copy ID -> source post ID)
+    """
+    rng = np.random.default_rng(seed)
+    copies, sources = [], {}
+    for i, source in enumerate(rng.choice(len(posts), int(len(posts) * share))):
+        post = dict(posts[source], ID=f"x{i:07d}", Subreddit=f"crosspost_sub{i % 7}")
+        words = post["Post Text"].split()
+        if i % 2 and words:
+            words[int(rng.integers(len(words)))] = "edited"
+            post["Post Text"] = " ".join(words)
+        copies.append(post)
+        sources[post["ID"]] = posts[source]["ID"]
+    return posts + copies, sources
+
+
+def benchmark_near_duplicates(n=50000, count=10):
+    """
+    Measure near-duplicate detection on synthetic posts with injected cross-posts.
+
+    Reports signature and clustering throughput, the share of copies found in
+    the cluster of their source, clusters merging unrelated posts, the title and
+    body text that exact-duplicate skipping and collapsing save, and redundant
+    results per page of local searches with and without collapsing on clusters.
+
+    Args:
+        n (int): Number of original posts
+        count (int): Results per page
+    """
+    posts, topic_words = make_topical_posts(n)
+    posts, sources = make_cross_posts(posts)
+    documents = [prepare_document(post) for post in posts]
+
+    detector = DuplicateDetector()
+    start = time.perf_counter()
+    for doc in documents:
+        detector.add(doc)
+    sign_time = time.perf_counter() - start
+    start = time.perf_counter()
+    cluster_ids, exact_duplicates = detector.clusters()
+    cluster_time = time.perf_counter() - start
+    report = detector.report(cluster_ids, exact_duplicates)
+
+    recall = np.mean([cluster_ids[copy] == cluster_ids[source] for copy, source in sources.items()])
+    # Originals are random texts, so a cluster holding two of them is a false merge
+    originals = {}
+    for post_id, cluster_id in cluster_ids.items():
+        if post_id not in sources:
+            originals[cluster_id] = originals.get(cluster_id, 0) + 1
+    merged = sum(size - 1 for size in originals.values())
+    total = report["text_bytes"]
+    print(f"{len(documents)} posts ({len(sources)} copies): signed in {sign_time:.2f} s "
+          f"({len(documents) / sign_time:.0f} posts/s), clustered in {cluster_time:.2f} s")
+    print(f"Copies found with their source: {recall:.1%}; originals wrongly merged: {merged}")
+    print(f"Exact duplicates: {report['exact_duplicates']} posts, {report['exact_duplicate_bytes'] / total:.1%} of the text; "
+          f"all near-duplicates: {report['posts'] - report['clusters']} posts, {report['near_duplicate_bytes'] / total:.1%}\n")
+
+    rng = np.random.default_rng(0)
+    queries = [" ".join(rng.choice(words, 2, replace=False)) for words in topic_words[:20]]
+    with tempfile.TemporaryDirectory() as directory:
+        with contextlib.redirect_stdout(io.StringIO()):
+            build_local_index(documents, directory)
+        open_local_index(directory)
+        try:
+            def collapsed(query, size):
+                # First result of each cluster, as collapsing on metadata.cluster_id returns them
+                results, seen = [], set()
+                for result in search_index.search_local(query, size * 5):
+                    cluster_id = cluster_ids.get(result["id"], result["id"])
+                    if cluster_id not in seen:
+                        seen.add(cluster_id)
+                        results.append(result)
+                return results[:size]
+
+            for label, search in (("post_id", search_index.search_local), ("cluster_id", collapsed)):
+                redundant = page_redundancy(search, queries, cluster_ids, count)
+                print(f"Collapse on {label:>10}: {redundant:.2f} redundant results per page of {count}")
+        finally:
+            reset_local_index()
+
+
+class StubIndexerClient:
+    """
+    Sync Elasticsearch stand-in for the indexer: every call succeeds, and each
+    bulk request takes `bulk_delay` seconds like a round trip to a busy cluster.
+    """
+
+    def __init__(self, bulk_delay):
+        self.bulk_delay = bulk_delay
+        self.transport = SimpleNamespace(serializer=JSONSerializer())
+        acknowledged = lambda **kwargs: {"acknowledged": True}
+        self.indices = SimpleNamespace(
+            exists=lambda **kwargs: False, exists_alias=lambda **kwargs: False, get=lambda **kwargs: {},
+            create=acknowledged, put_settings=acknowledged, refresh=acknowledged, forcemerge=acknowledged,
+            update_aliases=acknowledged, delete=acknowledged,
+        )
+        self.cluster = SimpleNamespace(health=lambda **kwargs: {"status": "green"})
+
+    def ping(self):
+        return True
+
+    def bulk(self, body, **kwargs):
+        time.sleep(self.bulk_delay)
+        # One action line, then one source (or partial document) line per item
+        actions = [json.loads(line).popitem() for line in body.splitlines()[::2]]
+        return {"errors": False, "items": [{op_type: {"_id": meta["_id"], "status": 200}} for op_type, meta in actions]}
+
+
+class StubSearchClient:
+    """Async Elasticsearch stand-in for the search service, answering every search with the same synthetic hits."""
+
+    def __init__(self, hits):
+        self.hits = hits
+
+    async def search(self, index=None, body=None, **kwargs):
+        await asyncio.sleep(0.001)
+        size = body.get("size", 10)
+        hits = [{**hit, "_index": "stub"} for hit in self.hits[:size]]
+        return {"hits": {"total": {"value": len(self.hits), "relation": "eq"}, "hits": hits}}
+
+    async def close(self):
+        pass
+
+
+def search_during_indexing(n, bulk_delay):
+    """
+    Start an indexing job through /trigger_indexer and call /search until it has finished.
+
+    Elasticsearch is replaced by stubs, so no cluster is needed: the indexer's
+    client takes `bulk_delay` seconds per bulk request and the search client
+    answers at once. Queries are unique, so every search misses the result cache.
+
+    Args:
+        n (int): Number of synthetic posts to index
+        bulk_delay (float): Seconds each stubbed bulk request takes
+
+    Returns:
+        tuple: (final job state from /indexer_status, list of /search latencies in
+            seconds, list of error messages of failed searches)
+    """
+    working_directory = os.getcwd()
+    patched = [(indexer, "get_client"), (indexer, "DATA_FILE"), (indexer, "MANIFEST_FILE"), (search_index, "async_es")]
+    originals = [getattr(module, name) for module, name in patched]
+    with tempfile.TemporaryDirectory() as directory:
+        # Manifest and signal store paths are relative: keep them in the temporary directory
+        os.chdir(directory)
+        data_file = os.path.join(directory, "posts.json")
+        with open(data_file, "w", encoding="utf-8") as f:
+            json.dump(make_synthetic_posts(n), f)
+        indexer.get_client = lambda: StubIndexerClient(bulk_delay)
+        indexer.DATA_FILE = data_file
+        indexer.MANIFEST_FILE = os.path.join(directory, "index_manifest.json")
+        search_index.async_es = StubSearchClient(make_synthetic_hits(100))
+        try:
+            latencies, errors = [], []
+            with contextlib.redirect_stdout(io.StringIO()), TestClient(app) as client:
+                job_id = client.get("/trigger_indexer").json()["job_id"]
+                while True:
+                    job = client.get(f"/indexer_status/{job_id}").json()["job"]
+                    if job["status"] not in ("pending", "running"):
+                        return job, latencies, errors
+                    query = f"{SAMPLE_QUERIES[len(latencies) % len(SAMPLE_QUERIES)]} {len(latencies)}"
+                    start = time.perf_counter()
+                    response = client.get("/search", params={"query": query}).json()
+                    latencies.append(time.perf_counter() - start)
+                    if response["status"] != "success":
+                        errors.append(response["message"])
+        finally:
+            for (module, name), original in zip(patched, originals):
+                setattr(module, name, original)
+            os.chdir(working_directory)
+
+
+def benchmark_indexing_responsiveness(n=20000, bulk_delay=0.05):
+    """
+    Measure /search latency while an indexing job is running.
+
+    Runs search_during_indexing, so no cluster is needed;
+    tests/test_indexing_jobs.py asserts the latency bound.
+
+    Args:
+        n (int): Number of synthetic posts to index
+        bulk_delay (float): Seconds each stubbed bulk request takes
+    """
+    job, latencies, errors = search_during_indexing(n, bulk_delay)
+    print(f"Indexing job {job['status']}: {job['docs_processed']} posts in {job['elapsed_seconds']:.1f} s "
+          f"while answering {len(latencies)} searches ({len(errors)} failed)")
+    if latencies:
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+        print(f"{'p50 (ms)':>9} {'p99 (ms)':>9} {'max (ms)':>9}")
+        print(f"{p50:>9.2f} {p99:>9.2f} {max(latencies) * 1000:>9.2f}")
+
+BENCHMARKS = {
+    "batch-search": benchmark_batch_search,
+    "pagerank": benchmark_pagerank,
+    "query-mode": benchmark_query_mode,
+    "rerank": benchmark_rerank,
+    "response-size": benchmark_response_size,
+    "bulk-load": benchmark_bulk_load,
+    "combined": benchmark_combined,
+    "dedup": benchmark_dedup,
+    "facets": benchmark_facets,
+    "index-profile": benchmark_index_profile,
+    "indexing-responsiveness": benchmark_indexing_responsiveness,
+    "local-index": benchmark_local_index,
+    "near-duplicates": benchmark_near_duplicates,
+    "filters": benchmark_filters,
+    "search-concurrency": benchmark_search_concurrency,
+    "semantic": benchmark_semantic,
+    "signal-store": benchmark_signal_store,
+    "suggest": benchmark_suggest,
+}
+
+
+def main():
+    """Entry point for script execution"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS), help="Benchmark to run")
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark]()
+
+
+if __name__ == "__main__":
+    main()
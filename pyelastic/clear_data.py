@@ -1,7 +1,8 @@
-import os
 import numpy as np
 np.float_ = np.float64
-from elasticsearch import Elasticsearch
+from es_client import get_client
+from indexer import remove_manifest
+from signal_store import remove_signal_store
 
 def clear_elasticsearch_index(index_to_delete="reddit_sports_data"):
     """
@@ -11,9 +12,14 @@ def clear_elasticsearch_index(index_to_delete="reddit_sports_data"):
         es_client: An instance of the Elasticsearch client.
         index_to_delete: The name of the index to delete.
     """
-    es_client = Elasticsearch(os.getenv("ES_HOST", "http://localhost:9200"))
+    es_client = get_client()
     if es_client.ping():
+        # Delete every version behind the alias, plus an index named like the alias
+        es_client.indices.delete(index=f"{index_to_delete}_v*", ignore=[400, 404])
         es_client.indices.delete(index=index_to_delete, ignore=[400, 404])
+        # The next indexing run must resend every post
+        remove_manifest()
+        remove_signal_store("*")
         print(f"✅ Index '{index_to_delete}' and all its data have been deleted.")
     else:
         print("❌ Could not connect to Elasticsearch. Ensure it is running.")
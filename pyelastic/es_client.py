@@ -0,0 +1,103 @@
+"""
+Elasticsearch Client Factory
+
+One place to configure how the indexer, the search service and the maintenance
+scripts connect to the cluster. Requests are spread round-robin over all nodes;
+a node that fails is marked dead (with an exponentially growing timeout) and the
+request is retried on the next node.
+"""
+
+import os
+from elasticsearch import AsyncElasticsearch, Elasticsearch
+
+# Comma-separated list of nodes. Falls back to the older single-URL variables,
+# then to the three nodes published by docker-compose.yaml.
+ES_HOSTS = [
+    host.strip()
+    for host in (
+        os.getenv("ES_HOSTS")
+        or os.getenv("ELASTICSEARCH_URL")
+        or os.getenv("ES_HOST")
+        or "http://localhost:9200,http://localhost:9201,http://localhost:9202"
+    ).split(",")
+    if host.strip()
+]
+
+# Connections kept open per node
+ES_MAX_CONNECTIONS = int(os.getenv("ES_MAX_CONNECTIONS", "64"))
+# Attempts on other nodes after a connection error, timeout or 502/503/504
+ES_MAX_RETRIES = int(os.getenv("ES_MAX_RETRIES", "3"))
+# Seconds a failed node is skipped; doubles with each consecutive failure
+ES_DEAD_TIMEOUT = float(os.getenv("ES_DEAD_TIMEOUT", "30"))
+ES_REQUEST_TIMEOUT = float(os.getenv("ES_REQUEST_TIMEOUT", "30"))
+# Discover cluster members from the nodes API. Off by default because the nodes
+# publish container addresses that are not reachable from the host.
+ES_SNIFF = os.getenv("ES_SNIFF", "false").lower() == "true"
+
+_client = None
+
+
+def client_options(**overrides):
+    """
+    Builds the connection options shared by the sync and async clients.
+
+    Args:
+        **overrides: Options that replace the defaults, e.g. maxsize
+
+    Returns:
+        dict: Keyword arguments for Elasticsearch / AsyncElasticsearch
+    """
+    options = {
+        "maxsize": ES_MAX_CONNECTIONS,
+        "max_retries": ES_MAX_RETRIES,
+        "retry_on_timeout": True,
+        "dead_timeout": ES_DEAD_TIMEOUT,
+        "timeout": ES_REQUEST_TIMEOUT,
+    }
+    if ES_SNIFF:
+        options.update(sniff_on_start=True, sniff_on_connection_fail=True, sniffer_timeout=60)
+    options.update(overrides)
+    return options
+
+
+def create_client(**overrides):
+    """
+    Creates a new synchronous client for all configured nodes.
+
+    Args:
+        **overrides: Options that replace the defaults
+
+    Returns:
+        Elasticsearch: Client instance
+    """
+    return Elasticsearch(ES_HOSTS, **client_options(**overrides))
+
+
+def create_async_client(**overrides):
+    """
+    Creates a new async client for all configured nodes. Must be called with an
+    event loop running, and closed with `await client.close()`.
+
+    Args:
+        **overrides: Options that replace the defaults
+
+    Returns:
+        AsyncElasticsearch: Client instance
+    """
+    return AsyncElasticsearch(ES_HOSTS, **client_options(**overrides))
+
+
+def get_client():
+    """
+    Returns the process-wide synchronous client, creating it on first use.
+
+    The client is thread-safe, so the API handlers, background indexing jobs and
+    bulk workers all share its connection pool.
+
+    Returns:
+        Elasticsearch: Shared client instance
+    """
+    global _client
+    if _client is None:
+        _client = create_client()
+    return _client
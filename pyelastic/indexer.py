@@ -6,11 +6,21 @@ This module indexes Reddit sports data from a JSON file into Elasticsearch.
 It creates an index with appropriate mappings and bulk indexes the documents.
 """
 
+import datetime
 import os
+import re
 import json
 import time
-from elasticsearch import Elasticsearch, helpers
+import hashlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from elasticsearch import helpers
+from es_client import get_client
 import numpy as np
+from pagerank import global_pagerank
+from local_index import build_local_index
+from semantic_index import build_semantic_index
+from near_duplicates import DuplicateDetector
+from signal_store import SignalStoreWriter, remove_signal_store
 
 # Fix for numpy float type compatibility
 np.float_ = np.float64
@@ -18,7 +28,87 @@ np.float_ = np.float64
 # Configuration variables (from environment or defaults)
 DATA_FILE = os.getenv("DATA_FILE", "./posts.json")
 ES_INDEX_NAME = os.getenv("ES_INDEX_NAME", "reddit_sports_data")
-ES_HOST = os.getenv("ES_HOST", "http://localhost:9200")
+COMPUTE_PAGERANK = os.getenv("COMPUTE_PAGERANK", "true").lower() == "true"
+# Also rebuild the embedded fallback index of local_index.py after indexing
+BUILD_LOCAL_INDEX = os.getenv("BUILD_LOCAL_INDEX", "false").lower() == "true"
+# Also rebuild the vector index of semantic_index.py used by the 'hybrid' sort
+BUILD_SEMANTIC_INDEX = os.getenv("BUILD_SEMANTIC_INDEX", "false").lower() == "true"
+# Cluster near-duplicate posts into metadata.cluster_id, and optionally leave
+# out posts whose title and body repeat a post of smaller ID (see near_duplicates.py).
+# Off by default: signing the whole corpus delays the first bulk request.
+DETECT_DUPLICATES = os.getenv("DETECT_DUPLICATES", "false").lower() == "true"
+SKIP_EXACT_DUPLICATES = os.getenv("SKIP_EXACT_DUPLICATES", "false").lower() == "true"
+# "incremental" only sends new or changed posts, "full" resends everything
+INDEX_MODE = os.getenv("INDEX_MODE", "incremental")
+MANIFEST_FILE = os.getenv("MANIFEST_FILE", "./index_manifest.json")
+
+# Mapping profile of new index versions: "standard" or "lean" (smaller index, see index_mapping)
+INDEX_PROFILE = os.getenv("INDEX_PROFILE", "standard")
+INDEX_PROFILES = ("standard", "lean")
+
+# Versioned index settings: ES_INDEX_NAME is an alias to the live version
+INDEX_REPLICAS = int(os.getenv("INDEX_REPLICAS", "1"))
+INDEX_REFRESH_INTERVAL = os.getenv("INDEX_REFRESH_INTERVAL", "1s")
+KEEP_INDEX_VERSIONS = int(os.getenv("KEEP_INDEX_VERSIONS", "2"))
+
+# Settings used while a new index version is bulk loaded
+BULK_LOAD_SETTINGS = {"index": {"refresh_interval": "-1", "number_of_replicas": 0}}
+
+# Bulk indexing settings
+BULK_WORKERS = int(os.getenv("BULK_WORKERS", "3"))
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))
+BULK_MAX_BYTES = int(os.getenv("BULK_MAX_BYTES", str(5 * 1024 * 1024)))
+BULK_MAX_IN_FLIGHT = int(os.getenv("BULK_MAX_IN_FLIGHT", str(2 * BULK_WORKERS)))
+BULK_MAX_RETRIES = int(os.getenv("BULK_MAX_RETRIES", "5"))
+BULK_INITIAL_BACKOFF = float(os.getenv("BULK_INITIAL_BACKOFF", "1"))
+
+# Matches Reddit post permalinks and short links, capturing the post ID
+REDDIT_POST_URL = re.compile(r"(?:reddit\.com/(?:r/[^/]+/)?comments/|redd\.it/)([a-z0-9]+)", re.IGNORECASE)
+
+
+def iter_posts(file_path, chunk_size=1 << 16):
+    """
+    Stream Reddit post objects from a JSON file one record at a time.
+    
+    Accepts both the JSON array written by `save_posts` and newline-delimited
+    JSON. The file is read in chunks and decoded incrementally, so memory use
+    does not depend on the file size.
+    
+    Args:
+        file_path (str): Path to the JSON data file
+        chunk_size (int): Number of characters to read per chunk
+        
+    Yields:
+        dict: One Reddit post object
+    """
+    decoder = json.JSONDecoder()
+    with open(file_path, "r", encoding="utf-8") as f:
+        buffer = ""
+        position = 0
+        eof = False
+        while True:
+            # Skip whitespace, array brackets and separators between records
+            while position < len(buffer) and buffer[position] in " \t\r\n,[]":
+                position += 1
+            if position == len(buffer):
+                if eof:
+                    return
+                buffer = f.read(chunk_size)
+                position = 0
+                eof = not buffer
+                continue
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # Record is split across chunks: read more and retry
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    raise
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            position = end
+            yield record
 
 
 def load_data(file_path):
@@ -31,9 +121,74 @@ def load_data(file_path):
     Returns:
         list: Loaded JSON data
     """
-    with open(file_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    return data
+    return list(iter_posts(file_path))
+
+
+def prepare_document(obj, profile=INDEX_PROFILE):
+    """
+    Extracts text and metadata from a single Reddit post object.
+    
+    Args:
+        obj (dict): Reddit post object
+        profile (str): Mapping profile of the target index. The "lean" profile
+            builds the combined `text` field with copy_to, so it is not sent.
+        
+    Returns:
+        dict: Document prepared for Elasticsearch indexing
+    """
+    
+    # Extract and organize metadata
+    metadata = {
+        "subreddit": obj["Subreddit"],
+        "subreddit_url": obj["Subreddit URL"],
+        "title": obj["Title"],
+        "post_text": obj["Post Text"],
+        "post_id": obj["ID"],
+        "score": obj["Score"],
+        "num_comments": obj["Total Comments"],
+        "post_url": obj["Post URL"],
+        "sport": obj["Sports category"],
+        "upvote_ratio": obj.get("Upvote Ratio", 0),
+        "awards": obj.get("Awards", 0),
+        "time": obj.get("Time", ""),
+        # Every post is its own cluster until near-duplicates are detected (see with_clusters)
+        "cluster_id": obj["ID"]
+    }
+    
+    # Typeahead entries; titles of popular posts are suggested first
+    suggest = {
+        "input": [value for value in (obj["Title"], obj["Subreddit"], obj["Sports category"]) if value],
+        "weight": 1 + int(10 * np.log1p(max(obj["Score"] or 0, 0)))
+    }
+    # Ranking signals for the combined sort. rank_feature values must be
+    # positive, so counts are stored plus one.
+    features = {
+        "score": 1 + max(obj["Score"] or 0, 0),
+        "comments": 1 + max(obj["Total Comments"] or 0, 0),
+        "awards": 1 + max(obj.get("Awards") or 0, 0)
+    }
+    
+    document = {"metadata": metadata, "suggest": suggest, "features": features}
+    if profile != "lean":
+        # Combine important fields for text search
+        document["text"] = f"{obj['Subreddit']} {obj['Sports category']} {obj['Title']} {obj['Post Text']}"
+    return document
+
+
+def iter_documents(data):
+    """
+    Lazily converts Reddit post objects into Elasticsearch documents.
+    
+    Args:
+        data (iterable): Reddit post objects, e.g. from iter_posts
+        
+    Yields:
+        dict: Document prepared for Elasticsearch indexing
+    """
+    for obj in data:
+        yield prepare_document(obj)
+
+
 def prepare_data(data):
     """
     Extracts text and metadata from JSON data for indexing in Elasticsearch.
@@ -44,140 +199,924 @@ def prepare_data(data):
     Returns:
         list: Documents prepared for Elasticsearch indexing
     """
-    documents = []
+    return list(iter_documents(data))
 
-    for obj in data:
-        # Combine important fields for text search
-        text_data = f"{obj['Subreddit']} {obj['Sports category']} {obj['Title']} {obj['Post Text']}"
-        
-        # Extract and organize metadata
-        metadata = {
-            "subreddit": obj["Subreddit"],
-            "subreddit_url": obj["Subreddit URL"],
-            "title": obj["Title"],
-            "post_text": obj["Post Text"],
-            "post_id": obj["ID"],
-            "score": obj["Score"],
-            "num_comments": obj["Total Comments"],
-            "post_url": obj["Post URL"],
-            "sport": obj["Sports category"],
-            "upvote_ratio": obj.get("Upvote Ratio", 0),
-            "awards": obj.get("Awards", 0),
-            "time": obj.get("Time", "")
-        }
-        documents.append({"text": text_data, "metadata": metadata})
 
+def compute_pagerank_scores(documents):
+    """
+    Computes a corpus-wide PageRank authority score for every unique Reddit post.
+    
+    Posts are identified by their Reddit ID, so the same post crawled from several
+    listings gets a single score. A post links to another post when its `post_url`
+    points at that post's permalink; comment and vote counts provide the
+    similarity links and the engagement prior (see pagerank.global_pagerank).
+    The score is scaled so that an average post has a PageRank of 1.0.
+    
+    Only a few numbers per post are kept, so `documents` can be a single-pass
+    stream such as iter_documents(iter_posts(path)).
+    
+    Args:
+        documents (iterable): Documents prepared by prepare_document
+        
+    Returns:
+        dict: Mapping of Reddit post IDs to PageRank scores
+    """
+    ordinals = {}
+    comments = []
+    votes = []
+    linked_ids = []
+    for doc in documents:
+        metadata = doc["metadata"]
+        ordinal = ordinals.setdefault(metadata["post_id"], len(ordinals))
+        if ordinal == len(comments):
+            comments.append(0)
+            votes.append(0)
+        # Keep the highest counts seen across listings for a post
+        comments[ordinal] = max(comments[ordinal], metadata["num_comments"] or 0)
+        votes[ordinal] = max(votes[ordinal], metadata["score"] or 0)
+        
+        match = REDDIT_POST_URL.search(metadata["post_url"] or "")
+        if match:
+            linked_ids.append((ordinal, match.group(1)))
+
+    # Links can point at posts that appear later in the file
+    links = [(source, ordinals[target]) for source, target in linked_ids
+             if target in ordinals and ordinals[target] != source]
+    link_sources = [source for source, _ in links]
+    link_targets = [target for _, target in links]
+
+    scores = global_pagerank(comments, votes, link_sources, link_targets) * len(ordinals)
+    print(f"✅ Computed PageRank for {len(ordinals)} unique posts ({len(links)} post links).")
+    return dict(zip(ordinals, scores.tolist()))
+
+
+def with_pagerank(documents, pagerank_scores):
+    """
+    Lazily stores precomputed PageRank scores in `metadata.pagerank`.
+    
+    Args:
+        documents (iterable): Documents prepared by prepare_document
+        pagerank_scores (dict): Mapping returned by compute_pagerank_scores
+        
+    Yields:
+        dict: The document with `metadata.pagerank` set
+    """
+    for doc in documents:
+        doc["metadata"]["pagerank"] = pagerank_scores.get(doc["metadata"]["post_id"], 0.0)
+        yield doc
+
+
+def with_clusters(documents, cluster_ids, skip=None):
+    """
+    Lazily stores near-duplicate clusters in `metadata.cluster_id`.
+    
+    Args:
+        documents (iterable): Documents prepared by prepare_document
+        cluster_ids (dict): Mapping of Reddit post IDs to cluster IDs, from DuplicateDetector.clusters
+        skip (set): Post IDs of exact duplicates to leave out, if any
+        
+    Yields:
+        dict: The documents with `metadata.cluster_id` set
+    """
+    for doc in documents:
+        post_id = doc["metadata"]["post_id"]
+        if skip and post_id in skip:
+            continue
+        doc["metadata"]["cluster_id"] = cluster_ids.get(post_id, post_id)
+        yield doc
+
+
+def compute_pagerank(documents):
+    """
+    Computes a corpus-wide PageRank authority score and stores it in each document.
+    
+    Args:
+        documents (list): Documents prepared by prepare_data, updated in place
+        
+    Returns:
+        list: The same documents with `metadata.pagerank` set
+    """
+    pagerank_scores = compute_pagerank_scores(documents)
+    for _ in with_pagerank(documents, pagerank_scores):
+        pass
     return documents
 
 
-def create_es_index(es, index_name):
+# Vote score, comment count and awards as rank features, used by the combined sort
+RANK_FEATURES_MAPPING = {
+    "properties": {
+        "score": {"type": "rank_feature"},
+        "comments": {"type": "rank_feature"},
+        "awards": {"type": "rank_feature"}
+    }
+}
+
+
+def index_mapping(profile=INDEX_PROFILE):
     """
-    Creates an Elasticsearch index with proper mapping if it does not already exist.
+    Returns the index mapping for a mapping profile.
+    
+    "standard" analyzes every string as full text and indexes the `text` field
+    sent with each document. "lean" keeps searches equivalent with a smaller
+    index: `text` is filled with copy_to from subreddit, sport and title instead
+    of being stored in _source, the post body is analyzed only once (as
+    `metadata.post_text`), URLs are kept in _source only, and numbers that are
+    only sorted or scored on are doc-values only.
     
     Args:
-        es (Elasticsearch): Elasticsearch client instance
-        index_name (str): Name of the index to create
+        profile (str): "standard" or "lean"
+        
+    Returns:
+        dict: Mapping for the index creation request
     """
-    # Define index mapping with appropriate field types
-    mapping = {
-        "mappings": {
+    if profile not in INDEX_PROFILES:
+        raise ValueError(f"Invalid index profile '{profile}'. Must be one of: {', '.join(INDEX_PROFILES)}")
+    
+    if profile == "lean":
+        return {
+            "_meta": {"profile": profile},
             "properties": {
                 "text": {"type": "text"},
+                "suggest": {"type": "completion", "max_input_length": 100},
+                "features": RANK_FEATURES_MAPPING,
                 "metadata": {
                     "properties": {
-                        "subreddit": {"type": "text"},
-                        "subreddit_url": {"type": "text"},
-                        "title": {"type": "text"},
+                        "subreddit": {"type": "text", "copy_to": "text", "fields": {"keyword": {"type": "keyword"}}},
+                        "subreddit_url": {"type": "keyword", "index": False, "doc_values": False},
+                        "title": {"type": "text", "copy_to": "text"},
                         "post_text": {"type": "text"},
-                        "post_id": {"type": "text"},
-                        "score": {"type": "integer"},
-                        "num_comments": {"type": "integer"},
-                        "post_url": {"type": "text"},
-                        "sport": {"type": "text"},
-                        "upvote_ratio": {"type": "float"},
-                        "awards": {"type": "integer"},
+                        "post_id": {"type": "keyword"},
+                        "cluster_id": {"type": "keyword"},
+                        "score": {"type": "integer", "index": False},
+                        "num_comments": {"type": "integer", "index": False},
+                        "post_url": {"type": "keyword", "index": False, "doc_values": False},
+                        "sport": {"type": "text", "copy_to": "text", "fields": {"keyword": {"type": "keyword"}}},
+                        "upvote_ratio": {"type": "float", "index": False},
+                        "awards": {"type": "integer", "index": False},
+                        "pagerank": {"type": "float", "index": False},
                         "time": {"type": "date", "format": "yyyy-MM-dd HH:mm:ss||strict_date_optional_time"}
                     }
                 },
             }
         }
+    
+    return {
+        "_meta": {"profile": profile},
+        "properties": {
+            "text": {"type": "text"},
+            "suggest": {"type": "completion", "max_input_length": 100},
+            "features": RANK_FEATURES_MAPPING,
+            "metadata": {
+                "properties": {
+                    "subreddit": {"type": "text", "fields": {"keyword": {"type": "keyword"}}},
+                    "subreddit_url": {"type": "text"},
+                    "title": {"type": "text"},
+                    "post_text": {"type": "text"},
+                    "post_id": {"type": "keyword"},
+                    "cluster_id": {"type": "keyword"},
+                    "score": {"type": "integer"},
+                    "num_comments": {"type": "integer"},
+                    "post_url": {"type": "text"},
+                    "sport": {"type": "text", "fields": {"keyword": {"type": "keyword"}}},
+                    "upvote_ratio": {"type": "float"},
+                    "awards": {"type": "integer"},
+                    "pagerank": {"type": "float"},
+                    "time": {"type": "date", "format": "yyyy-MM-dd HH:mm:ss||strict_date_optional_time"}
+                }
+            },
+        }
     }
 
+
+def index_profile(es, index_name):
+    """
+    Returns the mapping profile an existing index was created with.
+    
+    Args:
+        es (Elasticsearch): Elasticsearch client instance
+        index_name (str): Concrete index name
+        
+    Returns:
+        str: Profile name; "standard" for indices created before profiles existed
+    """
+    mappings = es.indices.get_mapping(index=index_name)[index_name]["mappings"]
+    return mappings.get("_meta", {}).get("profile", "standard")
+
+
+# Fields added or remapped after the first index versions, by path. Live versions
+# updated incrementally get them with upgrade_live_mapping.
+ADDED_FIELDS = {
+    # Collapsed on and used as pagination tiebreaker: first versions mapped it as text
+    "metadata.post_id": {"type": "keyword"},
+    "suggest": {"type": "completion", "max_input_length": 100},
+    "features": RANK_FEATURES_MAPPING,
+    "metadata.cluster_id": {"type": "keyword"},
+    # Keyword sub-fields of the sport and subreddit filters and facets
+    "metadata.sport": {"type": "text", "fields": {"keyword": {"type": "keyword"}}},
+    "metadata.subreddit": {"type": "text", "fields": {"keyword": {"type": "keyword"}}},
+}
+
+
+def _mapping_at(properties, path):
+    """Mapping of a dotted field path, or None if it is not mapped."""
+    mapping = None
+    for name in path.split("."):
+        mapping = (properties or {}).get(name)
+        if mapping is None:
+            return None
+        properties = mapping.get("properties")
+    return mapping
+
+
+def _missing_mapping(existing, expected):
+    """
+    Part of an expected field mapping that an existing one lacks, as a put_mapping body.
+    
+    Args:
+        existing (dict): Current mapping of the field, or None if it is not mapped
+        expected (dict): Mapping the field should have
+        
+    Returns:
+        dict: Mapping to put, or None if nothing is missing
+        
+    Raises:
+        ValueError: If the field, or one of its sub-fields, is mapped with another type
+    """
+    if existing is None:
+        return expected
+    if existing.get("type", "object") != expected.get("type", "object"):
+        raise ValueError("mapped with another type")
+    missing = {}
+    for key in ("properties", "fields"):
+        children = {}
+        for name, field in expected.get(key, {}).items():
+            child = _missing_mapping(existing.get(key, {}).get(name), field)
+            if child is not None:
+                children[name] = child
+        if children:
+            missing[key] = children
+    if not missing:
+        return None
+    if "fields" in missing:
+        # Multi-fields are added by putting the field again with its current parameters
+        return {**existing, "fields": {**existing.get("fields", {}), **missing["fields"]}}
+    return missing
+
+
+def upgrade_live_mapping(es, index_name):
+    """
+    Maps the ADDED_FIELDS an index created before them is missing.
+    
+    Missing fields, sub-fields and multi-fields (e.g. `metadata.sport.keyword`)
+    are added in place. A field sent before its mapping existed was mapped
+    dynamically (e.g. `features.score` as a number instead of a rank_feature),
+    and a field can have been mapped with an earlier type (`metadata.post_id`
+    as text instead of keyword). Neither can be changed in place; such an index
+    needs a new full version.
+    
+    Args:
+        es (Elasticsearch): Elasticsearch client instance
+        index_name (str): Concrete index name
+        
+    Returns:
+        tuple: (whether the index can keep being updated, list of the paths added)
+    """
+    properties = es.indices.get_mapping(index=index_name)[index_name]["mappings"].get("properties", {})
+    added = []
+    body = {}
+    for path, expected in ADDED_FIELDS.items():
+        try:
+            missing = _missing_mapping(_mapping_at(properties, path), expected)
+        except ValueError:
+            print(f"⚠️ '{index_name}' maps '{path}' with another type.")
+            return False, []
+        if missing is None:
+            continue
+        parent = body
+        *parents, name = path.split(".")
+        for part in parents:
+            parent = parent.setdefault("properties", {}).setdefault(part, {})
+        parent.setdefault("properties", {})[name] = missing
+        added.append(path)
+    if added:
+        es.indices.put_mapping(index=index_name, body=body)
+        print(f"✅ Added {', '.join(added)} to the mapping of '{index_name}'.")
+    return True, added
+
+
+def create_es_index(es, index_name, settings=None, profile=INDEX_PROFILE):
+    """
+    Creates an Elasticsearch index with proper mapping if it does not already exist.
+    
+    Args:
+        es (Elasticsearch): Elasticsearch client instance
+        index_name (str): Name of the index to create
+        settings (dict): Optional index settings, e.g. BULK_LOAD_SETTINGS
+        profile (str): Mapping profile, see index_mapping
+        
+    Returns:
+        bool: True if the index was created, False if it already existed
+    """
+    # Define index mapping with appropriate field types
+    mapping = {"mappings": index_mapping(profile)}
+
+    if settings:
+        mapping["settings"] = settings
+
     # Create index if it doesn't exist
     if not es.indices.exists(index=index_name):
         es.indices.create(index=index_name, body=mapping)
         print(f"✅ Index '{index_name}' created successfully.")
+        return True
     else:
         print(f"⚠️ Index '{index_name}' already exists.")
+        return False
+
+
+def versioned_index_name(alias):
+    """
+    Returns a new, time-stamped index name for the given alias.
+    
+    The stamp has microseconds, so builds started within the same second get
+    distinct names. Names still sort by age, including older second-resolution ones.
+    
+    Args:
+        alias (str): Alias the index will be served under
+        
+    Returns:
+        str: Index name such as `reddit_sports_data_v20250101120000123456`
+    """
+    return f"{alias}_v{datetime.datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+
+
+def list_index_versions(es, alias):
+    """
+    Lists the versioned indices of an alias, oldest first.
+    
+    Args:
+        es (Elasticsearch): Elasticsearch client instance
+        alias (str): Alias name
+        
+    Returns:
+        list: Index names
+    """
+    return sorted(es.indices.get(index=f"{alias}_v*", ignore_unavailable=True, allow_no_indices=True))
+
+
+def current_index_version(es, alias):
+    """
+    Returns the index the alias currently points to.
+    
+    Args:
+        es (Elasticsearch): Elasticsearch client instance
+        alias (str): Alias name
+        
+    Returns:
+        str: Index name, or None if the alias does not exist
+    """
+    if not es.indices.exists_alias(name=alias):
+        return None
+    return max(es.indices.get_alias(name=alias))
+
+
+def finalize_index(es, index_name):
+    """
+    Restores serving settings after a bulk load, then refreshes and force-merges.
+    
+    Args:
+        es (Elasticsearch): Elasticsearch client instance
+        index_name (str): Index that was bulk loaded
+    """
+    es.indices.put_settings(
+        index=index_name,
+        body={"index": {"refresh_interval": INDEX_REFRESH_INTERVAL, "number_of_replicas": INDEX_REPLICAS}},
+    )
+    es.indices.refresh(index=index_name)
+    # The index is read-only until the next version, so merge it down to one segment
+    es.indices.forcemerge(index=index_name, max_num_segments=1, request_timeout=600)
+    es.cluster.health(index=index_name, wait_for_status="green", timeout="60s",
+                      request_timeout=90, ignore=[408])
+    print(f"✅ Index '{index_name}' refreshed, merged and replicated.")
+
+
+def swap_alias(es, alias, index_name):
+    """
+    Atomically points an alias at a new index.
+    
+    All other indices are removed from the alias in the same request. An index
+    left over from before aliases were used, named like the alias itself, is
+    deleted in that request too.
+    
+    Args:
+        es (Elasticsearch): Elasticsearch client instance
+        alias (str): Alias name
+        index_name (str): Index to serve under the alias
+    """
+    actions = []
+    if es.indices.exists_alias(name=alias):
+        for old_index in es.indices.get_alias(name=alias):
+            actions.append({"remove": {"index": old_index, "alias": alias}})
+    elif es.indices.exists(index=alias):
+        actions.append({"remove_index": {"index": alias}})
+    actions.append({"add": {"index": index_name, "alias": alias}})
+    es.indices.update_aliases(body={"actions": actions})
+    print(f"✅ Alias '{alias}' now points to '{index_name}'.")
+
+
+def _serves(es, alias, index_name):
+    """Whether the alias points at the index; assumed so if the cluster cannot tell."""
+    try:
+        return current_index_version(es, alias) == index_name
+    except Exception:
+        return True
+
+
+def prune_index_versions(es, alias, keep=KEEP_INDEX_VERSIONS):
+    """
+    Deletes old index versions, keeping the live one and the `keep` newest older ones.
+    
+    Args:
+        es (Elasticsearch): Elasticsearch client instance
+        alias (str): Alias name
+        keep (int): Number of older versions to keep for rollback
+    """
+    current = current_index_version(es, alias)
+    older = [index for index in list_index_versions(es, alias) if index != current and (current is None or index < current)]
+    for index in older[:max(len(older) - keep, 0)]:
+        es.indices.delete(index=index, ignore=[404])
+        remove_signal_store(index)
+        print(f"🗑️ Deleted old index version '{index}'.")
+
+
+def rollback_index(es, alias=ES_INDEX_NAME):
+    """
+    Points the alias back at the previous index version.
+    
+    Args:
+        es (Elasticsearch): Elasticsearch client instance
+        alias (str): Alias name
+        
+    Returns:
+        str: Name of the index now being served
+    """
+    current = current_index_version(es, alias)
+    older = [index for index in list_index_versions(es, alias) if current is None or index < current]
+    if not older:
+        raise Exception(f"❌ No previous version of '{alias}' to roll back to.")
+    swap_alias(es, alias, older[-1])
+    return older[-1]
+
+
+# Metadata computed from the whole corpus rather than crawled with the post
+DERIVED_FIELDS = ("pagerank", "cluster_id")
+
+
+def document_hash(doc):
+    """
+    Computes a content hash of a document for change detection.
+    
+    Only the crawled content and signals are hashed: the DERIVED_FIELDS can
+    shift for every post after a re-crawl and are tracked by derived_hash.
+    
+    Args:
+        doc (dict): Document prepared by prepare_document
+        
+    Returns:
+        str: Hex digest of the document content
+    """
+    metadata = {name: value for name, value in doc["metadata"].items() if name not in DERIVED_FIELDS}
+    content = json.dumps([doc.get("text"), metadata], sort_keys=True, default=str)
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def derived_hash(doc):
+    """
+    Computes a hash of the DERIVED_FIELDS of a document.
+    
+    PageRank is rounded so small shifts in the global scores after a re-crawl
+    do not mark every post as changed.
+    
+    Args:
+        doc (dict): Document prepared by prepare_document
+        
+    Returns:
+        str: Hex digest of the derived fields
+    """
+    metadata = doc["metadata"]
+    pagerank = metadata.get("pagerank")
+    derived = [None if pagerank is None else round(pagerank, 2), metadata.get("cluster_id")]
+    return hashlib.blake2b(json.dumps(derived, default=str).encode("utf-8"), digest_size=8).hexdigest()
+
+
+class DerivedUpdate(dict):
+    """
+    Partial document of a post whose content is unchanged, holding only the
+    DERIVED_FIELDS to update; index_documents_in_es sends it as a bulk update.
+    """
+
+
+def load_manifest(file_path, index_name):
+    """
+    Loads the content-hash manifest of the documents already in an index.
+    
+    Args:
+        file_path (str): Path to the manifest file
+        index_name (str): Index the manifest must belong to
+        
+    Returns:
+        dict: Mapping of Reddit post IDs to [content hash, derived hash] pairs
+            (empty if missing or for another index)
+    """
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("index") != index_name:
+        return {}
+    return manifest.get("hashes", {})
+
+
+def save_manifest(file_path, index_name, hashes):
+    """
+    Atomically writes the content-hash manifest for an index.
+    
+    Args:
+        file_path (str): Path to the manifest file
+        index_name (str): Index the hashes describe
+        hashes (dict): Mapping of Reddit post IDs to [content hash, derived hash] pairs
+    """
+    temp_path = f"{file_path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({"index": index_name, "hashes": hashes}, f)
+    os.replace(temp_path, file_path)
+
+
+def remove_manifest(file_path=MANIFEST_FILE):
+    """
+    Deletes the manifest so the next run reindexes every post.
+    
+    Args:
+        file_path (str): Path to the manifest file
+    """
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+
+
+def filter_changed(documents, manifest, new_hashes):
+    """
+    Lazily drops documents that are already indexed as they are.
+    
+    Posts whose content hash matches the manifest but whose DERIVED_FIELDS
+    changed are passed on as a DerivedUpdate instead of the whole document.
+    
+    Args:
+        documents (iterable): Documents prepared by prepare_document
+        manifest (dict): Hashes of the documents already indexed
+        new_hashes (dict): Receives the hashes of the documents that are passed on
+        
+    Yields:
+        dict: New or changed documents, or DerivedUpdate partial documents
+    """
+    for doc in documents:
+        post_id = doc["metadata"]["post_id"]
+        hashes = [document_hash(doc), derived_hash(doc)]
+        # Also skips repeats of a post crawled from several listings
+        if manifest.get(post_id) == hashes or new_hashes.get(post_id) == hashes:
+            continue
+        indexed = manifest.get(post_id)
+        first_in_run = post_id not in new_hashes
+        new_hashes[post_id] = hashes
+        if first_in_run and isinstance(indexed, list) and indexed[0] == hashes[0]:
+            # Only PageRank or the cluster moved: update them without resending the post
+            yield DerivedUpdate(metadata={"post_id": post_id, **{name: doc["metadata"].get(name) for name in DERIVED_FIELDS}})
+        else:
+            yield doc
+
+
+def chunk_actions(actions, chunk_size=BULK_CHUNK_SIZE, max_chunk_bytes=BULK_MAX_BYTES):
+    """
+    Groups bulk actions into chunks bounded by document count and by size.
+    
+    Args:
+        actions (iterable): Bulk actions with a `_source` document
+        chunk_size (int): Maximum number of documents per chunk
+        max_chunk_bytes (int): Approximate maximum size of a chunk's JSON body
+        
+    Yields:
+        list: A chunk of bulk actions
+    """
+    chunk = []
+    chunk_bytes = 0
+    for action in actions:
+        # Size of the source line plus a small allowance for the action line
+        size = len(json.dumps(action.get("_source", action.get("doc"))).encode("utf-8")) + 64
+        if chunk and (len(chunk) >= chunk_size or chunk_bytes + size > max_chunk_bytes):
+            yield chunk
+            chunk = []
+            chunk_bytes = 0
+        chunk.append(action)
+        chunk_bytes += size
+    if chunk:
+        yield chunk
+
 
+def _index_chunk(es, chunk, chunk_number, max_retries, initial_backoff):
+    """
+    Sends one chunk of actions, retrying rejected (429) items with exponential backoff.
+    
+    Args:
+        es (Elasticsearch): Elasticsearch client instance
+        chunk (list): Bulk actions to send
+        chunk_number (int): Position of the chunk, used for reporting
+        max_retries (int): Number of retries for rejected items
+        initial_backoff (float): Seconds to wait before the first retry, doubled each time
+        
+    Returns:
+        tuple: (number of documents indexed, list of failed items)
+    """
+    start_time = time.time()
+    indexed = 0
+    errors = []
+    for ok, item in helpers.streaming_bulk(
+        es,
+        chunk,
+        chunk_size=len(chunk),
+        max_chunk_bytes=BULK_MAX_BYTES * 2,
+        max_retries=max_retries,
+        initial_backoff=initial_backoff,
+        raise_on_error=False,
+        raise_on_exception=True,
+    ):
+        if ok:
+            indexed += 1
+        else:
+            errors.append(item)
+    
+    elapsed = max(time.time() - start_time, 1e-9)
+    print(f"  Chunk {chunk_number}: {indexed} documents in {elapsed:.2f}s ({indexed / elapsed:.0f} docs/sec)")
+    return indexed, errors
 
-def index_documents_in_es(es, index_name, documents):
+
+def index_documents_in_es(es, index_name, documents, workers=BULK_WORKERS,
+                          chunk_size=BULK_CHUNK_SIZE, max_chunk_bytes=BULK_MAX_BYTES,
+                          max_in_flight=BULK_MAX_IN_FLIGHT, max_retries=BULK_MAX_RETRIES,
+                          initial_backoff=BULK_INITIAL_BACKOFF, job=None):
     """
-    Indexes a list of documents into Elasticsearch using bulk indexing.
+    Indexes documents into Elasticsearch using parallel bulk requests.
+    
+    Documents are consumed lazily and grouped into chunks by count and size. Up to
+    `workers` chunks are sent concurrently; once `max_in_flight` chunks are queued
+    or running, reading stops until one completes, so memory stays bounded.
+    Items rejected with 429 are retried with exponential backoff.
     
     Args:
         es (Elasticsearch): Elasticsearch client instance
         index_name (str): Name of the index to use
-        documents (list): List of documents to index
+        documents (iterable): Documents to index
+        workers (int): Number of concurrent bulk requests (1 = sequential)
+        chunk_size (int): Maximum number of documents per bulk request
+        max_chunk_bytes (int): Approximate maximum size of a bulk request
+        max_in_flight (int): Maximum number of chunks queued or being sent
+        max_retries (int): Number of retries for rejected items
+        initial_backoff (float): Seconds to wait before the first retry
+        job (jobs.IndexingJob): Optional job to report progress to; a cancelled
+            job stops the load before the next chunk is sent
+        
+    Returns:
+        int: Number of documents indexed
     """
     start_time = time.time()
     
-    # Prepare bulk indexing actions
-    actions = [
+    # Prepare bulk indexing actions; partial documents update the existing ones
+    actions = (
         {
+            "_op_type": "update",
             "_index": index_name,
-            "_id": doc_id,
+            "_id": doc["metadata"]["post_id"],
+            "doc": dict(doc),
+        }
+        if isinstance(doc, DerivedUpdate) else
+        {
+            "_index": index_name,
+            "_id": doc["metadata"]["post_id"],
             "_source": doc,
         }
-        for doc_id, doc in enumerate(documents)
-    ]
+        for doc in documents
+    )
 
     # Execute bulk indexing
-    helpers.bulk(es, actions)
+    indexed = 0
+    errors = []
+    
+    def collect(future):
+        nonlocal indexed
+        chunk_indexed, chunk_errors = future.result()
+        indexed += chunk_indexed
+        errors.extend(chunk_errors)
+        if job is not None:
+            job.add_progress(chunk_indexed)
+    
+    max_in_flight = max(max_in_flight, workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for chunk_number, chunk in enumerate(chunk_actions(actions, chunk_size, max_chunk_bytes), 1):
+            if job is not None:
+                job.check_cancelled()
+            if len(pending) >= max_in_flight:
+                # Backpressure: wait for a chunk to finish before reading more
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future)
+            pending.add(executor.submit(_index_chunk, es, chunk, chunk_number, max_retries, initial_backoff))
+        for future in pending:
+            collect(future)
+    
+    if errors:
+        raise helpers.BulkIndexError(f"{len(errors)} document(s) failed to index.", errors)
     
     # Report completion stats
     end_time = time.time()
-    elapsed_minutes = (end_time - start_time) / 60
-    print(f"✅ Indexed {len(documents)} documents in Elasticsearch.")
-    print(f"Time taken: {elapsed_minutes:.2f} minutes")
+    elapsed_seconds = max(end_time - start_time, 1e-9)
+    print(f"✅ Indexed {indexed} documents in Elasticsearch.")
+    print(f"Time taken: {elapsed_seconds / 60:.2f} minutes ({indexed / elapsed_seconds:.0f} docs/sec)")
+    return indexed
+
+def _set_phase(job, phase):
+    """Report the current pipeline step to a background job, if any."""
+    if job is not None:
+        job.set_phase(phase)
+
+
+def _with_checkpoints(items, job, every=1000):
+    """
+    Passes items through, checking every `every` items whether the job was cancelled.
+    
+    Args:
+        items (iterable): Items to pass through
+        job (jobs.IndexingJob): Job to check, or None
+        every (int): Number of items between checks
+        
+    Yields:
+        The items unchanged
+    """
+    for count, item in enumerate(items):
+        if job is not None and count % every == 0:
+            job.check_cancelled()
+        yield item
 
-def execute_indexing():
+
+def execute_indexing(job=None):
     """
     Main function to execute the indexing process.
     
+    Posts are streamed from DATA_FILE straight into bulk requests. When
+    COMPUTE_PAGERANK is enabled, a first lightweight pass over the file collects
+    the signals for the global PageRank before the indexing pass starts. In
+    incremental mode, posts whose content hash matches MANIFEST_FILE are skipped.
+    When DETECT_DUPLICATES is enabled, the same first pass clusters near-duplicate
+    posts, and SKIP_EXACT_DUPLICATES leaves out repeated title and body texts.
+    The ranking signals of every post are also written to a memory-mappable
+    signal store for the index version (see signal_store.py).
+    Full runs load a new index version with BULK_LOAD_SETTINGS and only move the
+    ES_INDEX_NAME alias to it once it is complete, so searches never see a
+    half-loaded index.
+    
+    Args:
+        job (jobs.IndexingJob): Optional job that receives phase and progress updates
+            and can cancel the run between chunks
+    
     Returns:
         str: Message indicating success or failure
     """
     start_time_total = time.time()
     try:
-        # Step 1: Load data from JSON file
-        print("\n📌 Step 1: Loading JSON data")
-        data = load_data(DATA_FILE)
+        # Step 1: Precompute corpus-wide PageRank and near-duplicate clusters from a first pass over the data
+        pagerank_scores = None
+        cluster_ids, exact_duplicates = None, None
+        if COMPUTE_PAGERANK or DETECT_DUPLICATES:
+            print("\n📌 Step 1: Computing global PageRank scores and near-duplicate clusters")
+            _set_phase(job, "computing_pagerank" if COMPUTE_PAGERANK else "detecting_duplicates")
+            documents = _with_checkpoints(iter_documents(iter_posts(DATA_FILE)), job)
+            detector = DuplicateDetector() if DETECT_DUPLICATES else None
+            if detector is not None:
+                documents = detector.collect(documents)
+            if COMPUTE_PAGERANK:
+                pagerank_scores = compute_pagerank_scores(documents)
+            else:
+                for _ in documents:
+                    pass
+            if detector is not None:
+                cluster_ids, exact_duplicates = detector.clusters()
+                report = detector.report(cluster_ids, exact_duplicates)
+                print(f"✅ Found {report['duplicate_clusters']} near-duplicate clusters "
+                      f"({report['posts_in_duplicate_clusters']} posts) and {report['exact_duplicates']} exact duplicates.")
+
+        def stream_documents():
+            """Stream JSON records into documents with the first-pass results."""
+            documents = iter_documents(iter_posts(DATA_FILE))
+            if pagerank_scores is not None:
+                documents = with_pagerank(documents, pagerank_scores)
+            if cluster_ids is not None:
+                documents = with_clusters(documents, cluster_ids, exact_duplicates if SKIP_EXACT_DUPLICATES else None)
+            return documents
 
-        # Step 2: Process data for indexing
-        print("\n📌 Step 2: Preparing data for Elasticsearch")
-        documents = prepare_data(data)
-        print(f"✅ Prepared {len(documents)} records for indexing.")
+        # Step 2: Stream JSON records into documents for indexing
+        print("\n📌 Step 2: Streaming JSON data into documents")
+        documents = stream_documents()
 
         # Step 3: Connect to Elasticsearch
         print("\n📌 Step 3: Connecting to Elasticsearch")
-        es = Elasticsearch(ES_HOST)
+        _set_phase(job, "connecting")
+        es = get_client()
 
         if es.ping():
             print("✅ Connected to Elasticsearch.")
 
-            # Step 4: Create or verify index exists
+            # Step 4: Pick the index to write to. Incremental runs update the live
+            # version in place; full runs build a new version behind the alias.
             print("\n📌 Step 4: Creating Elasticsearch Index")
-            create_es_index(es, ES_INDEX_NAME)
+            _set_phase(job, "creating_index")
+            current_index = current_index_version(es, ES_INDEX_NAME)
+            if current_index and index_profile(es, current_index) != INDEX_PROFILE:
+                print(f"⚠️ '{current_index}' uses another mapping profile; building a new '{INDEX_PROFILE}' version.")
+                current_profile_matches = False
+            else:
+                current_profile_matches = True
+            update_in_place = INDEX_MODE == "incremental" and current_index and current_profile_matches
+            added_fields = []
+            if update_in_place:
+                # Versions created before fields were added to the mapping get them now
+                update_in_place, added_fields = upgrade_live_mapping(es, current_index)
+                if not update_in_place:
+                    print(f"⚠️ Building a new '{INDEX_PROFILE}' version with the current mapping.")
+            if update_in_place:
+                target_index = current_index
+                # Posts indexed before the added fields existed must be sent again to fill them
+                manifest = {} if added_fields else load_manifest(MANIFEST_FILE, target_index)
+                print(f"✅ Updating '{target_index}' ({len(manifest)} posts in manifest).")
+            else:
+                target_index = versioned_index_name(ES_INDEX_NAME)
+                create_es_index(es, target_index, settings=BULK_LOAD_SETTINGS)
+                manifest = {}
+            new_hashes = {}
+            # Record the signals of every post, including unchanged ones the bulk load skips
+            signal_writer = SignalStoreWriter()
+            documents = filter_changed(signal_writer.collect(documents), manifest, new_hashes)
 
             # Step 5: Index documents
             print("\n📌 Step 5: Indexing Data in Elasticsearch")
-            index_documents_in_es(es, ES_INDEX_NAME, documents)
+            try:
+                _set_phase(job, "indexing")
+                indexed = index_documents_in_es(es, target_index, documents, job=job)
+                signal_writer.save(target_index)
+                
+                # Step 6: Serve the new version
+                if target_index != current_index:
+                    print("\n📌 Step 6: Swapping alias to the new index version")
+                    _set_phase(job, "swapping_alias")
+                    finalize_index(es, target_index)
+                    # Last guarded call: the alias moves atomically or not at all
+                    swap_alias(es, ES_INDEX_NAME, target_index)
+            except Exception:
+                # Searches keep using the old version; drop the half-built one, unless
+                # the alias did move (e.g. the swap timed out after being applied)
+                if target_index != current_index and not _serves(es, ES_INDEX_NAME, target_index):
+                    es.indices.delete(index=target_index, ignore=[404])
+                    remove_signal_store(target_index)
+                raise
+            
+            # The new version is live from here on: failing to prune only leaves old versions behind
+            if target_index != current_index:
+                try:
+                    prune_index_versions(es, ES_INDEX_NAME)
+                except Exception as e:
+                    print(f"⚠️ Could not prune old index versions: {e}")
+            
+            # Only record hashes once the bulk load has succeeded
+            manifest.update(new_hashes)
+            save_manifest(MANIFEST_FILE, target_index, manifest)
+            
+            # Step 7: Rebuild the local fallback index from the same documents
+            if BUILD_LOCAL_INDEX:
+                print("\n📌 Step 7: Building the local search index")
+                _set_phase(job, "building_local_index")
+                build_local_index(stream_documents())
+            
+            # Step 8: Rebuild the semantic index for the hybrid sort
+            if BUILD_SEMANTIC_INDEX:
+                print("\n📌 Step 8: Building the semantic index")
+                _set_phase(job, "building_semantic_index")
+                build_semantic_index(stream_documents())
             
-            # Calculate total execution time
+            # Calculate total execution time and throughput
             end_time_total = time.time()
             time_taken_seconds = end_time_total - start_time_total
-            return f"✅ Indexing completed successfully. Total time taken: {time_taken_seconds:.2f} seconds"
+            docs_per_second = indexed / max(time_taken_seconds, 1e-9)
+            return (f"✅ Indexing completed successfully. Indexed {indexed} documents. "
+                    f"Total time taken: {time_taken_seconds:.2f} seconds ({docs_per_second:.0f} docs/sec)")
 
         else:
             print("❌ Could not connect to Elasticsearch. Ensure it is running.")
@@ -0,0 +1,143 @@
+"""
+Background Indexing Jobs
+
+Runs the indexer in a worker thread so the API stays responsive, and keeps
+track of each run's phase, progress and errors for the status endpoints.
+"""
+
+import threading
+import time
+import uuid
+
+
+class IndexingCancelled(Exception):
+    """Raised inside an indexing run once its job has been cancelled."""
+
+
+class IndexingJob:
+    """
+    State of a single indexing run.
+
+    The indexer reports through set_phase/add_progress and calls check_cancelled
+    between units of work; everything else is read by the API.
+    """
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = "pending"
+        self.phase = "queued"
+        self.message = ""
+        self.errors = []
+        self.docs_processed = 0
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def set_phase(self, phase):
+        """Record the pipeline step the job is currently in."""
+        self.phase = phase
+        self.check_cancelled()
+
+    def add_progress(self, docs):
+        """Add to the number of documents sent to Elasticsearch."""
+        with self._lock:
+            self.docs_processed += docs
+
+    def check_cancelled(self):
+        """Raise IndexingCancelled if cancellation was requested."""
+        if self._cancel_event.is_set():
+            raise IndexingCancelled("Indexing was cancelled.")
+
+    def cancel(self):
+        """
+        Request cancellation. The run stops at its next checkpoint.
+
+        Returns:
+            bool: False if the job had already finished
+        """
+        if self.finished_at is not None:
+            return False
+        self._cancel_event.set()
+        return True
+
+    def run(self, target):
+        """
+        Execute `target(job=self)` and record its outcome.
+
+        Args:
+            target (callable): Indexing function accepting a `job` keyword
+        """
+        self.status = "running"
+        self.started_at = time.time()
+        try:
+            self.message = target(job=self)
+            self.status = "succeeded"
+        except IndexingCancelled as e:
+            self.status = "cancelled"
+            self.message = str(e)
+        except Exception as e:
+            self.status = "failed"
+            self.message = f"Indexing failed: {e}"
+            self.errors.append(str(e))
+        finally:
+            self.phase = "done"
+            self.finished_at = time.time()
+
+    def to_dict(self):
+        """
+        Summarize the job for the status API.
+
+        Returns:
+            dict: Job state including docs/sec so far
+        """
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "phase": self.phase,
+            "message": self.message,
+            "docs_processed": self.docs_processed,
+            "docs_per_sec": round(self.docs_processed / elapsed, 1) if elapsed > 0 else 0.0,
+            "elapsed_seconds": round(elapsed, 2),
+            "errors": self.errors,
+        }
+
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def start_job(target):
+    """
+    Start `target` in a background thread unless another job is still running.
+
+    Args:
+        target (callable): Indexing function accepting a `job` keyword
+
+    Returns:
+        tuple: (job, started) where `started` is False if `job` is the one already running
+    """
+    with _jobs_lock:
+        for job in _jobs.values():
+            if job.finished_at is None:
+                return job, False
+        job = IndexingJob()
+        _jobs[job.id] = job
+    threading.Thread(target=job.run, args=(target,), name=f"indexing-{job.id}", daemon=True).start()
+    return job, True
+
+
+def get_job(job_id):
+    """
+    Look up a job by ID.
+
+    Args:
+        job_id (str): Job ID returned by start_job
+
+    Returns:
+        IndexingJob: The job, or None if unknown
+    """
+    return _jobs.get(job_id)
@@ -0,0 +1,502 @@
+#!/usr/bin/env python3
+"""
+Local Search Index
+
+Embedded BM25 engine over the same `text` field the indexer sends to
+Elasticsearch. It lets the search service keep answering when the cluster is
+unreachable (SEARCH_BACKEND=auto) or run without a cluster at all
+(SEARCH_BACKEND=local).
+
+The index is a set of memory-mappable files: a sorted vocabulary, posting
+lists of document gaps in variable-byte encoding with one-byte term
+frequencies, document lengths, the ranking signal columns of signal_store.py,
+and the post metadata as JSON lines. Document ordinals follow the sorted post
+IDs, like the signal store, so the signal columns line up with the postings.
+"""
+
+import json
+import mmap
+import os
+import re
+import shutil
+import time
+from collections import Counter
+import numpy as np
+
+# Fix for numpy float type compatibility
+np.float_ = np.float64
+
+from signal_store import SignalStore, SignalStoreWriter, epoch_seconds
+
+# Directory of the local index
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "./local_index")
+
+# BM25 parameters, the Elasticsearch defaults
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Lowercased word tokens, close to Elasticsearch's standard analyzer
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Lucene operators and syntax characters understood by parse_query
+QUERY_OPERATORS = {"AND", "OR", "NOT", "&&", "||"}
+QUERY_TOKEN = re.compile(r'[+\-!]?"[^"]*"|\S+')
+
+
+def tokenize(text):
+    """Split text into lowercased word tokens."""
+    return TOKEN_PATTERN.findall(str(text or "").lower())
+
+
+def document_text(doc):
+    """Text field of a prepared document, rebuilt for the lean profile which does not send it."""
+    metadata = doc["metadata"]
+    return doc.get("text") or f"{metadata['subreddit']} {metadata['sport']} {metadata['title']} {metadata['post_text']}"
+
+
+def parse_query(query):
+    """
+    Split a query into optional, required and excluded terms.
+
+    Supports the common parts of the Lucene and simple query syntax: terms are
+    optional (OR), `+term` or `a AND b` makes terms required, `-term` or
+    `NOT term` excludes them, `field:value` searches the value, and phrases and
+    wildcards are matched as their individual terms.
+
+    Args:
+        query (str): Search query
+
+    Returns:
+        tuple: (optional terms, required terms, excluded terms), as sets
+    """
+    optional, required, excluded = set(), set(), set()
+    clauses = []  # (terms, prefix)
+    pending_and = pending_not = False
+    for token in QUERY_TOKEN.findall(query):
+        if token in QUERY_OPERATORS:
+            pending_and = pending_and or token in ("AND", "&&")
+            pending_not = pending_not or token == "NOT"
+            continue
+        prefix = token[0] if token[0] in "+-!" and len(token) > 1 else ""
+        body = token[len(prefix):]
+        if not body.startswith('"'):
+            body = body.split(":", 1)[-1]
+        terms = tokenize(body)
+        if pending_not:
+            prefix = "-"
+        elif pending_and:
+            if clauses and clauses[-1][1] == "":
+                clauses[-1] = (clauses[-1][0], "+")
+            prefix = prefix or "+"
+        clauses.append((terms, prefix))
+        pending_and = pending_not = False
+    for terms, prefix in clauses:
+        if prefix in ("-", "!"):
+            excluded.update(terms)
+        elif prefix == "+":
+            required.update(terms)
+        else:
+            optional.update(terms)
+    return optional - required - excluded, required - excluded, excluded
+
+
+def _vbyte_lengths(values):
+    """Number of bytes vbyte_encode uses for each value."""
+    return 1 + sum((values >= (1 << (7 * j))).astype(np.int64) for j in range(1, 5))
+
+
+def vbyte_encode(values):
+    """
+    Variable-byte encode non-negative integers, 7 bits per byte, least significant
+    group first, with the high bit marking the last byte of each value.
+
+    Args:
+        values (np.ndarray): Non-negative integers
+
+    Returns:
+        np.ndarray: Encoded bytes as uint8
+    """
+    values = np.asarray(values, dtype=np.int64)
+    lengths = _vbyte_lengths(values)
+    owner = np.repeat(np.arange(len(values)), lengths)
+    group = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    encoded = ((values[owner] >> (7 * group)) & 0x7F).astype(np.uint8)
+    encoded[group == lengths[owner] - 1] |= 0x80
+    return encoded
+
+
+def vbyte_decode(encoded):
+    """
+    Decode bytes written by vbyte_encode.
+
+    Args:
+        encoded (np.ndarray): Encoded bytes as uint8
+
+    Returns:
+        np.ndarray: Decoded integers as int64
+    """
+    if not len(encoded):
+        return np.empty(0, dtype=np.int64)
+    last = (encoded & 0x80) != 0
+    owner = np.cumsum(last) - last
+    starts = np.flatnonzero(np.r_[True, last[:-1]])
+    group = np.arange(len(encoded)) - starts[owner]
+    payload = (encoded & 0x7F).astype(np.float64) * np.exp2(7 * group)
+    return np.bincount(owner, weights=payload).astype(np.int64)
+
+
+def highlight_snippet(text, terms, length):
+    """
+    One fragment of `text` around the first query term, with terms wrapped in <em>.
+
+    Like the Elasticsearch highlighter with `no_match_size`, the start of the
+    text is returned when no term occurs in it.
+
+    Args:
+        text (str): Text to highlight
+        terms (set): Lowercased query terms
+        length (int): Maximum fragment length in characters, before markup
+
+    Returns:
+        str: Highlighted fragment, empty for empty text
+    """
+    text = str(text or "")
+    words = [match for match in TOKEN_PATTERN.finditer(text) if match.group().lower() in terms]
+    start = 0
+    if words and words[0].end() > length:
+        # Start a few words before the first match
+        start = text.rfind(" ", 0, max(words[0].start() - length // 4, 0)) + 1
+    fragment_end = start + length
+    if fragment_end < len(text):
+        fragment_end = text.rfind(" ", start, fragment_end) if " " in text[start:fragment_end] else fragment_end
+    pieces, position = [], start
+    for word in words:
+        if word.start() < start or word.end() > fragment_end:
+            continue
+        pieces.extend([text[position:word.start()], f"<em>{word.group()}</em>"])
+        position = word.end()
+    pieces.append(text[position:fragment_end])
+    return "".join(pieces).strip()
+
+
+def _codes(values):
+    """Map values to integer codes, returning (codes, sorted distinct values)."""
+    distinct = sorted(set(values))
+    lookup = {value: code for code, value in enumerate(distinct)}
+    return np.array([lookup[value] for value in values], dtype=np.int32), distinct
+
+
+def build_local_index(documents, directory=LOCAL_INDEX_DIR):
+    """
+    Build the local index from prepared documents and atomically replace the one on disk.
+
+    Posts are identified by their Reddit ID, and a post seen several times keeps
+    its last version, like the Elasticsearch document it overwrites. Documents
+    are streamed to disk as they arrive, so memory holds their postings and
+    lengths but not the documents themselves.
+
+    Args:
+        documents (iterable): Documents prepared by prepare_document, with
+            `metadata.pagerank` set if global PageRank is wanted
+        directory (str): Directory to write the index to
+
+    Returns:
+        str: Path of the written index
+    """
+    path = directory
+    temp_path = f"{path}.tmp"
+    shutil.rmtree(temp_path, ignore_errors=True)
+    os.makedirs(temp_path)
+
+    # Stream the metadata to disk in arrival order; only the byte span of each
+    # post's latest version, its length and its postings stay in memory
+    spans = {}
+    arrival_lengths = []
+    vocabulary = {}
+    term_ids, arrivals, tfs = [], [], []
+    arrivals_path = os.path.join(temp_path, "arrivals.jsonl")
+    with open(arrivals_path, "wb") as f:
+        for arrival, doc in enumerate(documents):
+            line = json.dumps(doc["metadata"], default=str).encode("utf-8") + b"\n"
+            spans[doc["metadata"]["post_id"]] = (arrival, f.tell(), len(line))
+            f.write(line)
+            # (term, arrival, tf) triples with terms numbered in order of appearance
+            tokens = tokenize(document_text(doc))
+            arrival_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                arrivals.append(arrival)
+                tfs.append(tf)
+    post_ids = sorted(spans)
+
+    # Map arrivals to ordinals, dropping the postings of superseded versions
+    ordinals = np.full(len(arrival_lengths), -1, dtype=np.int64)
+    latest_arrivals = np.array([spans[post_id][0] for post_id in post_ids], dtype=np.int64)
+    ordinals[latest_arrivals] = np.arange(len(post_ids))
+    lengths = np.array(arrival_lengths, dtype=np.uint32)[latest_arrivals]
+    doc_ids = ordinals[np.array(arrivals, dtype=np.int64)]
+    kept = doc_ids >= 0
+    term_ids = np.array(term_ids, dtype=np.int64)[kept]
+    doc_ids = doc_ids[kept]
+    tfs = np.array(tfs, dtype=np.int64)[kept]
+
+    # Keep the terms that still have postings, renumbered in sorted order, and group the postings by term
+    vocabulary = np.array([term.encode("utf-8") for term in vocabulary], dtype=np.bytes_)
+    used = np.unique(term_ids)
+    terms = vocabulary[used]
+    if not len(terms):
+        terms = terms.astype("S1")
+    term_order = np.argsort(terms, kind="stable")
+    term_rank = np.empty(len(terms), dtype=np.int64)
+    term_rank[term_order] = np.arange(len(terms))
+    term_ids = term_rank[np.searchsorted(used, term_ids)]
+    order = np.lexsort((doc_ids, term_ids))
+    term_ids, doc_ids = term_ids[order], doc_ids[order]
+    tfs = np.minimum(tfs[order], 255).astype(np.uint8)
+
+    # Each posting list stores its first document and then the gaps
+    term_offsets = np.searchsorted(term_ids, np.arange(len(terms) + 1))
+    list_starts = term_offsets[:-1][np.diff(term_offsets) > 0]
+    gaps = np.diff(doc_ids, prepend=0)
+    gaps[list_starts] = doc_ids[list_starts]
+    byte_offsets = np.r_[0, np.cumsum(_vbyte_lengths(gaps))][term_offsets]
+
+    np.save(os.path.join(temp_path, "terms.npy"), terms[term_order])
+    np.save(os.path.join(temp_path, "term_offsets.npy"), term_offsets.astype(np.int64))
+    np.save(os.path.join(temp_path, "byte_offsets.npy"), byte_offsets.astype(np.int64))
+    np.save(os.path.join(temp_path, "postings.npy"), vbyte_encode(gaps))
+    np.save(os.path.join(temp_path, "tfs.npy"), tfs)
+    np.save(os.path.join(temp_path, "lengths.npy"), lengths)
+
+    # Metadata as JSON lines, one per ordinal, read back through an offset table.
+    # The facet codes, ranking signals and feature pivots are collected on the way.
+    sports, subreddits = [], []
+    features = {"score": [], "num_comments": [], "awards": []}
+    signal_writer = SignalStoreWriter()
+    source_offsets = [0]
+    with open(arrivals_path, "rb") as source, open(os.path.join(temp_path, "metadata.jsonl"), "wb") as f:
+        for post_id in post_ids:
+            _, offset, size = spans[post_id]
+            source.seek(offset)
+            line = source.read(size)
+            f.write(line)
+            source_offsets.append(source_offsets[-1] + size)
+            m = json.loads(line)
+            sports.append(m.get("sport") or "")
+            subreddits.append(m.get("subreddit") or "")
+            for field, values in features.items():
+                values.append(m.get(field) or 0)
+            signal_writer.add(m)
+    os.remove(arrivals_path)
+    np.save(os.path.join(temp_path, "source_offsets.npy"), np.array(source_offsets, dtype=np.int64))
+
+    sport_codes, sports = _codes(sports)
+    subreddit_codes, subreddits = _codes(subreddits)
+    np.save(os.path.join(temp_path, "sport_codes.npy"), sport_codes)
+    np.save(os.path.join(temp_path, "subreddit_codes.npy"), subreddit_codes)
+
+    # Ranking signals, in the same ordinal order
+    signal_writer.save("signals", temp_path)
+
+    # Geometric means of the rank features, the default saturation pivots of Elasticsearch
+    pivots = {}
+    for name, field in (("score", "score"), ("comments", "num_comments"), ("awards", "awards")):
+        values = 1 + np.maximum(features[field], 0) if post_ids else np.ones(1)
+        pivots[name] = float(np.exp(np.mean(np.log(values))))
+    with open(os.path.join(temp_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "count": len(post_ids),
+            "terms": len(terms),
+            "postings": len(doc_ids),
+            "avg_length": float(lengths.mean()) if len(lengths) else 0.0,
+            "sports": sports,
+            "subreddits": subreddits,
+            "feature_pivots": pivots,
+            "created": time.time(),
+        }, f)
+
+    old_path = f"{path}.old"
+    if os.path.exists(path):
+        shutil.rmtree(old_path, ignore_errors=True)
+        os.replace(path, old_path)
+    os.replace(temp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    print(f"✅ Built local index of {len(post_ids)} posts ({len(terms)} terms) in '{path}'.")
+    return path
+
+
+class LocalIndex:
+    """Read-only, memory-mapped local index."""
+
+    def __init__(self, path=LOCAL_INDEX_DIR):
+        """
+        Args:
+            path (str): Directory written by build_local_index
+        """
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+
+        def load(name):
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+        self.terms = load("terms")
+        self.term_offsets = load("term_offsets")
+        self.byte_offsets = load("byte_offsets")
+        self.postings = load("postings")
+        self.tfs = load("tfs")
+        self.sport_codes = load("sport_codes")
+        self.subreddit_codes = load("subreddit_codes")
+        self.source_offsets = load("source_offsets")
+        self.signals = SignalStore(os.path.join(path, "signals"))
+
+        # BM25 length normalization of every document, computed once
+        lengths = load("lengths").astype(np.float32)
+        avg_length = self.meta["avg_length"] or 1.0
+        self.length_norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / avg_length)
+
+        with open(os.path.join(path, "metadata.jsonl"), "rb") as f:
+            self._sources = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(f.name) else b""
+
+    def __len__(self):
+        return self.meta["count"]
+
+    def posting_list(self, term):
+        """
+        Decode the posting list of a term.
+
+        Args:
+            term (str): Lowercased term
+
+        Returns:
+            tuple: (document ordinals as int64, term frequencies as uint8)
+        """
+        key = term.encode("utf-8")
+        position = int(np.searchsorted(self.terms, key))
+        if position >= len(self.terms) or self.terms[position] != key:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint8)
+        gaps = vbyte_decode(self.postings[self.byte_offsets[position]:self.byte_offsets[position + 1]])
+        return np.cumsum(gaps), self.tfs[self.term_offsets[position]:self.term_offsets[position + 1]]
+
+    def match(self, query):
+        """
+        Score every document against a query with BM25.
+
+        Args:
+            query (str): Search query, see parse_query
+
+        Returns:
+            tuple: (BM25 scores as float32 array over all documents, boolean mask of the matches)
+        """
+        optional, required, excluded = parse_query(query)
+        count = len(self)
+        scores = np.zeros(count, dtype=np.float32)
+        matched = np.zeros(count, dtype=bool)
+        required_mask = np.ones(count, dtype=bool)
+        for term in optional | required:
+            ordinals, tfs = self.posting_list(term)
+            if term in required:
+                present = np.zeros(count, dtype=bool)
+                present[ordinals] = True
+                required_mask &= present
+            if not len(ordinals):
+                continue
+            idf = np.log1p((count - len(ordinals) + 0.5) / (len(ordinals) + 0.5))
+            tfs = tfs.astype(np.float32)
+            scores[ordinals] += idf * tfs / (tfs + self.length_norms[ordinals])
+            matched[ordinals] = True
+        if required:
+            matched &= required_mask
+        for term in excluded:
+            matched[self.posting_list(term)[0]] = False
+        scores[~matched] = 0
+        return scores, matched
+
+    def filter_mask(self, sport=None, subreddit=None, time_from=None, time_to=None):
+        """
+        Documents passing the search filters of build_search_filters.
+
+        Returns:
+            np.ndarray: Boolean mask over all documents, or None without filters
+        """
+        mask = None
+
+        def restrict(condition):
+            nonlocal mask
+            mask = condition if mask is None else mask & condition
+
+        for values, codes, names in ((sport, self.sport_codes, self.meta["sports"]),
+                                     (subreddit, self.subreddit_codes, self.meta["subreddits"])):
+            if values:
+                wanted = [names.index(value) for value in ([values] if isinstance(values, str) else values) if value in names]
+                restrict(np.isin(codes, wanted))
+        post_times = self.signals.columns["time"]
+        if time_from:
+            restrict(post_times >= epoch_seconds(time_from))
+        if time_to:
+            # Like Elasticsearch, a date without a time includes the whole day
+            end = epoch_seconds(time_to) + (86400 - 0.001 if len(str(time_to)) <= 10 else 0)
+            restrict(post_times <= end)
+        return mask
+
+    def source(self, ordinal):
+        """Metadata of a document."""
+        start, end = self.source_offsets[ordinal], self.source_offsets[ordinal + 1]
+        return json.loads(self._sources[start:end])
+
+    def post_id(self, ordinal):
+        """Reddit post ID of a document."""
+        return self.signals.post_ids[ordinal].decode("utf-8")
+
+
+# Index opened by get_local_index
+_local_index = None
+
+
+def open_local_index(directory=LOCAL_INDEX_DIR):
+    """
+    Memory-map the local index in a directory and use it for local searches.
+
+    Args:
+        directory (str): Directory written by build_local_index
+
+    Returns:
+        LocalIndex: The opened index
+    """
+    global _local_index
+    _local_index = LocalIndex(directory)
+    return _local_index
+
+
+def get_local_index(directory=LOCAL_INDEX_DIR):
+    """
+    Return the memory-mapped local index, opening it on first use.
+
+    Returns:
+        LocalIndex: The index, or None if none has been built
+    """
+    if _local_index is None and os.path.exists(os.path.join(directory, "meta.json")):
+        return open_local_index(directory)
+    return _local_index
+
+
+def reset_local_index():
+    """Drop the open local index, so the next search maps a rebuilt one."""
+    global _local_index
+    _local_index = None
+
+
+def main():
+    """Build the local index from DATA_FILE, with global PageRank if COMPUTE_PAGERANK is set."""
+    from indexer import COMPUTE_PAGERANK, DATA_FILE, compute_pagerank_scores, iter_documents, iter_posts, with_pagerank
+
+    start = time.time()
+    documents = iter_documents(iter_posts(DATA_FILE))
+    if COMPUTE_PAGERANK:
+        documents = with_pagerank(documents, compute_pagerank_scores(iter_documents(iter_posts(DATA_FILE))))
+    build_local_index(documents)
+    print(f"✅ Done in {time.time() - start:.2f} seconds.")
+
+
+if __name__ == "__main__":
+    main()
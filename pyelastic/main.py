@@ -1,16 +1,90 @@
 import os
+import asyncio
 from fastapi import FastAPI, Query
 import uvicorn
 from elasticsearch import Elasticsearch
 import numpy as np
 np.float_ = np.float64
-from typing import Optional
+from typing import List, Optional
+from pydantic import BaseModel
 from clear_data import clear_elasticsearch_index
-from indexer import execute_indexing
-from search_index import search_documents
+from es_client import get_client
+from indexer import execute_indexing, rollback_index
+from jobs import get_job, start_job
+from search_cache import LRUSearchCache, create_search_cache, make_cache_key
+from local_index import reset_local_index
+from semantic_index import get_semantic_index, reset_semantic_index
+from signal_store import load_signal_stores
+from contextlib import asynccontextmanager
+from search_index import (HYBRID_PAGERANK_MESSAGE, NO_SEMANTIC_INDEX_MESSAGE, QUERY_MODES, SEARCH_QUERY_MODE, close_async_client,
+                          forget_index_versions, get_post_async, open_async_client, search_batch_async, search_facets_async,
+                          search_page_async, suggest_async)
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    """Open the shared async Elasticsearch connection pool and map the signal stores for the app's lifetime."""
+    open_async_client()
+    load_signal_stores()
+    yield
+    await close_async_client()
+
+app = FastAPI(lifespan=lifespan)
+
+# Cache of formatted /search results, invalidated whenever the index changes
+search_cache = create_search_cache()
+
+# Cache of /suggest results per prefix. Always in-process: a lookup must cost
+# less than the suggester itself.
+suggest_cache = LRUSearchCache(max_bytes=int(os.getenv("SUGGEST_CACHE_MAX_BYTES", str(8 * 1024 * 1024))),
+                               ttl=float(os.getenv("SUGGEST_CACHE_TTL", "600")))
+
+def invalidate_caches():
+    """Drop cached search results and suggestions, and reopen the signal stores, local and semantic indexes, after the index changed."""
+    search_cache.invalidate()
+    suggest_cache.invalidate()
+    load_signal_stores()
+    forget_index_versions()
+    reset_local_index()
+    reset_semantic_index()
+
+async def _cache_call(func, *args):
+    """Call a cache method, off the event loop if the backend does network I/O."""
+    if search_cache.shared:
+        return await asyncio.to_thread(func, *args)
+    return func(*args)
+
+def _validate_search(count, sort_method, weight_relevance, weight_score, weight_time, query_mode=None, use_pagerank=False):
+    """Return an error message for invalid search parameters, or None."""
+    if sort_method not in ["relevance", "score", "time", "combined", "rerank", "hybrid"]:
+        return "Invalid sort_method. Must be one of: relevance, score, time, combined, rerank, hybrid"
+    
+    if sort_method == "hybrid" and use_pagerank:
+        return HYBRID_PAGERANK_MESSAGE
+    
+    if sort_method == "hybrid" and get_semantic_index() is None:
+        return NO_SEMANTIC_INDEX_MESSAGE
+    
+    if query_mode is not None and query_mode not in QUERY_MODES:
+        return f"Invalid query_mode. Must be one of: {', '.join(QUERY_MODES)}"
+    
+    if count < 1:
+        return "Count must be greater than 0"
+        
+    # Validate weights are within reasonable range
+    for weight, name in [(weight_relevance, "weight_relevance"), 
+                        (weight_score, "weight_score"), 
+                        (weight_time, "weight_time")]:
+        if not (0.1 <= weight <= 10.0):
+            return f"{name} must be between 0.1 and 10.0"
+    return None
+
+def run_indexing(job=None):
+    """Run the indexer and drop cached results computed against the old index."""
+    try:
+        return execute_indexing(job=job)
+    finally:
+        invalidate_caches()
 # CORS (Cross-Origin Resource Sharing) middleware
 app.add_middleware(
     CORSMiddleware,
@@ -26,20 +100,62 @@ async def read_root():
 @app.get("/trigger_indexer")
 async def trigger_indexer():
     """
-    API endpoint to trigger the indexing process.
+    API endpoint to start the indexing process as a background job.
+    
+    The run happens in a worker thread, so searches keep being served while it
+    is in progress. Poll /indexer_status/{job_id} for progress.
     
     Returns:
-        A JSON response with the indexing result or error details.
+        A JSON response with the job ID, or the ID of the job already running.
     """
     try:
-        result = execute_indexing()
-        return {"status": "success", "message": result}
+        job, started = start_job(run_indexing)
+        if not started:
+            return {"status": "error", "message": "An indexing job is already running", "job_id": job.id}
+        return {"status": "success", "message": "Indexing started", "job_id": job.id}
     except Exception as e:
         # Log the error (you might want to add proper logging here)
         error_message = str(e)
         print(f"Error during indexing: {error_message}")
         return {"status": "error", "message": f"Indexing failed: {error_message}"}
 
+@app.get("/indexer_status/{job_id}")
+async def indexer_status(job_id: str):
+    """
+    API endpoint to report the progress of an indexing job.
+    
+    Args:
+        job_id: ID returned by /trigger_indexer
+        
+    Returns:
+        A JSON response with the job's status, phase, docs processed, docs/sec and errors.
+    """
+    job = get_job(job_id)
+    if job is None:
+        return {"status": "error", "message": f"Unknown job '{job_id}'"}
+    return {"status": "success", "job": job.to_dict()}
+
+@app.post("/cancel_indexer/{job_id}")
+async def cancel_indexer(job_id: str):
+    """
+    API endpoint to cancel a running indexing job.
+    
+    The job stops before its next bulk chunk; a partially built index version
+    is deleted and searches keep using the current one.
+    
+    Args:
+        job_id: ID returned by /trigger_indexer
+        
+    Returns:
+        A JSON response indicating whether cancellation was requested.
+    """
+    job = get_job(job_id)
+    if job is None:
+        return {"status": "error", "message": f"Unknown job '{job_id}'"}
+    if not job.cancel():
+        return {"status": "error", "message": f"Job '{job_id}' has already finished"}
+    return {"status": "success", "message": f"Cancellation requested for job '{job_id}'"}
+
 @app.delete("/clear-index")
 async def clear_index():
     """
@@ -53,20 +169,44 @@ async def clear_index():
     """
     try:
         clear_elasticsearch_index()
+        invalidate_caches()
         return {"status": "success", "message": f"Indexes have been cleared"}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+@app.post("/rollback-index")
+async def rollback():
+    """
+    API endpoint to serve the previous index version again.
+    
+    Returns:
+        A JSON response naming the index now being served, or error details.
+    """
+    try:
+        index_name = rollback_index(get_client())
+        invalidate_caches()
+        return {"status": "success", "message": f"Now serving '{index_name}'"}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
 
 @app.get("/search")
 async def search(
     query: str = Query(..., description="Search query string"),
     count: int = Query(10, description="Number of results to return"),
-    sort_method: str = Query("relevance", description="Ranking method: 'relevance', 'score', 'time', or 'combined'"),
-    weight_relevance: float = Query(1.0, description="Weight for relevance score when using 'combined' method"),
-    weight_score: float = Query(1.0, description="Weight for vote score when using 'combined' method"),
-    weight_time: float = Query(1.0, description="Weight for recency when using 'combined' method"),
+    sort_method: str = Query("relevance", description="Ranking method: 'relevance', 'score', 'time', 'combined', 'rerank' or 'hybrid'"),
+    weight_relevance: float = Query(1.0, description="Weight for relevance score when using 'combined' or 'rerank'"),
+    weight_score: float = Query(1.0, description="Weight for vote score when using 'combined' or 'rerank'"),
+    weight_time: float = Query(1.0, description="Weight for recency when using 'combined' or 'rerank'"),
     use_pagerank: bool = Query(False, description="Whether to apply PageRank-inspired ranking to results"),
+    compact: bool = Query(False, description="Return card fields and a highlighted snippet instead of full post bodies"),
+    cursor: Optional[str] = Query(None, description="Cursor from the previous page's 'next_cursor'"),
+    sport: Optional[str] = Query(None, description="Only return posts of this sports category"),
+    subreddit: Optional[str] = Query(None, description="Only return posts from this subreddit"),
+    time_from: Optional[str] = Query(None, description="Only return posts made at or after this time, e.g. 2025-01-01"),
+    time_to: Optional[str] = Query(None, description="Only return posts made at or before this time"),
+    facets: bool = Query(False, description="Also return post counts per sport, subreddit and month"),
+    query_mode: Optional[str] = Query(None, description="'query_string' (Lucene syntax, all fields) or 'targeted' (boosted fields, safe syntax)"),
 ):
     """
     Search documents in Elasticsearch with flexible ranking options.
@@ -74,43 +214,74 @@ async def search(
     Args:
         query: Search query string
         count: Number of results to return
-        sort_method: Ranking method ('relevance', 'score', 'time', 'combined')
-        weight_relevance: Weight for relevance score when using 'combined' method
-        weight_score: Weight for vote score when using 'combined' method
-        weight_time: Weight for recency when using 'combined' method
+        sort_method: Ranking method ('relevance', 'score', 'time', 'combined', 'rerank', 'hybrid')
+        weight_relevance: Weight for relevance score when using 'combined' or 'rerank'
+        weight_score: Weight for vote score when using 'combined' or 'rerank'
+        weight_time: Weight for recency when using 'combined' or 'rerank'
         use_pagerank: Whether to apply PageRank-inspired ranking to results
-        index_name: The name of the Elasticsearch index to search
+        compact: Return only the fields a result card needs plus a highlighted
+            'snippet'; fetch the full post from /post/{post_id}
+        cursor: Cursor returned as 'next_cursor' by the previous page; the other
+            parameters must be the same as for that page
+        sport: Exact sports category to filter on
+        subreddit: Exact subreddit name to filter on
+        time_from: Start of the post time range (inclusive)
+        time_to: End of the post time range (inclusive)
+        facets: Whether to add 'facets' with counts of all matching posts per
+            sport, subreddit and month
+        query_mode: How the query is parsed; defaults to SEARCH_QUERY_MODE
         
     Returns:
-        A JSON response with the search results or error details.
+        A JSON response with the search results, a 'next_cursor' for the following
+        page (null on the last page), or error details.
     """
     try:
         # Validate inputs
-        if sort_method not in ["relevance", "score", "time", "combined"]:
-            return {"status": "error", "message": "Invalid sort_method. Must be one of: relevance, score, time, combined"}
-        
-        if count < 1:
-            return {"status": "error", "message": "Count must be greater than 0"}
-            
-        # Validate weights are within reasonable range
-        for weight, name in [(weight_relevance, "weight_relevance"), 
-                            (weight_score, "weight_score"), 
-                            (weight_time, "weight_time")]:
-            if not (0.1 <= weight <= 10.0):
-                return {"status": "error", "message": f"{name} must be between 0.1 and 10.0"}
-        
-        # Call the search_documents function
+        error_message = _validate_search(count, sort_method, weight_relevance, weight_score, weight_time, query_mode, use_pagerank)
+        if error_message:
+            return {"status": "error", "message": error_message}
+        query_mode = query_mode or SEARCH_QUERY_MODE
+        
+        # Serve repeated searches from the cache
         index_name = os.getenv("ES_INDEX_NAME", "reddit_sports_data")
-        results = search_documents(
-            index_name=index_name,
-            query=query,
-            count=count,
-            sort_method=sort_method,
-            weight_relevance=weight_relevance,
-            weight_score=weight_score,
-            weight_time=weight_time,
-            use_pagerank=use_pagerank
-        )
+        cache_key = make_cache_key(index_name, query, count, sort_method,
+                                   weight_relevance, weight_score, weight_time, use_pagerank,
+                                   compact=compact, cursor=cursor, sport=sport, subreddit=subreddit,
+                                   time_from=time_from, time_to=time_to, facets=facets, query_mode=query_mode)
+        page, cache_generation = await _cache_call(search_cache.get, cache_key)
+        cached = page is not None
+        
+        if not cached:
+            # Call the search function for this page
+            search_call = search_page_async(
+                index_name=index_name,
+                query=query,
+                count=count,
+                sort_method=sort_method,
+                weight_relevance=weight_relevance,
+                weight_score=weight_score,
+                weight_time=weight_time,
+                use_pagerank=use_pagerank,
+                compact=compact,
+                cursor=cursor,
+                sport=sport,
+                subreddit=subreddit,
+                time_from=time_from,
+                time_to=time_to,
+                query_mode=query_mode
+            )
+            facet_counts = None
+            if facets:
+                # Facets come from a separate size 0 request, run concurrently with the search
+                (results, next_cursor), facet_counts = await asyncio.gather(
+                    search_call,
+                    search_facets_async(query, index_name, sport, subreddit, time_from, time_to, query_mode)
+                )
+            else:
+                results, next_cursor = await search_call
+            page = {"data": results, "next_cursor": next_cursor, "facets": facet_counts}
+            await _cache_call(search_cache.set, cache_key, page, cache_generation)
+        results = page["data"]
         
         return {
             "status": "success", 
@@ -119,6 +290,9 @@ async def search(
             "query": query,
             "sort_method": sort_method,
             "use_pagerank": use_pagerank,
+            "cached": cached,
+            "next_cursor": page["next_cursor"],
+            "facets": page["facets"],
             "data": results
         }
         
@@ -127,6 +301,194 @@ async def search(
         print(f"Error during search: {error_message}")
         return {"status": "error", "message": f"Search failed: {error_message}"}
 
+# Longest prefix accepted by /suggest
+SUGGEST_MAX_PREFIX = 100
+
+@app.get("/suggest")
+async def suggest(prefix: str = Query(..., description="Text typed so far in the search bar")):
+    """
+    API endpoint for search bar typeahead.
+    
+    Suggestions come from a completion suggester over titles, subreddits and
+    sports, and common prefixes are served from an in-process cache.
+    
+    Args:
+        prefix: Text typed so far
+        
+    Returns:
+        A JSON response with at most SUGGEST_SIZE suggestions, or error details.
+    """
+    try:
+        # The suggester lowercases its input, so case does not change the results
+        prefix = " ".join(prefix.lower().split())[:SUGGEST_MAX_PREFIX]
+        if not prefix:
+            return {"status": "success", "prefix": prefix, "cached": False, "data": []}
+        
+        cache_key = f"{os.getenv('ES_INDEX_NAME', 'reddit_sports_data')}:{prefix}"
+        suggestions, cache_generation = suggest_cache.get(cache_key)
+        cached = suggestions is not None
+        if not cached:
+            suggestions = await suggest_async(prefix, index_name=os.getenv("ES_INDEX_NAME", "reddit_sports_data"))
+            suggest_cache.set(cache_key, suggestions, cache_generation)
+        
+        return {"status": "success", "prefix": prefix, "cached": cached, "data": suggestions}
+    except Exception as e:
+        error_message = str(e)
+        print(f"Error during suggest: {error_message}")
+        return {"status": "error", "message": f"Suggest failed: {error_message}"}
+
+@app.get("/facets")
+async def facets(
+    query: str = Query(..., description="Search query string"),
+    sport: Optional[str] = Query(None, description="Only count posts of this sports category"),
+    subreddit: Optional[str] = Query(None, description="Only count posts from this subreddit"),
+    time_from: Optional[str] = Query(None, description="Only count posts made at or after this time"),
+    time_to: Optional[str] = Query(None, description="Only count posts made at or before this time"),
+    query_mode: Optional[str] = Query(None, description="'query_string' or 'targeted'"),
+):
+    """
+    API endpoint returning only the facet counts of a search, without hits.
+    
+    Args:
+        query: Search query string
+        sport: Exact sports category to filter on
+        subreddit: Exact subreddit name to filter on
+        time_from: Start of the post time range (inclusive)
+        time_to: End of the post time range (inclusive)
+        query_mode: How the query is parsed; defaults to SEARCH_QUERY_MODE
+        
+    Returns:
+        A JSON response with post counts per sport, subreddit and month, or error details.
+    """
+    try:
+        index_name = os.getenv("ES_INDEX_NAME", "reddit_sports_data")
+        facet_counts = await search_facets_async(query, index_name, sport, subreddit, time_from, time_to, query_mode)
+        return {"status": "success", "query": query, "facets": facet_counts}
+    except Exception as e:
+        error_message = str(e)
+        print(f"Error during facet search: {error_message}")
+        return {"status": "error", "message": f"Facet search failed: {error_message}"}
+
+# Largest number of searches accepted by /search/batch
+SEARCH_BATCH_MAX = int(os.getenv("SEARCH_BATCH_MAX", "50"))
+
+class SearchSpec(BaseModel):
+    """One search of a /search/batch request; same parameters and defaults as /search."""
+    query: str
+    count: int = 10
+    sort_method: str = "relevance"
+    weight_relevance: float = 1.0
+    weight_score: float = 1.0
+    weight_time: float = 1.0
+    use_pagerank: bool = False
+    compact: bool = False
+    cursor: Optional[str] = None
+    sport: Optional[str] = None
+    subreddit: Optional[str] = None
+    time_from: Optional[str] = None
+    time_to: Optional[str] = None
+    query_mode: Optional[str] = None
+
+@app.post("/search/batch")
+async def search_batch(searches: List[SearchSpec]):
+    """
+    Run several searches in one request, backed by a single Elasticsearch multi-search.
+    
+    Searches found in the cache are answered from it; the rest go to Elasticsearch
+    together, so the batch takes about as long as its slowest search.
+    
+    Args:
+        searches: List of search specs with the same parameters as /search
+        
+    Returns:
+        A JSON response with one result per search, in order. Each has its own
+        'status', so an invalid or failing search does not fail the batch.
+    """
+    try:
+        if len(searches) > SEARCH_BATCH_MAX:
+            return {"status": "error", "message": f"A batch can contain at most {SEARCH_BATCH_MAX} searches"}
+        
+        index_name = os.getenv("ES_INDEX_NAME", "reddit_sports_data")
+        responses = [None] * len(searches)
+        pending = []  # (position, cache key, cache generation)
+        for position, spec in enumerate(searches):
+            error_message = _validate_search(spec.count, spec.sort_method, spec.weight_relevance,
+                                             spec.weight_score, spec.weight_time, spec.query_mode, spec.use_pagerank)
+            if error_message:
+                responses[position] = {"status": "error", "message": error_message}
+                continue
+            cache_key = make_cache_key(index_name, spec.query, spec.count, spec.sort_method,
+                                       spec.weight_relevance, spec.weight_score, spec.weight_time, spec.use_pagerank,
+                                       compact=spec.compact, cursor=spec.cursor, sport=spec.sport,
+                                       subreddit=spec.subreddit, time_from=spec.time_from, time_to=spec.time_to,
+                                       query_mode=spec.query_mode or SEARCH_QUERY_MODE)
+            page, cache_generation = await _cache_call(search_cache.get, cache_key)
+            if page is not None:
+                responses[position] = {"status": "success", "cached": True, **page}
+            else:
+                pending.append((position, cache_key, cache_generation))
+        
+        if pending:
+            outcomes = await search_batch_async([searches[position].model_dump() for position, _, _ in pending],
+                                                index_name=index_name)
+            for (position, cache_key, cache_generation), outcome in zip(pending, outcomes):
+                if outcome["status"] == "success":
+                    page = {"data": outcome["data"], "next_cursor": outcome["next_cursor"]}
+                    await _cache_call(search_cache.set, cache_key, page, cache_generation)
+                    outcome = {"status": "success", "cached": False, **page}
+                responses[position] = outcome
+        
+        for spec, response in zip(searches, responses):
+            response.update(query=spec.query, sort_method=spec.sort_method, use_pagerank=spec.use_pagerank)
+            if response["status"] == "success":
+                response["count"] = len(response["data"])
+        
+        return {
+            "status": "success",
+            "message": f"Ran {len(searches)} searches",
+            "count": len(searches),
+            "data": responses
+        }
+        
+    except Exception as e:
+        error_message = str(e)
+        print(f"Error during batch search: {error_message}")
+        return {"status": "error", "message": f"Batch search failed: {error_message}"}
+
+@app.get("/post/{post_id}")
+async def get_post(post_id: str):
+    """
+    API endpoint to fetch a single post with its full text.
+    
+    Args:
+        post_id: Reddit post ID, as returned in the 'id' of a search result
+        
+    Returns:
+        A JSON response with all fields of the post, or error details.
+    """
+    try:
+        post = await get_post_async(post_id, index_name=os.getenv("ES_INDEX_NAME", "reddit_sports_data"))
+        if post is None:
+            return {"status": "error", "message": f"Post '{post_id}' not found"}
+        return {"status": "success", "data": post}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+@app.get("/cache_stats")
+async def cache_stats():
+    """
+    API endpoint to report search cache hit/miss counters and memory use.
+    
+    Returns:
+        A JSON response with the cache statistics.
+    """
+    try:
+        stats = await _cache_call(search_cache.stats)
+        return {"status": "success", "cache": stats}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
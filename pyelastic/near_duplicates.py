@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Near-Duplicate Detection
+
+Finds posts that tell the same story: cross-posts of one link to r/nba,
+r/sports and team subreddits, and reposts with the same title and body. Each
+post gets a MinHash signature of the word shingles of its title and body;
+locality-sensitive hashing of signature bands pairs up likely duplicates in
+about linear time, and pairs whose signatures agree on at least
+DUPLICATE_THRESHOLD of their values (an estimate of the Jaccard similarity)
+are joined into clusters.
+
+The indexer stores the cluster of every post as `metadata.cluster_id` (the
+smallest post ID of the cluster), so searches can collapse on it, and can skip
+exact duplicates altogether. `python near_duplicates.py` reports how much of
+the crawl and of result pages is redundant.
+"""
+
+import contextlib
+import hashlib
+import io
+import os
+import sys
+import time
+import zlib
+import numpy as np
+
+# Fix for numpy float type compatibility
+np.float_ = np.float64
+
+from local_index import tokenize
+
+# Words per shingle
+DUPLICATE_SHINGLE_SIZE = int(os.getenv("DUPLICATE_SHINGLE_SIZE", "3"))
+# Signature length, split into MINHASH_BANDS bands of equal width for the LSH buckets
+MINHASH_PERMUTATIONS = int(os.getenv("MINHASH_PERMUTATIONS", "64"))
+MINHASH_BANDS = int(os.getenv("MINHASH_BANDS", "16"))
+# Estimated Jaccard similarity from which two posts are near-duplicates
+DUPLICATE_THRESHOLD = float(os.getenv("DUPLICATE_THRESHOLD", "0.8"))
+
+# Shingles hashed at once, bounding the temporary (shingles x permutations) matrix to 16 MB
+SIGNATURE_BATCH_SHINGLES = 1 << 15
+
+# Odd multipliers combining the token hashes of a shingle
+SHINGLE_MULTIPLIERS = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0x27D4EB2F165667C5],
+                               dtype=np.uint64)
+
+
+def duplicate_text(doc):
+    """Title and body of a prepared document, the part shared by cross-posts."""
+    metadata = doc["metadata"]
+    return f"{metadata.get('title') or ''} {metadata.get('post_text') or ''}"
+
+
+def _components(count, first, second):
+    """
+    Connected components of an undirected graph.
+
+    Returns:
+        np.ndarray: Smallest node of the component of every node
+    """
+    labels = np.arange(count)
+    while True:
+        previous = labels
+        labels = labels.copy()
+        np.minimum.at(labels, first, labels[second])
+        np.minimum.at(labels, second, labels[first])
+        labels = labels[labels]  # Pointer jumping
+        if np.array_equal(labels, previous):
+            return labels
+
+
+class DuplicateDetector:
+    """
+    Collects MinHash signatures of documents and clusters the near-duplicates.
+
+    A post seen several times (e.g. from several listings) keeps its last
+    version, like the Elasticsearch document it overwrites.
+    """
+
+    def __init__(self, permutations=MINHASH_PERMUTATIONS, bands=MINHASH_BANDS, shingle_size=DUPLICATE_SHINGLE_SIZE,
+                 threshold=DUPLICATE_THRESHOLD, seed=0):
+        """
+        Args:
+            permutations (int): Signature length, a multiple of bands
+            bands (int): LSH bands; more bands find less similar pairs
+            shingle_size (int): Words per shingle
+            threshold (float): Estimated Jaccard similarity of near-duplicates
+            seed (int): Random seed of the hash functions
+        """
+        if permutations % bands:
+            raise ValueError("The number of MinHash permutations must be a multiple of the number of bands.")
+        if not 1 <= shingle_size <= len(SHINGLE_MULTIPLIERS):
+            raise ValueError(f"The shingle size must be between 1 and {len(SHINGLE_MULTIPLIERS)}.")
+        rng = np.random.default_rng(seed)
+        # Hash functions h(x) = (a * x + b) >> 32 over 64-bit shingle hashes, with odd a
+        self.multipliers = rng.integers(0, 2 ** 63, permutations, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.offsets = rng.integers(0, 2 ** 63, permutations, dtype=np.uint64)
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+        self.ordinals = {}
+        self.signatures = []
+        self.digests = []
+        self.text_bytes = []
+        self.documents = 0
+        self._token_hashes = {}
+        self._pending = []
+        self._pending_shingles = 0
+
+    def shingles(self, tokens):
+        """
+        Hashes of the word shingles of a text.
+
+        Args:
+            tokens (list): Words of the text, see local_index.tokenize
+
+        Returns:
+            np.ndarray: uint64 shingle hashes, empty for a text without words
+        """
+        token_hashes = self._token_hashes
+        for token in set(tokens).difference(token_hashes):
+            token_hashes[token] = zlib.crc32(token.encode("utf-8"))
+        hashes = np.array([token_hashes[token] for token in tokens], dtype=np.uint64)
+        width = min(self.shingle_size, len(hashes))
+        shingles = np.zeros(len(hashes) - width + 1 if width else 0, dtype=np.uint64)
+        for position in range(width):
+            shingles += hashes[position:len(hashes) - width + 1 + position] * SHINGLE_MULTIPLIERS[position]
+        return shingles
+
+    def _sign_pending(self):
+        """MinHash the buffered shingles of several documents in one vectorized pass."""
+        if not self._pending:
+            return
+        ordinals, shingles = zip(*self._pending)
+        lengths = np.array([len(values) for values in shingles])
+        hashed = (np.concatenate(shingles)[:, None] * self.multipliers + self.offsets) >> np.uint64(32)
+        signatures = np.minimum.reduceat(hashed, np.r_[0, np.cumsum(lengths)[:-1]], axis=0).astype(np.uint32)
+        for ordinal, signature in zip(ordinals, signatures):
+            self.signatures[ordinal] = signature
+        self._pending = []
+        self._pending_shingles = 0
+
+    def add(self, doc):
+        """
+        Record the signature of one document.
+
+        Args:
+            doc (dict): Document prepared by prepare_document
+        """
+        text = duplicate_text(doc)
+        tokens = tokenize(text)
+        normalized = " ".join(tokens)
+        self.documents += 1
+        ordinal = self.ordinals.setdefault(doc["metadata"]["post_id"], len(self.ordinals))
+        if ordinal == len(self.signatures):
+            self.signatures.append(None)
+            self.digests.append(None)
+            self.text_bytes.append(0)
+        elif not tokens:
+            # Sign an earlier version still buffered before it is replaced by this empty one
+            self._sign_pending()
+        self.signatures[ordinal] = None
+        self.digests[ordinal] = hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).digest() if normalized else None
+        self.text_bytes[ordinal] = len(text.encode("utf-8"))
+
+        shingles = self.shingles(tokens)
+        if len(shingles):
+            # Signed in order, so the last version of a repeated post wins
+            self._pending.append((ordinal, shingles))
+            self._pending_shingles += len(shingles)
+            if self._pending_shingles >= SIGNATURE_BATCH_SHINGLES:
+                self._sign_pending()
+
+    def collect(self, documents):
+        """
+        Lazily record the signatures of documents streamed to another consumer.
+
+        Args:
+            documents (iterable): Documents prepared by prepare_document
+
+        Yields:
+            dict: The documents, unchanged
+        """
+        for doc in documents:
+            self.add(doc)
+            yield doc
+
+    def clusters(self):
+        """
+        Cluster the recorded posts.
+
+        Candidate pairs are the posts sharing a band of their signatures with
+        the first post (in post ID order) of the same LSH bucket; a candidate
+        joins when its signature agrees on at least `threshold` of the values.
+
+        Returns:
+            tuple: (dict of post ID -> cluster ID, set of the post IDs of exact
+            duplicates, i.e. every post with the same text as a post of smaller ID)
+        """
+        self._sign_pending()
+        post_ids = np.array(list(self.ordinals), dtype=object)
+        order = np.argsort(post_ids.astype(str), kind="stable")
+        post_ids = post_ids[order]
+        count = len(post_ids)
+        signed = np.array([self.signatures[ordinal] is not None for ordinal in order], dtype=bool)
+        permutations = len(self.multipliers)
+        signatures = np.zeros((count, permutations), dtype=np.uint32)
+        if signed.any():
+            signatures[signed] = np.stack([self.signatures[ordinal] for ordinal in order[signed]])
+        candidates = np.flatnonzero(signed)
+
+        firsts, seconds = [], []
+        width = permutations // self.bands
+        for band in range(self.bands):
+            keys = np.zeros(len(candidates), dtype=np.uint64)
+            for position, column in enumerate(range(band * width, (band + 1) * width)):
+                keys += signatures[candidates, column].astype(np.uint64) * SHINGLE_MULTIPLIERS[position % len(SHINGLE_MULTIPLIERS)]
+            bucket_order = np.argsort(keys, kind="stable")
+            sorted_keys = keys[bucket_order]
+            starts = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]] if len(keys) else np.zeros(0, dtype=bool)
+            # Each post is compared with the first post of its bucket
+            leaders = bucket_order[np.maximum.accumulate(np.where(starts, np.arange(len(keys)), 0))]
+            members = candidates[bucket_order[~starts]]
+            leaders = candidates[leaders[~starts]]
+            similar = (signatures[members] == signatures[leaders]).mean(axis=1) >= self.threshold
+            firsts.append(leaders[similar])
+            seconds.append(members[similar])
+        first = np.concatenate(firsts) if firsts else np.empty(0, dtype=np.int64)
+        second = np.concatenate(seconds) if seconds else np.empty(0, dtype=np.int64)
+        labels = _components(count, first, second)
+        cluster_ids = dict(zip(post_ids.tolist(), post_ids[labels].tolist()))
+
+        exact_duplicates = set()
+        seen = set()
+        for position, ordinal in enumerate(order):
+            digest = self.digests[ordinal]
+            if digest is None:
+                continue
+            if digest in seen:
+                exact_duplicates.add(post_ids[position])
+            seen.add(digest)
+        return cluster_ids, exact_duplicates
+
+    def report(self, cluster_ids=None, exact_duplicates=None):
+        """
+        Summarize the redundancy of the recorded posts.
+
+        Args:
+            cluster_ids (dict): Result of clusters(), computed if missing
+            exact_duplicates (set): Result of clusters()
+
+        Returns:
+            dict: Counts of documents, posts, duplicates and clusters, and the
+            title and body bytes of all posts, of exact duplicates and of
+            cluster members other than the one kept
+        """
+        if cluster_ids is None:
+            cluster_ids, exact_duplicates = self.clusters()
+        sizes = {}
+        for cluster_id in cluster_ids.values():
+            sizes[cluster_id] = sizes.get(cluster_id, 0) + 1
+        text_bytes = {post_id: self.text_bytes[ordinal] for post_id, ordinal in self.ordinals.items()}
+        return {
+            "documents": self.documents,
+            "posts": len(self.ordinals),
+            "exact_duplicates": len(exact_duplicates),
+            "clusters": len(sizes),
+            "duplicate_clusters": sum(1 for size in sizes.values() if size > 1),
+            "posts_in_duplicate_clusters": sum(size for size in sizes.values() if size > 1),
+            "largest_cluster": max(sizes.values(), default=0),
+            "text_bytes": sum(text_bytes.values()),
+            "exact_duplicate_bytes": sum(text_bytes[post_id] for post_id in exact_duplicates),
+            "near_duplicate_bytes": sum(size for post_id, size in text_bytes.items() if cluster_ids[post_id] != post_id),
+        }
+
+
+def find_duplicate_clusters(documents, **options):
+    """
+    Cluster the near-duplicates among documents.
+
+    Args:
+        documents (iterable): Documents prepared by prepare_document
+        **options: Parameters of DuplicateDetector
+
+    Returns:
+        tuple: (dict of post ID -> cluster ID, set of the post IDs of exact duplicates)
+    """
+    detector = DuplicateDetector(**options)
+    for doc in documents:
+        detector.add(doc)
+    return detector.clusters()
+
+
+def page_redundancy(search, queries, cluster_ids, count=10):
+    """
+    Measure how many results of a page repeat a story ranked higher on it.
+
+    Args:
+        search (callable): search(query, count) returning results with an 'id'
+        queries (list): Queries to run
+        cluster_ids (dict): Post ID -> cluster ID
+        count (int): Results per page
+
+    Returns:
+        float: Average number of redundant results per page
+    """
+    redundant = []
+    for query in queries:
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = search(query, count)
+        clusters = [cluster_ids.get(result["id"], result["id"]) for result in results]
+        redundant.append(len(clusters) - len(set(clusters)))
+    return float(np.mean(redundant)) if redundant else 0.0
+
+
+def main():
+    """Report the redundancy of DATA_FILE, and of result pages when a local index has been built."""
+    from indexer import DATA_FILE, iter_documents, iter_posts
+    from local_index import get_local_index
+    from search_index import search_local
+
+    start = time.time()
+    detector = DuplicateDetector()
+    for doc in iter_documents(iter_posts(DATA_FILE)):
+        detector.add(doc)
+    cluster_ids, exact_duplicates = detector.clusters()
+    report = detector.report(cluster_ids, exact_duplicates)
+    print(f"✅ Clustered {report['posts']} posts in {time.time() - start:.2f} seconds.\n")
+
+    total = max(report["text_bytes"], 1)
+    print(f"Documents crawled:           {report['documents']}")
+    print(f"Unique posts:                {report['posts']} ({report['documents'] - report['posts']} repeat crawls)")
+    print(f"Exact duplicates:            {report['exact_duplicates']} posts, "
+          f"{report['exact_duplicate_bytes'] / total:.1%} of title and body text")
+    print(f"Near-duplicate clusters:     {report['duplicate_clusters']} holding {report['posts_in_duplicate_clusters']} posts "
+          f"(largest: {report['largest_cluster']})")
+    print(f"Redundant near-duplicates:   {report['posts'] - report['clusters']} posts, "
+          f"{report['near_duplicate_bytes'] / total:.1%} of title and body text")
+
+    if get_local_index() is None:
+        print("\n⚠️ No local index; build one with `python local_index.py` to measure result pages too.")
+        return
+    queries = sys.argv[1:] or ["trade", "playoffs", "injury", "transfer", "goal", "highlights", "game thread"]
+    redundant = page_redundancy(lambda query, count: search_local(query, count), queries, cluster_ids)
+    print(f"\nRedundant results per page of 10 over {len(queries)} queries: {redundant:.2f} "
+          f"(0 with COLLAPSE_DUPLICATES=true)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+PageRank Engine
+
+NumPy implementations of the PageRank-inspired authority scores used by the
+search service (per-request re-ranking) and the indexer (corpus-wide scores).
+"""
+
+import numpy as np
+
+# Fix for numpy float type compatibility
+np.float_ = np.float64
+
+
+# Function to calculate a PageRank-inspired score
+def calculate_pagerank_score(posts, damping_factor=0.85, max_iterations=10, tolerance=1e-8, store=None):
+    """
+    Calculate a simplified PageRank-inspired score for Reddit posts.
+    
+    In this simplified model:
+    - Posts with more comments are considered more "linked to"
+    - Posts with higher scores (votes) are considered more authoritative
+    - The damping factor works similarly to traditional PageRank
+    
+    Two posts are linked with strength min(c1, c2) / max(c1, c2, 1), where c1 and c2
+    are their comment counts. The metadata is read once into NumPy arrays and the
+    power iteration stops early once the ranking vector has converged.
+    
+    Parameters:
+    - posts: List of post data from Elasticsearch
+    - damping_factor: Damping factor (default 0.85)
+    - max_iterations: Upper bound on power iterations (default 10)
+    - tolerance: Stop once the L1 change of the normalized scores drops below this value
+    - store: Optional SignalStore of the posts' index version; comment and vote
+      counts are then read from it, so the posts only need '_id'
+    
+    Returns:
+    - Dictionary mapping post IDs to their PageRank scores
+    """
+    num_posts = len(posts)
+    if num_posts == 0:
+        return {}
+    
+    # Extract necessary data once
+    post_ids = [post.get('_id', '') for post in posts]
+    if store is not None:
+        signals = store.lookup(posts)
+        comments = signals["num_comments"]
+        votes = signals["score"]
+    else:
+        metadata = [post.get('_source', {}).get('metadata', {}) for post in posts]
+        comments = np.array([m.get('num_comments', 0) for m in metadata], dtype=np.float64)
+        votes = np.array([m.get('score', 0) for m in metadata], dtype=np.float64)
+    
+    # Initial score is weighted combination of comments (links) and votes
+    scores = 0.5 * np.log1p(comments) + 0.5 * np.log1p(votes)
+    scores /= scores.sum() or 1  # Avoid division by zero
+    
+    link_strength = comment_similarity_operator(comments)
+    
+    # Posts whose links are too weak to carry score distribute it evenly instead
+    dangling = link_strength(np.ones(num_posts)) < 0.001
+    teleport = (1 - damping_factor) / num_posts
+    
+    for _ in range(max_iterations):
+        new_scores = teleport + damping_factor * link_strength(scores)
+        
+        if num_posts > 1 and dangling.any():
+            dangling_scores = np.where(dangling, scores, 0.0)
+            new_scores += damping_factor * (dangling_scores.sum() - dangling_scores) / (num_posts - 1)
+        
+        # Compare the score distributions, since the raw scores are not normalized
+        change = np.abs(new_scores / (new_scores.sum() or 1) - scores / (scores.sum() or 1)).sum()
+        scores = new_scores
+        if change < tolerance:
+            break
+    
+    return dict(zip(post_ids, scores.tolist()))
+
+
+def comment_similarity_operator(comments):
+    """
+    Build a function that multiplies a vector by the comment-similarity matrix.
+    
+    The matrix S[i, j] = min(c_i, c_j) / max(c_i, c_j, 1) (zero on the diagonal) is
+    never materialized. With the comment counts sorted, every row splits into posts
+    with fewer comments (contributing c_i / max(c_j, 1)) and posts with more comments
+    (contributing c_j / max(c_i, 1)), so a product reduces to two prefix sums.
+    
+    Parameters:
+    - comments: NumPy array of comment counts
+    
+    Returns:
+    - Function mapping a score vector x to S @ x in O(n log n)
+    """
+    order = np.argsort(comments, kind='stable')
+    sorted_comments = comments[order]
+    sorted_inverse = 1.0 / np.maximum(sorted_comments, 1)
+    inverse = 1.0 / np.maximum(comments, 1)
+    # Number of posts with at most as many comments as each post (itself included)
+    last_lower = np.searchsorted(sorted_comments, comments, side='right') - 1
+    self_similarity = comments * inverse
+    
+    def multiply(x):
+        sorted_x = x[order]
+        lower = np.cumsum(sorted_x * sorted_comments)
+        # Suffix sums (padded with 0) avoid cancellation from subtracting prefix sums
+        higher = np.append(np.cumsum((sorted_x * sorted_inverse)[::-1])[::-1], 0.0)
+        return (lower[last_lower] * inverse
+                + comments * higher[last_lower + 1]
+                - x * self_similarity)
+    
+    return multiply
+
+
+def global_pagerank(comments, votes, link_sources=(), link_targets=(), damping_factor=0.85,
+                    link_weight=0.5, max_iterations=100, tolerance=1e-10):
+    """
+    Calculate a corpus-wide PageRank authority score for every post.
+    
+    Unlike calculate_pagerank_score, the transition matrix is row-normalized so the
+    iteration converges to a proper probability distribution:
+    - A post with explicit links (its URL points at another Reddit post) sends
+      `link_weight` of its score along those links
+    - The rest follows the comment-similarity links, normalized per post
+    - Posts with neither kind of link, and the teleport step, jump according to the
+      engagement prior 0.5 * log1p(comments) + 0.5 * log1p(votes)
+    
+    Parameters:
+    - comments: Array of comment counts, one entry per post
+    - votes: Array of Reddit scores, one entry per post
+    - link_sources: Ordinals of posts that link to another post
+    - link_targets: Ordinals of the linked posts, aligned with link_sources
+    - damping_factor: Damping factor (default 0.85)
+    - link_weight: Share of a post's score sent along explicit links (default 0.5)
+    - max_iterations: Upper bound on power iterations (default 100)
+    - tolerance: Stop once the L1 change of the scores drops below this value
+    
+    Returns:
+    - NumPy array of scores summing to 1, aligned with the input arrays
+    """
+    comments = np.asarray(comments, dtype=np.float64)
+    votes = np.asarray(votes, dtype=np.float64)
+    num_posts = len(comments)
+    if num_posts == 0:
+        return np.zeros(0)
+    
+    # Engagement prior used for teleporting and for dangling posts
+    prior = 0.5 * np.log1p(np.maximum(comments, 0)) + 0.5 * np.log1p(np.maximum(votes, 0))
+    prior = prior / prior.sum() if prior.sum() > 0 else np.full(num_posts, 1.0 / num_posts)
+    
+    # Explicit links as a sparse edge list, without self-loops or duplicate edges
+    edges = np.unique(np.asarray(link_sources, dtype=np.int64) * num_posts
+                      + np.asarray(link_targets, dtype=np.int64))
+    sources, targets = np.divmod(edges, num_posts)
+    keep = sources != targets
+    sources, targets = sources[keep], targets[keep]
+    out_links = np.bincount(sources, minlength=num_posts)
+    
+    similarity = comment_similarity_operator(comments)
+    out_similarity = similarity(np.ones(num_posts))
+    has_similarity = out_similarity >= 0.001
+    
+    # Split each post's outgoing score between explicit links and similarity links
+    link_share = np.where(out_links > 0, np.where(has_similarity, link_weight, 1.0), 0.0)
+    similarity_share = np.where(has_similarity, 1.0 - link_share, 0.0)
+    dangling_share = 1.0 - link_share - similarity_share
+    link_scale = link_share / np.maximum(out_links, 1)
+    similarity_scale = similarity_share / np.where(has_similarity, out_similarity, 1.0)
+    
+    scores = prior.copy()
+    for _ in range(max_iterations):
+        flow = similarity(scores * similarity_scale)
+        flow += np.bincount(targets, weights=(scores * link_scale)[sources], minlength=num_posts)
+        flow += (scores * dangling_share).sum() * prior
+        new_scores = (1 - damping_factor) * prior + damping_factor * flow
+        change = np.abs(new_scores - scores).sum()
+        scores = new_scores
+        if change < tolerance:
+            break
+    
+    return scores
@@ -0,0 +1,191 @@
+"""
+Candidate Re-ranking
+
+Second stage of the "rerank" sort method. Elasticsearch returns the best
+candidates by relevance; their ranking signals are read once into a feature
+matrix and re-scored in a single NumPy pass.
+
+Features are registered by name with register_feature, and the matrix is
+scored by a pluggable scorer, so new signals or scoring models do not touch
+the search request path.
+"""
+
+import datetime
+import os
+import numpy as np
+from signal_store import epoch_seconds
+
+# Fix for numpy float type compatibility
+np.float_ = np.float64
+
+# Age in days at which the recency feature halves
+RECENCY_HALF_LIFE_DAYS = float(os.getenv("RECENCY_HALF_LIFE_DAYS", "30"))
+
+# Registered features: name -> (weight group, function(signals, now) -> column)
+# The groups map to the user's weights: "relevance" to weight_relevance,
+# "popularity" to weight_score and "recency" to weight_time.
+FEATURES = {}
+
+
+def register_feature(name, group, extract):
+    """
+    Register a re-ranking feature.
+
+    Args:
+        name (str): Feature name
+        group (str): "relevance", "popularity" or "recency"; decides which of the
+            user's weights applies to the feature
+        extract (callable): Function of (signals, now) returning one value per
+            hit, where signals is the dict returned by hit_signals and now is
+            the current time in epoch seconds
+    """
+    FEATURES[name] = (group, extract)
+
+
+def hit_signals(hits, pagerank_scores=None, store=None):
+    """
+    Read the raw ranking signals of hits into arrays in one pass.
+
+    Args:
+        hits (list): Hits as returned by Elasticsearch
+        pagerank_scores (dict): Optional mapping of hit IDs to PageRank scores
+        store (SignalStore): Optional signal store of the hits' index version.
+            Signals are then read from it instead of `_source.metadata`.
+
+    Returns:
+        dict: Arrays es_score, score, num_comments, upvote_ratio, awards, time
+            (epoch seconds, NaN if unknown) and pagerank (NaN if unknown)
+    """
+    pagerank_scores = pagerank_scores or {}
+    pagerank = np.array([pagerank_scores.get(hit.get('_id'), np.nan) for hit in hits], dtype=np.float64)
+    es_score = np.array([hit.get('_score') or 0.0 for hit in hits], dtype=np.float64)
+    if store is not None:
+        signals = store.lookup(hits)
+        return {
+            "es_score": es_score,
+            "score": signals["score"],
+            "num_comments": signals["num_comments"],
+            "upvote_ratio": signals["upvote_ratio"],
+            "awards": signals["awards"],
+            "time": signals["time"],
+            "pagerank": pagerank,
+        }
+
+    metadata = [hit.get('_source', {}).get('metadata', {}) for hit in hits]
+    return {
+        "es_score": es_score,
+        "score": np.array([m.get('score') or 0 for m in metadata], dtype=np.float64),
+        "num_comments": np.array([m.get('num_comments') or 0 for m in metadata], dtype=np.float64),
+        "upvote_ratio": np.array([m.get('upvote_ratio') or 0.0 for m in metadata], dtype=np.float64),
+        "awards": np.array([m.get('awards') or 0 for m in metadata], dtype=np.float64),
+        "time": np.array([epoch_seconds(m.get('time')) for m in metadata], dtype=np.float64),
+        "pagerank": pagerank,
+    }
+
+
+def _recency(signals, now):
+    age_days = np.maximum(now - signals["time"], 0) / 86400.0
+    return np.nan_to_num(0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS), nan=0.0)
+
+
+register_feature("relevance", "relevance", lambda signals, now: signals["es_score"])
+register_feature("votes", "popularity", lambda signals, now: np.log1p(np.maximum(signals["score"], 0)))
+register_feature("comments", "popularity", lambda signals, now: np.log1p(np.maximum(signals["num_comments"], 0)))
+register_feature("upvote_ratio", "popularity", lambda signals, now: signals["upvote_ratio"])
+register_feature("awards", "popularity", lambda signals, now: np.log1p(np.maximum(signals["awards"], 0)))
+register_feature("recency", "recency", _recency)
+register_feature("pagerank", "popularity", lambda signals, now: np.nan_to_num(signals["pagerank"], nan=0.0))
+
+
+def feature_matrix(signals, names, now=None):
+    """
+    Build the candidates x features matrix.
+
+    Args:
+        signals (dict): Arrays returned by hit_signals
+        names (list): Registered feature names, one column each
+        now (float): Current time in epoch seconds (default: now)
+
+    Returns:
+        np.ndarray: Matrix of shape (number of hits, len(names))
+    """
+    now = datetime.datetime.now(datetime.timezone.utc).timestamp() if now is None else now
+    return np.column_stack([FEATURES[name][1](signals, now) for name in names])
+
+
+class LinearScorer:
+    """
+    Default scorer: weighted sum of features min-max normalized over the candidates.
+
+    A feature's weight is its coefficient times the user's weight for its group.
+    Any object with the same `score` method can be passed to rerank instead.
+    """
+
+    def __init__(self, coefficients=None):
+        """
+        Args:
+            coefficients (dict): Feature name -> coefficient within its group (default 1.0)
+        """
+        self.coefficients = coefficients or {}
+
+    def score(self, matrix, names, group_weights):
+        """
+        Score the candidates.
+
+        Args:
+            matrix (np.ndarray): Feature matrix from feature_matrix
+            names (list): Feature name of each column
+            group_weights (dict): Weight of each feature group
+
+        Returns:
+            np.ndarray: One score per candidate, higher is better
+        """
+        low = matrix.min(axis=0)
+        span = matrix.max(axis=0) - low
+        normalized = (matrix - low) / np.where(span > 0, span, 1.0)
+        weights = np.array([group_weights[FEATURES[name][0]] * self.coefficients.get(name, 1.0) for name in names])
+        return normalized @ weights
+
+
+DEFAULT_SCORER = LinearScorer({"votes": 1.0, "comments": 0.5, "upvote_ratio": 0.25, "awards": 0.25, "pagerank": 1.0})
+
+
+def rerank(hits, count, weight_relevance=1.0, weight_score=1.0, weight_time=1.0, pagerank_scores=None,
+           scorer=None, features=None, now=None, store=None):
+    """
+    Re-score candidate hits and return the best `count`.
+
+    Args:
+        hits (list): Candidate hits as returned by Elasticsearch
+        count (int): Number of hits to return
+        weight_relevance (float): Weight of the relevance group
+        weight_score (float): Weight of the popularity group
+        weight_time (float): Weight of the recency group
+        pagerank_scores (dict): Optional mapping of hit IDs to PageRank scores;
+            the PageRank feature is only used when given
+        scorer: Object with a `score(matrix, names, group_weights)` method (default DEFAULT_SCORER)
+        features (list): Feature names to use (default: all registered)
+        now (float): Current time in epoch seconds (default: now)
+        store (SignalStore): Optional signal store to read the signals from
+
+    Returns:
+        tuple: (best hits in order, their scores as np.ndarray)
+    """
+    if not hits:
+        return [], np.empty(0)
+    names = list(features or FEATURES)
+    if pagerank_scores is None and "pagerank" in names:
+        names.remove("pagerank")
+
+    signals = hit_signals(hits, pagerank_scores, store)
+    matrix = feature_matrix(signals, names, now)
+    group_weights = {"relevance": weight_relevance, "popularity": weight_score, "recency": weight_time}
+    scores = (scorer or DEFAULT_SCORER).score(matrix, names, group_weights)
+
+    # Partial selection of the top `count`, then a stable sort of just those
+    if count < len(scores):
+        top = np.argpartition(-scores, count - 1)[:count]
+    else:
+        top = np.arange(len(scores))
+    top = top[np.argsort(-scores[top], kind="stable")]
+    return [hits[i] for i in top], scores[top]
@@ -0,0 +1,246 @@
+"""
+Search Result Cache
+
+Caches the formatted results of `/search` keyed on the normalized request
+parameters. The default backend is an in-process LRU bounded by memory and
+TTL; setting SEARCH_CACHE_BACKEND=redis shares one cache (and its
+invalidations) between several uvicorn workers.
+
+Every reindex, rollback or clear bumps the cache generation, which drops all
+entries computed against the previous index contents.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Cache configuration (from environment or defaults)
+SEARCH_CACHE_BACKEND = os.getenv("SEARCH_CACHE_BACKEND", "memory")  # "memory", "redis" or "none"
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "300"))
+SEARCH_CACHE_MAX_BYTES = int(os.getenv("SEARCH_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+def make_cache_key(index_name, query, count, sort_method, weight_relevance, weight_score, weight_time,
+                   use_pagerank, **extra):
+    """
+    Builds a cache key from search parameters.
+
+    Whitespace in the query is collapsed but case is kept, since query_string
+    operators such as AND/OR are case-sensitive. Weights only matter for the
+    combined and rerank methods and are ignored otherwise.
+
+    Args:
+        index_name (str): Index or alias searched
+        query (str): Search query string
+        count (int): Number of results requested
+        sort_method (str): Ranking method
+        weight_relevance (float): Relevance weight
+        weight_score (float): Vote score weight
+        weight_time (float): Recency weight
+        use_pagerank (bool): Whether PageRank ranking is applied
+        **extra: Any further parameters that change the results
+
+    Returns:
+        str: Cache key
+    """
+    weights = (round(weight_relevance, 4), round(weight_score, 4), round(weight_time, 4))
+    key = {
+        "index": index_name,
+        "query": " ".join(query.split()),
+        "count": count,
+        "sort": sort_method,
+        "weights": weights if sort_method in ("combined", "rerank") else None,
+        "pagerank": bool(use_pagerank),
+        **extra,
+    }
+    return json.dumps(key, sort_keys=True, default=str)
+
+
+class LRUSearchCache:
+    """
+    In-process LRU cache bounded by the JSON size of its entries and by a TTL.
+
+    Thread-safe, and cheap enough to call directly from async handlers.
+    """
+
+    shared = False
+
+    def __init__(self, max_bytes=SEARCH_CACHE_MAX_BYTES, ttl=SEARCH_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Looks up `key`.
+
+        Returns:
+            tuple: (cached value or None, generation to pass to set)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None, self.generation
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2], self.generation
+
+    def set(self, key, value, generation):
+        """
+        Stores `value`, evicting least recently used entries to stay within max_bytes.
+
+        The value is dropped if the cache was invalidated since `generation` was
+        returned by get, so results computed against an old index are not kept.
+        """
+        size = len(key) + len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self):
+        """
+        Drops every entry and starts a new cache generation.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.generation += 1
+
+    def stats(self):
+        """
+        Returns hit/miss counters and memory use.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": "memory",
+                "generation": self.generation,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+
+class RedisSearchCache:
+    """
+    Redis-backed cache shared by all API workers.
+
+    The generation lives in Redis, so an invalidation from one worker applies
+    to all of them; entries of older generations simply expire. Bound memory
+    with Redis' own `maxmemory` and an `allkeys-lru` policy. Calls block, so
+    async callers should run them in a worker thread.
+    """
+
+    shared = True
+
+    def __init__(self, url=REDIS_URL, ttl=SEARCH_CACHE_TTL, prefix="search_cache"):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("SEARCH_CACHE_BACKEND=redis requires the 'redis' package.") from e
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, key, generation):
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return f"{self.prefix}:{generation}:{digest}"
+
+    def get(self, key):
+        generation = int(self.client.get(f"{self.prefix}:generation") or 0)
+        value = self.client.get(self._key(key, generation))
+        if value is None:
+            self.misses += 1
+            return None, generation
+        self.hits += 1
+        return json.loads(value), generation
+
+    def set(self, key, value, generation):
+        # Entries written under an old generation are never read again
+        self.client.set(self._key(key, generation), json.dumps(value, default=str), ex=max(int(self.ttl), 1))
+
+    def invalidate(self):
+        self.client.incr(f"{self.prefix}:generation")
+
+    def stats(self):
+        memory = self.client.info("memory")
+        lookups = self.hits + self.misses
+        return {
+            "backend": "redis",
+            "generation": int(self.client.get(f"{self.prefix}:generation") or 0),
+            "bytes": memory.get("used_memory"),
+            "max_bytes": memory.get("maxmemory"),
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class NullSearchCache:
+    """Cache that never stores anything, used when caching is disabled."""
+
+    shared = False
+
+    def get(self, key):
+        return None, 0
+
+    def set(self, key, value, generation):
+        pass
+
+    def invalidate(self):
+        pass
+
+    def stats(self):
+        return {"backend": "none"}
+
+
+def create_search_cache(backend=SEARCH_CACHE_BACKEND):
+    """
+    Creates the cache selected by SEARCH_CACHE_BACKEND.
+
+    Args:
+        backend (str): "memory", "redis" or "none"
+
+    Returns:
+        The cache instance
+    """
+    if backend == "redis":
+        return RedisSearchCache()
+    if backend == "none":
+        return NullSearchCache()
+    return LRUSearchCache()
@@ -4,115 +4,313 @@ import datetime
 import json
 from urllib.parse import quote_plus
 np.float_ = np.float64
-from elasticsearch import Elasticsearch
+import asyncio
+import base64
+import hashlib
 import os
+import time
+from elasticsearch import ConnectionError as ElasticsearchConnectionError, NotFoundError
+from es_client import create_async_client, get_client
+from pagerank import calculate_pagerank_score
+from local_index import get_local_index, highlight_snippet, parse_query
+from reranking import rerank
+from semantic_index import get_semantic_index
+from signal_store import get_signal_store, signal_stores_loaded
 
-# Connect to Elasticsearch
+# Connect to Elasticsearch (all nodes in ES_HOSTS, see es_client.py)
+es = get_client()
 
-# Get Elasticsearch URL from environment variable
-ELASTICSEARCH_URL = os.getenv("ELASTICSEARCH_URL", "http://localhost:9200")
+# Field results are collapsed on: one hit per Reddit post, or with COLLAPSE_DUPLICATES
+# one per near-duplicate cluster, so cross-posts of a story fill a single slot
+COLLAPSE_DUPLICATES = os.getenv("COLLAPSE_DUPLICATES", "false").lower() == "true"
+COLLAPSE_FIELD = "metadata.cluster_id" if COLLAPSE_DUPLICATES else "metadata.post_id"
 
-es = Elasticsearch(ELASTICSEARCH_URL)
+# Unique sort key that makes search_after pagination stable
+PAGINATION_TIEBREAKER = {"metadata.post_id": {"order": "asc", "unmapped_type": "keyword"}}
 
-# Function to calculate a PageRank-inspired score
-def calculate_pagerank_score(posts, damping_factor=0.85):
+# Combined sort: maximum points each popularity/recency feature adds at weight 1.0,
+# comparable to typical BM25 relevance scores
+COMBINED_FEATURE_BOOST = float(os.getenv("COMBINED_FEATURE_BOOST", "5.0"))
+# Post age at which the recency feature gives half of its points
+RECENCY_PIVOT = os.getenv("RECENCY_PIVOT", "30d")
+
+# Candidates fetched from Elasticsearch for the 'rerank' sort method
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "1000"))
+
+# Hybrid sort: candidates taken from each of BM25 and the semantic index, and the
+# share of the vector similarity in the blended score
+SEMANTIC_CANDIDATES = int(os.getenv("SEMANTIC_CANDIDATES", "100"))
+SEMANTIC_WEIGHT = float(os.getenv("SEMANTIC_WEIGHT", "0.5"))
+# Constant score lifting the semantic candidates above any BM25 score in the first stage
+SEMANTIC_CANDIDATE_BOOST = 10000.0
+
+NO_SEMANTIC_INDEX_MESSAGE = "No semantic index has been built. Run `python semantic_index.py` first."
+HYBRID_PAGERANK_MESSAGE = "PageRank ordering is not supported with sort_method 'hybrid'"
+
+# Sort methods that rank candidates first and complete the final results with build_fetch_query
+TWO_STAGE_METHODS = ("rerank", "hybrid")
+
+# Search backend: "elasticsearch", "local" (the embedded index of local_index.py),
+# or "auto": Elasticsearch, falling back to the local index when the cluster is unreachable
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto")
+# Name reported as '_index' of local hits
+LOCAL_INDEX_NAME = "local"
+
+# Metadata fields a result card needs; compact results leave out the post bodies
+COMPACT_SOURCE_FIELDS = [
+    "metadata.subreddit", "metadata.subreddit_url", "metadata.title", "metadata.post_id",
+    "metadata.cluster_id", "metadata.score", "metadata.num_comments", "metadata.awards", "metadata.pagerank",
+    "metadata.post_url", "metadata.sport", "metadata.upvote_ratio", "metadata.time",
+]
+# Maximum length in characters of the highlighted post text snippet in compact results
+SNIPPET_LENGTH = int(os.getenv("SNIPPET_LENGTH", "200"))
+SNIPPET_HIGHLIGHT = {
+    "fields": {
+        "metadata.post_text": {
+            "fragment_size": SNIPPET_LENGTH,
+            "number_of_fragments": 1,
+            "no_match_size": SNIPPET_LENGTH  # Start of the text when the query matched elsewhere
+        }
+    }
+}
+
+# Facet aggregations: top sports and subreddits, and posts per month
+FACET_SIZE = int(os.getenv("FACET_SIZE", "10"))
+FACET_AGGREGATIONS = {
+    "sport": {"terms": {"field": "metadata.sport.keyword", "size": FACET_SIZE}},
+    "subreddit": {"terms": {"field": "metadata.subreddit.keyword", "size": FACET_SIZE}},
+    "time": {"date_histogram": {"field": "metadata.time", "calendar_interval": "month", "format": "yyyy-MM", "min_doc_count": 1}},
+}
+
+# Number of typeahead suggestions returned by /suggest
+SUGGEST_SIZE = int(os.getenv("SUGGEST_SIZE", "8"))
+
+# Shared async client, opened and closed with the API's lifespan
+async_es = None
+
+def open_async_client():
+    """
+    Open the shared async Elasticsearch client used by search_documents_async.
+    
+    Returns:
+    - The AsyncElasticsearch client
+    """
+    global async_es
+    if async_es is None:
+        async_es = create_async_client()
+    return async_es
+
+async def close_async_client():
+    """
+    Close the shared async Elasticsearch client and its connection pool.
+    """
+    global async_es
+    if async_es is not None:
+        await async_es.close()
+        async_es = None
+
+# Seconds the concrete index version behind an alias is remembered
+INDEX_VERSION_TTL = float(os.getenv("INDEX_VERSION_TTL", "10"))
+# Alias -> (index version, time resolved)
+_index_versions = {}
+
+def _remembered_version(index_name):
+    entry = _index_versions.get(index_name)
+    if entry is not None and time.monotonic() - entry[1] < INDEX_VERSION_TTL:
+        return entry[0]
+    return None
+
+def _remember_version(index_name, aliases):
+    version = max(aliases) if aliases else index_name
+    _index_versions[index_name] = (version, time.monotonic())
+    return version
+
+def resolve_index_version(index_name):
     """
-    Calculate a simplified PageRank-inspired score for Reddit posts.
+    Concrete index version an alias (or index) name currently searches.
     
-    In this simplified model:
-    - Posts with more comments are considered more "linked to"
-    - Posts with higher scores (votes) are considered more authoritative
-    - The damping factor works similarly to traditional PageRank
+    Returns:
+    - Index name, or None if the cluster could not be asked
+    """
+    version = _remembered_version(index_name)
+    if version is None:
+        try:
+            version = _remember_version(index_name, es.indices.get_alias(name=index_name))
+        except NotFoundError:
+            version = _remember_version(index_name, None)  # Not an alias
+        except Exception:
+            return None
+    return version
+
+async def resolve_index_version_async(index_name):
+    """
+    Non-blocking version of resolve_index_version, through the shared async client.
+    """
+    version = _remembered_version(index_name)
+    if version is None:
+        try:
+            version = _remember_version(index_name, await async_es.indices.get_alias(name=index_name))
+        except NotFoundError:
+            version = _remember_version(index_name, None)
+        except Exception:
+            return None
+    return version
+
+def forget_index_versions():
+    """Drop remembered alias versions, e.g. after a reindex or rollback moved an alias."""
+    _index_versions.clear()
+
+def has_signal_store(version):
+    """
+    Whether rerank candidates from an index version can be fetched without
+    '_source': only when that version has a signal store. Versions built before
+    stores existed, or whose store failed to write, get their signals from
+    '_source' instead.
+    """
+    return version is not None and get_signal_store(version) is not None
+
+# Function to build the Elasticsearch request body
+# How the query text is parsed:
+# - "query_string": Lucene syntax over every field in the mapping (original behavior)
+# - "targeted": simple_query_string over TARGETED_QUERY_FIELDS; never fails to parse
+QUERY_MODES = ("query_string", "targeted")
+SEARCH_QUERY_MODE = os.getenv("SEARCH_QUERY_MODE", "query_string")
+# Fields searched in targeted mode, with boosts. `text` is left out because it
+# only repeats these fields, and URLs and IDs would add noise to the scores.
+TARGETED_QUERY_FIELDS = ["metadata.title^3", "metadata.subreddit^2", "metadata.sport^2", "metadata.post_text"]
+
+# Parameters of build_search_filters, accepted by every search function
+FILTER_PARAMS = ("sport", "subreddit", "time_from", "time_to")
+
+def build_search_filters(sport=None, subreddit=None, time_from=None, time_to=None):
+    """
+    Build filter clauses restricting a search to a sport, subreddit and time range.
+    
+    Filters do not affect scoring, and Elasticsearch caches them as bitsets that
+    are reused across searches.
     
     Parameters:
-    - posts: List of post data from Elasticsearch
-    - damping_factor: Damping factor (default 0.85)
+    - sport: Sports category, or a list of categories (exact match)
+    - subreddit: Subreddit name, or a list of names (exact match)
+    - time_from: Earliest post time, e.g. "2025-01-01" or "2025-01-01 12:00:00"
+    - time_to: Latest post time (inclusive)
     
     Returns:
-    - Dictionary mapping post IDs to their PageRank scores
+    - List of filter clauses, empty when no filter is set
     """
-    # Initialize scores
-    scores = {}
-    post_ids = []
+    filters = []
+    for field, value in (("metadata.sport.keyword", sport), ("metadata.subreddit.keyword", subreddit)):
+        if isinstance(value, (list, tuple)):
+            if value:
+                filters.append({"terms": {field: list(value)}})
+        elif value:
+            filters.append({"term": {field: value}})
     
-    # Extract necessary data and assign initial scores
-    for post in posts:
-        post_id = post.get('_id', '')
-        metadata = post.get('_source', {}).get('metadata', {})
-        post_ids.append(post_id)
-        
-        # Initial score based on number of comments (links) and votes
-        comment_factor = np.log1p(metadata.get('num_comments', 0))
-        vote_factor = np.log1p(metadata.get('score', 0))
-        
-        # Initial score is weighted combination of comments and votes
-        scores[post_id] = 0.5 * comment_factor + 0.5 * vote_factor
-    
-    # Normalize initial scores
-    total_score = sum(scores.values()) or 1  # Avoid division by zero
-    for post_id in scores:
-        scores[post_id] /= total_score
-    
-    # Run simplified PageRank iterations
-    iterations = 10  # Usually 10-20 iterations is enough for convergence
-    for _ in range(iterations):
-        new_scores = {post_id: (1 - damping_factor) / len(posts) for post_id in post_ids}
-        
-        # Each post distributes its score to others based on comment count similarity
-        for i, post1 in enumerate(posts):
-            post1_id = post1.get('_id', '')
-            post1_metadata = post1.get('_source', {}).get('metadata', {})
-            post1_comments = post1_metadata.get('num_comments', 0)
-            
-            outgoing_score = 0
-            for j, post2 in enumerate(posts):
-                if i == j:
-                    continue
-                    
-                post2_id = post2.get('_id', '')
-                post2_metadata = post2.get('_source', {}).get('metadata', {})
-                post2_comments = post2_metadata.get('num_comments', 0)
-                
-                # Similarity based on comments (link strength)
-                # We use a simple heuristic: normalize by the maximum comments
-                similarity = min(post1_comments, post2_comments) / max(max(post1_comments, post2_comments), 1)
-                
-                new_scores[post2_id] += damping_factor * scores[post1_id] * similarity
-                outgoing_score += similarity
-            
-            # If no outgoing links, distribute evenly
-            if outgoing_score < 0.001:
-                for post2_id in post_ids:
-                    if post1_id != post2_id:
-                        new_scores[post2_id] += damping_factor * scores[post1_id] / (len(posts) - 1)
-        
-        # Update scores
-        scores = new_scores
+    time_range = {}
+    if time_from:
+        time_range["gte"] = time_from
+    if time_to:
+        time_range["lte"] = time_to
+    if time_range:
+        filters.append({"range": {"metadata.time": time_range}})
+    return filters
+
+def build_text_query(query, sport=None, subreddit=None, time_from=None, time_to=None, query_mode=None):
+    """
+    Build the full-text query, restricted by any filters.
+    
+    Parameters are the query and filters of search_documents, plus:
+    - query_mode: One of QUERY_MODES, defaults to SEARCH_QUERY_MODE
     
-    return scores
+    Returns:
+    - Query clause for a request body
+    """
+    query_mode = query_mode or SEARCH_QUERY_MODE
+    if query_mode == "targeted":
+        # Boosted field list. simple_query_string never raises syntax errors:
+        # operators that do not parse are treated as text. 'lenient' only ignores
+        # format errors, e.g. a word queried against a numeric or date field.
+        text_query = {
+            "simple_query_string": {
+                "query": query,
+                "fields": TARGETED_QUERY_FIELDS,
+                "lenient": True
+            }
+        }
+    elif query_mode == "query_string":
+        # General query for full-text search across all fields
+        text_query = {"query_string": {"query": query}}
+    else:
+        raise ValueError(f"Invalid query_mode '{query_mode}'. Must be one of: {', '.join(QUERY_MODES)}")
+    
+    # Sport, subreddit and time range go in filter context: unscored and cached
+    filters = build_search_filters(sport, subreddit, time_from, time_to)
+    if filters:
+        text_query = {"bool": {"must": [text_query], "filter": filters}}
+    return text_query
 
-# Function to search documents
-def search_documents(query, index_name = os.getenv("ES_INDEX_NAME", "reddit_sports_data"), count=10, sort_method="relevance", weight_relevance=1.0, weight_score=1.0, weight_time=1.0, use_pagerank=False):
+def _boosted(clause, boost):
     """
-    Search documents with flexible ranking options.
+    Return a copy of a single-key query clause with a boost.
+    """
+    (name, body), = clause.items()
+    return {name: dict(body, boost=boost)}
+
+def build_search_query(query, count=10, sort_method="relevance", weight_relevance=1.0, weight_score=1.0, weight_time=1.0, use_pagerank=False, compact=False, paginate=False, search_after=None,
+                       sport=None, subreddit=None, time_from=None, time_to=None, query_mode=None, signals_only=False):
+    """
+    Build the Elasticsearch request body for a search.
     
-    Parameters:
-    - query: Search query string
-    - index_name: The Elasticsearch index name
-    - count: Number of results to request from Elasticsearch. The final unique count may be lower.
-    - sort_method: Ranking method ('relevance', 'score', 'time', 'combined')
-    - weight_relevance: Weight for relevance score when using 'combined' method
-    - weight_score: Weight for vote score when using 'combined' method
-    - weight_time: Weight for recency when using 'combined' method
-    - use_pagerank: Whether to apply PageRank-inspired ranking to results
+    Parameters are the same as for search_documents, plus:
+    - paginate: Add the post ID as a unique tiebreaker so pages can be continued with search_after
+    - search_after: Sort values of the last hit of the previous page
+    - signals_only: Ranking signals come from the signal store, so 'rerank'
+      candidates are fetched without '_source' (only IDs and scores)
+    
+    Returns:
+    - Request body for es.search
     """
+    if sort_method == "hybrid":
+        # First stage of the hybrid sort: the semantic candidates, lifted above
+        # everything else by a constant score, then the best BM25 matches. Both
+        # are blended in process_search_response and completed with build_fetch_query.
+        if use_pagerank:
+            raise ValueError(HYBRID_PAGERANK_MESSAGE)
+        semantic_ids = semantic_candidate_ids(query)
+        should = [build_text_query(query, query_mode=query_mode)]
+        if semantic_ids:
+            should.append({"constant_score": {"filter": {"ids": {"values": semantic_ids}},
+                                              "boost": SEMANTIC_CANDIDATE_BOOST, "_name": "semantic"}})
+        hybrid_query = {"should": should, "minimum_should_match": 1}
+        filters = build_search_filters(sport, subreddit, time_from, time_to)
+        if filters:
+            hybrid_query["filter"] = filters
+        return {
+            "query": {"bool": hybrid_query},
+            "size": len(semantic_ids) + max(SEMANTIC_CANDIDATES, count),
+            "_source": False,
+            "track_total_hits": False,
+            "collapse": {"field": COLLAPSE_FIELD}
+        }
+    
+    text_query = build_text_query(query, sport, subreddit, time_from, time_to, query_mode)
+    
+    if sort_method == "rerank":
+        # First stage of re-ranking: the best candidates by relevance, with only
+        # the card fields, or none when the signal store has their signals. The
+        # reranking module re-scores them, and the final 'count' are completed
+        # with build_fetch_query.
+        return {
+            "query": text_query,
+            "size": max(RERANK_CANDIDATES, count),
+            "_source": False if signals_only else COMPACT_SOURCE_FIELDS,
+            "track_total_hits": False,
+            "collapse": {"field": COLLAPSE_FIELD}
+        }
+    
     # Base query
     search_query = {
-        "query": {
-            "query_string": {
-                "query": query  # General query for full-text search across all fields
-            }
-        },
+        "query": text_query,
         "size": count # Request 'count' documents from Elasticsearch
     }
     
@@ -126,96 +324,221 @@ def search_documents(query, index_name = os.getenv("ES_INDEX_NAME", "reddit_spor
         search_query["sort"] = [{"metadata.time": {"order": "desc"}}]
         
     elif sort_method == "combined":
-        # Use function_score to create a custom ranking
+        # Relevance plus popularity and recency features. Each feature query has a
+        # bounded score, so Elasticsearch can skip hits that cannot reach the top
+        # 'count' instead of scoring every match as function_score does, as long
+        # as the search neither counts nor collapses the matches.
+        feature_boost = COMBINED_FEATURE_BOOST
         search_query = {
             "query": {
-                "function_score": {
-                    "query": {"query_string": {"query": query}},
-                    "functions": [
-                        # Relevance is already factored in by the base score
-                        # Score (upvotes) factor
-                        {
-                            "field_value_factor": {
-                                "field": "metadata.score",
-                                "factor": weight_score,
-                                "modifier": "log1p",  # log(1 + score) to reduce impact of extremely high scores
-                                "missing": 1
-                            }
-                        },
-                        # Time factor - boost recent posts
-                        {
-                            "gauss": {
-                                "metadata.time": {
-                                    "scale": "30d",  # Posts within 30 days get higher boost
-                                    "decay": 0.5,
-                                    "offset": "7d"
-                                }
-                            },
-                            "weight": weight_time
-                        }
-                    ],
-                    "boost_mode": "multiply",  # Multiply the relevance score by our custom factors
-                    "score_mode": "sum"  # Sum up the function scores
+                "bool": {
+                    "must": [_boosted(text_query, weight_relevance)],
+                    "should": [
+                        # Vote score, comments and awards (stored at index time as rank features)
+                        {"rank_feature": {"field": "features.score", "saturation": {}, "boost": weight_score * feature_boost}},
+                        {"rank_feature": {"field": "features.comments", "saturation": {}, "boost": weight_score * feature_boost / 2}},
+                        {"rank_feature": {"field": "features.awards", "saturation": {}, "boost": weight_score * feature_boost / 4}},
+                        # Recency: full boost for posts made now, half for posts RECENCY_PIVOT old
+                        {"distance_feature": {"field": "metadata.time", "origin": "now", "pivot": RECENCY_PIVOT,
+                                              "boost": weight_time * feature_boost}}
+                    ]
                 }
             },
-            "size": count
+            "size": count,
+            "track_total_hits": False  # Counting every match would prevent skipping
         }
     
-    # Execute search
-    response = es.search(index=index_name, body=search_query)
+    # Hits are already unique posts, since the post ID is the document _id, so the
+    # combined sort only collapses near-duplicate clusters: the collapsing collector
+    # scores every match, which would disable the skipping of the feature queries.
+    collapse = not (sort_method == "combined" and COLLAPSE_FIELD == "metadata.post_id")
+    
+    if use_pagerank:
+        # Rank by the PageRank precomputed at index time, keeping the method's order for ties
+        pagerank_sort = {"metadata.pagerank": {"order": "desc", "missing": "_last", "unmapped_type": "float"}}
+        search_query["sort"] = [pagerank_sort] + search_query.get("sort", ["_score"])
+    
+    if collapse and not search_after:
+        # Return one hit per Reddit post (or near-duplicate cluster), so 'count'
+        # unique posts come back in one round trip. Elasticsearch 7 cannot combine
+        # collapse with search_after; later pages rely on the post ID being the
+        # document _id, and are not collapsed on clusters.
+        search_query["collapse"] = {"field": COLLAPSE_FIELD}
+    
+    if paginate or search_after:
+        # A unique tiebreaker gives every hit a distinct position to continue from
+        search_query["sort"] = search_query.get("sort", ["_score"]) + [PAGINATION_TIEBREAKER]
+        if search_after:
+            search_query["search_after"] = search_after
+    
+    if compact:
+        # Fetch only the card fields, plus one bounded snippet of the post text
+        search_query["_source"] = COMPACT_SOURCE_FIELDS
+        search_query["highlight"] = SNIPPET_HIGHLIGHT
+    
+    return search_query
+
+# Function to build the request body for facet counts
+def build_facets_query(query, sport=None, subreddit=None, time_from=None, time_to=None, query_mode=None):
+    """
+    Build a size 0 request counting matching posts per sport, subreddit and month.
+    
+    Without hits the response is cached in each shard's request cache, so
+    repeated facet requests for a query are answered without recomputing.
+    
+    Parameters are the query, filters and query mode of search_documents.
     
+    Returns:
+    - Request body for es.search
+    """
+    return {
+        "size": 0,
+        "query": build_text_query(query, sport, subreddit, time_from, time_to, query_mode),
+        "aggs": FACET_AGGREGATIONS,
+    }
+
+# Function to complete two-stage (rerank, hybrid) results
+def build_fetch_query(query, post_ids, compact=False, sport=None, subreddit=None, time_from=None, time_to=None, query_mode=None):
+    """
+    Build the request that completes the results of a 'rerank' or 'hybrid' search.
+    
+    Candidates carry at most the card fields; this fetches the full metadata of
+    the final posts, or their card fields and highlighted snippets in compact mode.
+    
+    Parameters:
+    - query, filters, query_mode: Those of the search, used for highlighting
+    - post_ids: IDs of the final results
+    - compact: Fetch card fields and snippets instead of the full metadata
+    
+    Returns:
+    - Request body for es.search
+    """
+    ids_filter = {"ids": {"values": list(post_ids)}}
+    if not compact:
+        return {"query": {"bool": {"filter": [ids_filter]}}, "size": len(post_ids), "_source": ["metadata"]}
+    
+    # The text query is needed for highlighting, but does not restrict the hits
+    text_query = build_text_query(query, sport, subreddit, time_from, time_to, query_mode)
+    return {
+        "query": {"bool": {"should": [text_query], "filter": [ids_filter]}},
+        "size": len(post_ids),
+        "_source": COMPACT_SOURCE_FIELDS,
+        "highlight": SNIPPET_HIGHLIGHT
+    }
+
+def merge_fetch_response(data, response, compact=False):
+    """
+    Add the fetched metadata or snippets to two-stage results, in place.
+    
+    Parameters:
+    - data: Results returned by process_search_response
+    - response: Response to the build_fetch_query request
+    - compact: Whether snippets were fetched
+    """
+    fetched = {hit['_id']: hit for hit in response['hits']['hits']}
+    for hit_details in data:
+        hit = fetched.get(hit_details['id'])
+        if hit is None:
+            continue
+        hit_details.update(hit.get('_source', {}).get('metadata', {}))
+        if compact:
+            fragments = hit.get('highlight', {}).get('metadata.post_text', [])
+            hit_details['snippet'] = fragments[0] if fragments else ""
+
+def process_facets_response(response):
+    """
+    Turn the aggregations of a facet request into lists of values and counts.
+    
+    Returns:
+    - Dict with 'sport', 'subreddit' and 'time' lists of {"value", "count"}
+    """
+    aggregations = response.get('aggregations', {})
+    facets = {}
+    for name in FACET_AGGREGATIONS:
+        buckets = aggregations.get(name, {}).get('buckets', [])
+        facets[name] = [
+            {"value": bucket.get('key_as_string', bucket['key']), "count": bucket['doc_count']}
+            for bucket in buckets
+        ]
+    return facets
+
+# Function to turn an Elasticsearch response into API results
+def process_search_response(response, query, sort_method="relevance", use_pagerank=False, compact=False,
+                            count=None, weight_relevance=1.0, weight_score=1.0, weight_time=1.0, store=None):
+    """
+    Optionally PageRank-rank or re-rank, and format the hits of a search response.
+    
+    This is CPU-bound work with no I/O, so async callers run it in a worker thread.
+    
+    Parameters:
+    - response: Response returned by es.search
+    - query: Search query string (for logging)
+    - sort_method: Ranking method used for the search
+    - use_pagerank: Whether PageRank ranking was requested
+    - compact: Whether the search was built with compact=True
+    - count, weight_relevance, weight_score, weight_time: Used by the 'rerank'
+      method to pick the best 'count' candidates
+    - store: Signal store of the hits (default: the store of their index version)
+    
+    Returns:
+    - List of result dictionaries
+    """
     data = []
     # Process search results
     if response['hits']['hits']:
-        all_hits = response['hits']['hits'] # All hits from Elasticsearch
-    
-        # --- Start: Filter for unique Reddit posts ---
-        unique_hits_list = []
-        seen_identifiers = set() # To store unique identifiers
-
-        for hit in all_hits:
-            hit_metadata = hit.get('_source', {}).get('metadata', {})
-            
-            # Determine the unique identifier for the Reddit post.
-            # Priority: 
-            # 1. Reddit URL from metadata.get('url')
-            # 2. Reddit post ID from metadata.get('id') (assuming 'id' key in metadata stores the Reddit post ID)
-            #    Adjust 'id' if your Reddit post ID is stored under a different key (e.g., 'post_id', 'name').
-            # 3. Elasticsearch document ID hit.get('_id') as a fallback.
-            post_identifier = hit_metadata.get('url')
-            
-            if not post_identifier: # If URL is None or empty string
-                post_identifier = hit_metadata.get('id') 
-            
-            if not post_identifier: # If both URL and presumed Reddit ID are None or empty
-                post_identifier = hit.get('_id') # Fallback to Elasticsearch document ID
-
-            # Add to list if identifier is valid and not seen before
-            if post_identifier is not None and post_identifier not in seen_identifiers:
-                seen_identifiers.add(post_identifier)
-                unique_hits_list.append(hit)
-        # --- End: Filter for unique Reddit posts ---
+        # Hits are already unique Reddit posts: Elasticsearch collapses them on
+        # metadata.post_id (or metadata.cluster_id), and documents are indexed with
+        # the post ID as _id
+        results = list(response['hits']['hits'])
         
-        results = unique_hits_list # Use the filtered list of unique hits for further processing
+        # Memory-mapped ranking signals of the hits' index version, if it has a store
+        if store is None and signal_stores_loaded():
+            store = get_signal_store(results[0].get('_index', ''))
+        if store is None and '_source' not in results[0]:
+            print(f"⚠️ No signal store for '{results[0].get('_index')}'; ranking on relevance only.")
 
         pagerank_scores = {} # Initialize in case PageRank is not used or results are empty
         if use_pagerank and results: # Check if results is not empty before calculating PageRank
-            pagerank_scores = calculate_pagerank_score(results) # Pass unique results
-            
-            # Re-sort results based on PageRank scores
-            results.sort(key=lambda hit_item: pagerank_scores.get(hit_item.get('_id', ''), 0), reverse=True)
+            if store is not None:
+                pagerank = store.lookup(results)["pagerank"]
+                pagerank_scores = {
+                    hit_item.get('_id', ''): None if np.isnan(value) else value
+                    for hit_item, value in zip(results, pagerank.tolist())
+                }
+            else:
+                pagerank_scores = {
+                    hit_item.get('_id', ''): hit_item.get('_source', {}).get('metadata', {}).get('pagerank')
+                    for hit_item in results
+                }
             
-            ranking_method = f"{sort_method} with PageRank re-ranking"
+            if None in pagerank_scores.values():
+                # Index was built without global PageRank: fall back to re-ranking the hits
+                pagerank_scores = calculate_pagerank_score(results, store=store) # Pass unique results
+                if sort_method not in TWO_STAGE_METHODS:
+                    results.sort(key=lambda hit_item: pagerank_scores.get(hit_item.get('_id', ''), 0), reverse=True)
+                ranking_method = f"{sort_method} with PageRank re-ranking"
+            else:
+                ranking_method = f"{sort_method} with global PageRank"
         else:
             ranking_method = sort_method
         
-        # The number of 'results' might be less than 'count' if duplicates were removed.
+        rerank_scores = None
+        if sort_method == "rerank":
+            # Second stage: re-score all candidates with PageRank as one of the features
+            results, rerank_scores = rerank(results, count or len(results), weight_relevance, weight_score, weight_time,
+                                            pagerank_scores=pagerank_scores if use_pagerank else None, store=store)
+        
+        hybrid_scores = None
+        if sort_method == "hybrid":
+            # Second stage: blend BM25 with the vector similarity of every candidate
+            results, hybrid_scores, similarities = blend_semantic(results, query, count or len(results))
+        
         print(f"\nFound {len(results)} unique results for '{query}':\n")
         print(f"Ranking method: {ranking_method}\n")
         
         # Display results
         for hit in results: # Iterate over unique results
-            val = hit['_source']
+            val = hit.get('_source', {}) # Absent for candidates ranked from the signal store
             # Use a different variable name for metadata inside this loop to avoid confusion
             # with the 'hit_metadata' variable used earlier for uniqueness check.
             current_hit_metadata = val.get('metadata', {}) 
@@ -232,6 +555,18 @@ def search_documents(query, index_name = os.getenv("ES_INDEX_NAME", "reddit_spor
             else:
                 hit_details['pagerank_score'] = None
             
+            if rerank_scores is not None:
+                hit_details['rerank_score'] = float(rerank_scores[len(data)])
+            
+            if hybrid_scores is not None:
+                hit_details['semantic_similarity'] = float(similarities[len(data)])
+                hit_details['hybrid_score'] = float(hybrid_scores[len(data)])
+            
+            if compact:
+                # Highlighted snippet (<em> around matches) instead of the full post text
+                fragments = hit.get('highlight', {}).get('metadata.post_text', [])
+                hit_details['snippet'] = fragments[0] if fragments else ""
+            
             print(f"ID: {hit['_id']}, Score: {hit['_score']}") # Original print statement
             
             data.append(hit_details)
@@ -240,6 +575,731 @@ def search_documents(query, index_name = os.getenv("ES_INDEX_NAME", "reddit_spor
         
     return data
 
+def semantic_candidate_ids(query):
+    """
+    Post IDs of the SEMANTIC_CANDIDATES posts closest to a query in the semantic index.
+    """
+    semantic = get_semantic_index()
+    if semantic is None:
+        raise ValueError(NO_SEMANTIC_INDEX_MESSAGE)
+    ordinals, _ = semantic.search(query, SEMANTIC_CANDIDATES)
+    return [semantic.post_id(ordinal) for ordinal in ordinals]
+
+def blend_semantic(hits, query, count):
+    """
+    Rank hybrid candidates on BM25 blended with their vector similarity.
+    
+    BM25 scores are divided by the best one, so both parts range up to 1, and
+    the similarity weighs SEMANTIC_WEIGHT. Semantic candidates lose their
+    constant first-stage score.
+    
+    Parameters:
+    - hits: Candidates of a 'hybrid' search
+    - query: Search query string
+    - count: Number of hits to return
+    
+    Returns:
+    - Tuple of (best hits with their BM25 '_score', blended scores, similarities)
+    """
+    hits = [
+        dict(hit, _score=(hit['_score'] or 0.0) - SEMANTIC_CANDIDATE_BOOST) if 'semantic' in hit.get('matched_queries', []) else hit
+        for hit in hits
+    ]
+    bm25 = np.maximum([hit['_score'] or 0.0 for hit in hits], 0.0)
+    similarities = get_semantic_index().similarity(query, [hit['_id'] for hit in hits])
+    blended = (1 - SEMANTIC_WEIGHT) * bm25 / (bm25.max() or 1.0) + SEMANTIC_WEIGHT * np.maximum(similarities, 0)
+    
+    top = np.argpartition(-blended, count - 1)[:count] if count < len(blended) else np.arange(len(blended))
+    top = top[np.argsort(-blended[top], kind="stable")]
+    return [hits[i] for i in top], blended[top], similarities[top]
+
+# Searches against the embedded local index. Each function answers with the
+# same response shape as Elasticsearch, so the process_* functions are shared.
+def _duration_seconds(value):
+    """
+    Convert an Elasticsearch time unit string such as "30d" or "12h" to seconds.
+    """
+    units = {"d": 86400, "h": 3600, "m": 60, "s": 1}
+    value = str(value)
+    return float(value[:-1]) * units[value[-1]] if value[-1] in units else float(value) / 1000
+
+def _local_matches(local, query, sport=None, subreddit=None, time_from=None, time_to=None, query_mode=None):
+    """
+    BM25 scores and matches of a query and its filters in the local index.
+    
+    Returns:
+    - Tuple of (BM25 scores over all documents, ordinals of the matching documents)
+    """
+    query_mode = query_mode or SEARCH_QUERY_MODE
+    if query_mode not in QUERY_MODES:
+        raise ValueError(f"Invalid query_mode '{query_mode}'. Must be one of: {', '.join(QUERY_MODES)}")
+    scores, matched = local.match(query)
+    mask = local.filter_mask(sport, subreddit, time_from, time_to)
+    if mask is not None:
+        matched &= mask
+    return scores, np.flatnonzero(matched)
+
+def _local_hits(local, query, ordinals, scores, source_fields=None, compact=False):
+    """
+    Elasticsearch-shaped hits for documents of the local index.
+    
+    Parameters:
+    - ordinals, scores: Documents and the '_score' to report for each (None when sorted by a field)
+    - source_fields: Limit '_source' to these fields, as in a request body
+    - compact: Add a highlighted snippet of the post text
+    """
+    optional, required, _ = parse_query(query)
+    fields = [field.split(".", 1)[1] for field in source_fields] if source_fields else None
+    hits = []
+    for ordinal, score in zip(ordinals, scores):
+        metadata = local.source(ordinal)
+        hit = {"_index": LOCAL_INDEX_NAME, "_id": local.post_id(ordinal), "_score": score}
+        if compact:
+            snippet = highlight_snippet(metadata.get("post_text"), optional | required, SNIPPET_LENGTH)
+            if snippet:
+                hit["highlight"] = {"metadata.post_text": [snippet]}
+        if fields is not None:
+            metadata = {field: metadata[field] for field in fields if field in metadata}
+        hit["_source"] = {"metadata": metadata}
+        hits.append(hit)
+    return hits
+
+def local_search_response(query, count=10, sort_method="relevance", weight_relevance=1.0, weight_score=1.0, weight_time=1.0, use_pagerank=False, compact=False,
+                          sport=None, subreddit=None, time_from=None, time_to=None, query_mode=None):
+    """
+    Run the search that build_search_query describes against the local index.
+    
+    Sorting mirrors the Elasticsearch request: BM25 relevance, vote score or
+    time, the combined rank feature formula, or the 'rerank' and 'hybrid' candidates, with
+    global PageRank first when requested and the post ID as the final tiebreaker.
+    
+    Parameters are the same as for search_documents.
+    
+    Returns:
+    - Response shaped like the one of es.search, for process_search_response
+    """
+    local = get_local_index()
+    if local is None:
+        raise RuntimeError("No local index has been built. Run `python local_index.py` first.")
+    
+    scores, candidates = _local_matches(local, query, sport, subreddit, time_from, time_to, query_mode)
+    signals = local.signals.columns
+    semantic_ordinals = np.empty(0, dtype=np.int64)
+    if sort_method == "hybrid":
+        # Add the semantic candidates that pass the filters, with the constant first-stage score
+        if use_pagerank:
+            raise ValueError(HYBRID_PAGERANK_MESSAGE)
+        semantic_ids = semantic_candidate_ids(query)
+        semantic_ordinals, found = local.signals.ordinals(semantic_ids)
+        semantic_ordinals = semantic_ordinals[found]
+        mask = local.filter_mask(sport, subreddit, time_from, time_to)
+        if mask is not None:
+            semantic_ordinals = semantic_ordinals[mask[semantic_ordinals]]
+        candidates = np.union1d(candidates, semantic_ordinals)
+    reported = scores[candidates].astype(np.float64)
+    if len(semantic_ordinals):
+        reported += SEMANTIC_CANDIDATE_BOOST * np.isin(candidates, semantic_ordinals)
+    if sort_method == "score":
+        primary, reported = signals["score"][candidates].astype(np.float64), None
+    elif sort_method == "time":
+        primary, reported = np.nan_to_num(signals["time"][candidates], nan=-np.inf), None
+    elif sort_method == "combined":
+        # Same features as the combined request: saturated rank features around the
+        # index's geometric means, and a distance_feature on the post time
+        pivots = local.meta["feature_pivots"]
+        feature_boost = COMBINED_FEATURE_BOOST
+        popularity = 0.0
+        for name, column, share in (("score", "score", 1.0), ("comments", "num_comments", 0.5), ("awards", "awards", 0.25)):
+            values = 1 + np.maximum(signals[column][candidates].astype(np.float64), 0)
+            popularity = popularity + share * values / (values + pivots[name])
+        recency_pivot = _duration_seconds(RECENCY_PIVOT)
+        age = np.abs(datetime.datetime.now(datetime.timezone.utc).timestamp() - signals["time"][candidates])
+        recency = np.nan_to_num(recency_pivot / (recency_pivot + age), nan=0.0)
+        reported = weight_relevance * reported + weight_score * feature_boost * popularity + weight_time * feature_boost * recency
+        primary = reported
+    else:
+        primary = reported
+    
+    keys = [primary]
+    if use_pagerank and sort_method not in TWO_STAGE_METHODS:
+        keys.insert(0, np.nan_to_num(signals["pagerank"][candidates].astype(np.float64), nan=-np.inf))
+        reported = None
+    
+    size = count
+    if sort_method == "rerank":
+        size = max(RERANK_CANDIDATES, count)
+    elif sort_method == "hybrid":
+        size = len(semantic_ordinals) + max(SEMANTIC_CANDIDATES, count)
+    if len(candidates) > size:
+        # Keep everything tied with the size-th best leading key, then sort just those
+        threshold = np.partition(keys[0], len(candidates) - size)[len(candidates) - size]
+        keep = keys[0] >= threshold
+        candidates, keys = candidates[keep], [key[keep] for key in keys]
+        reported = reported[keep] if reported is not None else None
+    order = np.lexsort([candidates] + [-key for key in reversed(keys)])[:size]
+    
+    ordinals = candidates[order]
+    hit_scores = reported[order].tolist() if reported is not None else [None] * len(order)
+    if sort_method in TWO_STAGE_METHODS:
+        # Only IDs and scores: the candidates are ranked from the index's signal columns
+        # or the semantic index, and the final ones completed by local_fetch_response
+        hits = [{"_index": LOCAL_INDEX_NAME, "_id": local.post_id(ordinal), "_score": score}
+                for ordinal, score in zip(ordinals, hit_scores)]
+        for hit, ordinal in zip(hits, ordinals):
+            if ordinal in semantic_ordinals:
+                hit["matched_queries"] = ["semantic"]
+    else:
+        hits = _local_hits(local, query, ordinals, hit_scores, COMPACT_SOURCE_FIELDS if compact else None, compact)
+    return {"hits": {"hits": hits}}
+
+def local_fetch_response(query, post_ids, compact=False):
+    """
+    Answer a build_fetch_query request for two-stage results from the local index.
+    
+    Returns:
+    - Response shaped like the one of es.search, for merge_fetch_response
+    """
+    local = get_local_index()
+    ordinals, found = local.signals.ordinals(post_ids)
+    ordinals = ordinals[found]
+    return {"hits": {"hits": _local_hits(local, query, ordinals, [None] * len(ordinals),
+                                         COMPACT_SOURCE_FIELDS if compact else None, compact)}}
+
+def local_facets_response(query, sport=None, subreddit=None, time_from=None, time_to=None, query_mode=None):
+    """
+    Answer a build_facets_query request from the local index.
+    
+    Returns:
+    - Response shaped like the one of es.search, for process_facets_response
+    """
+    local = get_local_index()
+    if local is None:
+        raise RuntimeError("No local index has been built. Run `python local_index.py` first.")
+    _, candidates = _local_matches(local, query, sport, subreddit, time_from, time_to, query_mode)
+    
+    aggregations = {}
+    for name, codes, values in (("sport", local.sport_codes, local.meta["sports"]),
+                                ("subreddit", local.subreddit_codes, local.meta["subreddits"])):
+        counts = np.bincount(codes[candidates], minlength=len(values))
+        # Terms aggregations order by count, then by value
+        top = sorted((code for code in np.flatnonzero(counts) if values[code]),
+                     key=lambda code: (-counts[code], values[code]))[:FACET_SIZE]
+        aggregations[name] = {"buckets": [{"key": values[code], "doc_count": int(counts[code])} for code in top]}
+    
+    post_times = local.signals.columns["time"][candidates]
+    months, counts = np.unique(post_times[~np.isnan(post_times)].astype("datetime64[s]").astype("datetime64[M]"),
+                               return_counts=True)
+    aggregations["time"] = {"buckets": [
+        {"key": int(month.astype("datetime64[ms]").astype(np.int64)), "key_as_string": str(month), "doc_count": int(count)}
+        for month, count in zip(months, counts)
+    ]}
+    return {"aggregations": aggregations}
+
+def search_local(query, count=10, sort_method="relevance", weight_relevance=1.0, weight_score=1.0, weight_time=1.0, use_pagerank=False, compact=False,
+                 sport=None, subreddit=None, time_from=None, time_to=None, query_mode=None):
+    """
+    Search the local index, returning the same results as search_documents.
+    
+    Parameters are the same as for search_documents.
+    """
+    response = local_search_response(query, count, sort_method, weight_relevance, weight_score, weight_time, use_pagerank, compact,
+                                     sport, subreddit, time_from, time_to, query_mode)
+    data = process_search_response(response, query, sort_method, use_pagerank, compact,
+                                   count, weight_relevance, weight_score, weight_time, get_local_index().signals)
+    if sort_method in TWO_STAGE_METHODS and data:
+        merge_fetch_response(data, local_fetch_response(query, [hit['id'] for hit in data], compact), compact)
+    return data
+
+def _local_fallback(error):
+    """
+    Whether a failed Elasticsearch request can be answered from the local index.
+    """
+    if SEARCH_BACKEND != "auto" or not isinstance(error, ElasticsearchConnectionError) or get_local_index() is None:
+        return False
+    print("⚠️ Elasticsearch is unreachable; answering from the local index.")
+    return True
+
+# Function to search documents
+def search_documents(query, index_name = os.getenv("ES_INDEX_NAME", "reddit_sports_data"), count=10, sort_method="relevance", weight_relevance=1.0, weight_score=1.0, weight_time=1.0, use_pagerank=False, compact=False,
+                     sport=None, subreddit=None, time_from=None, time_to=None, query_mode=None):
+    """
+    Search documents with flexible ranking options.
+    
+    Parameters:
+    - query: Search query string
+    - index_name: The Elasticsearch index name
+    - count: Number of unique posts to return
+    - sort_method: Ranking method ('relevance', 'score', 'time', 'combined', 'rerank', 'hybrid')
+    - weight_relevance: Weight for relevance score when using 'combined' or 'rerank'
+    - weight_score: Weight for vote score when using 'combined' or 'rerank'
+    - weight_time: Weight for recency when using 'combined' or 'rerank'
+    - use_pagerank: Whether to apply PageRank-inspired ranking to results
+    - compact: Return only the fields a result card needs and a highlighted
+      'snippet' of at most SNIPPET_LENGTH characters instead of the post bodies
+    - sport: Only return posts of this sports category (or list of categories)
+    - subreddit: Only return posts from this subreddit (or list of subreddits)
+    - time_from: Only return posts made at or after this time, e.g. "2025-01-01"
+    - time_to: Only return posts made at or before this time
+    - query_mode: 'query_string' (Lucene syntax over all fields) or 'targeted'
+      (safe simple query syntax over boosted title, subreddit, sport and post
+      text); defaults to SEARCH_QUERY_MODE
+    
+    With SEARCH_BACKEND=local, or with "auto" while the cluster is unreachable,
+    the search runs against the local index instead (see search_local).
+    """
+    local_args = (query, count, sort_method, weight_relevance, weight_score, weight_time, use_pagerank, compact,
+                  sport, subreddit, time_from, time_to, query_mode)
+    if SEARCH_BACKEND == "local":
+        return search_local(*local_args)
+    
+    signals_only = sort_method == "rerank" and has_signal_store(resolve_index_version(index_name))
+    search_query = build_search_query(query, count, sort_method, weight_relevance, weight_score, weight_time, use_pagerank, compact,
+                                      sport=sport, subreddit=subreddit, time_from=time_from, time_to=time_to,
+                                      query_mode=query_mode, signals_only=signals_only)
+    
+    # Execute search
+    try:
+        response = es.search(index=index_name, body=search_query)
+    except ElasticsearchConnectionError as e:
+        if not _local_fallback(e):
+            raise
+        return search_local(*local_args)
+    
+    data = process_search_response(response, query, sort_method, use_pagerank, compact,
+                                   count, weight_relevance, weight_score, weight_time)
+    if sort_method in TWO_STAGE_METHODS and data:
+        post_ids = [hit['id'] for hit in data]
+        fetch_query = build_fetch_query(query, post_ids, compact, sport, subreddit, time_from, time_to, query_mode)
+        try:
+            fetch_response = es.search(index=index_name, body=fetch_query)
+        except ElasticsearchConnectionError as e:
+            if not _local_fallback(e):
+                raise
+            fetch_response = local_fetch_response(query, post_ids, compact)
+        merge_fetch_response(data, fetch_response, compact)
+    return data
+
+# Functions to encode and decode pagination cursors
+def _cursor_fingerprint(query, count, sort_method, weight_relevance, weight_score, weight_time, use_pagerank, filters=None, query_mode=None):
+    """
+    Hash of the search parameters a cursor was issued for.
+    """
+    filters = {name: value for name, value in (filters or {}).items() if value}
+    params = [" ".join(query.split()), count, sort_method, weight_relevance, weight_score, weight_time, bool(use_pagerank), filters,
+              query_mode or SEARCH_QUERY_MODE]
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+def encode_cursor(index_name, search_after, fingerprint):
+    """
+    Build an opaque cursor for the next page.
+    
+    Parameters:
+    - index_name: Concrete index version the first page was served from
+    - search_after: Sort values of the last hit on the current page
+    - fingerprint: Hash of the search parameters
+    
+    Returns:
+    - URL-safe cursor string
+    """
+    payload = json.dumps({"i": index_name, "a": search_after, "f": fingerprint}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor, fingerprint):
+    """
+    Decode a cursor and check it belongs to the same search.
+    
+    Parameters:
+    - cursor: Cursor returned with a previous page
+    - fingerprint: Hash of the current search parameters
+    
+    Returns:
+    - Tuple of (index name, search_after values)
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        index_name, search_after, cursor_fingerprint = payload["i"], payload["a"], payload["f"]
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+    if cursor_fingerprint != fingerprint:
+        raise ValueError("Cursor does not match the search parameters")
+    return index_name, search_after
+
+# Async search returning one page and a cursor for the next
+async def search_page_async(query, index_name = os.getenv("ES_INDEX_NAME", "reddit_sports_data"), count=10, sort_method="relevance", weight_relevance=1.0, weight_score=1.0, weight_time=1.0, use_pagerank=False, compact=False, cursor=None,
+                            sport=None, subreddit=None, time_from=None, time_to=None, query_mode=None):
+    """
+    Non-blocking search returning one page of results and a cursor for the next.
+    
+    The Elasticsearch round trip goes through the shared async client, and the
+    post-processing runs in a worker thread, so the event loop stays free to
+    serve other requests. Call open_async_client() first.
+    
+    Pages continue with search_after on a unique post ID tiebreaker, so every
+    page costs the same however deep it is. The cursor pins the concrete index
+    version behind the alias, so a reindex running meanwhile does not shift
+    results between pages (the OSS cluster has no point-in-time API).
+    
+    Parameters are the same as for search_documents, plus:
+    - cursor: Cursor returned with the previous page, or None for the first page
+    
+    Results from the local index (see search_documents) come as a single page.
+    
+    Returns:
+    - Tuple of (results, cursor for the next page or None on the last page)
+    """
+    local_args = (query, count, sort_method, weight_relevance, weight_score, weight_time, use_pagerank, compact,
+                  sport, subreddit, time_from, time_to, query_mode)
+    if SEARCH_BACKEND == "local":
+        if cursor:
+            raise ValueError(LOCAL_CURSOR_MESSAGE)
+        return await asyncio.to_thread(search_local, *local_args), None
+    
+    if async_es is None:
+        raise RuntimeError("Async Elasticsearch client is not open. Call open_async_client() first.")
+    
+    filters = {"sport": sport, "subreddit": subreddit, "time_from": time_from, "time_to": time_to}
+    version = await resolve_index_version_async(index_name) if sort_method == "rerank" else None
+    index_name, search_query, fingerprint = _page_request(query, index_name, count, sort_method, weight_relevance,
+                                                          weight_score, weight_time, use_pagerank, compact, cursor, filters,
+                                                          query_mode, version)
+    
+    # Execute search without blocking the event loop
+    try:
+        response = await async_es.search(index=index_name, body=search_query)
+    except NotFoundError:
+        if cursor:
+            raise ValueError(CURSOR_EXPIRED_MESSAGE)
+        raise
+    except ElasticsearchConnectionError as e:
+        # Pages of a cursor cannot be continued on another backend
+        if cursor or not _local_fallback(e):
+            raise
+        return await asyncio.to_thread(search_local, *local_args), None
+    
+    next_cursor = _next_cursor(response, count, fingerprint)
+    results = await asyncio.to_thread(process_search_response, response, query, sort_method, use_pagerank, compact,
+                                      count, weight_relevance, weight_score, weight_time)
+    if sort_method in TWO_STAGE_METHODS and results:
+        post_ids = [hit['id'] for hit in results]
+        fetch_query = build_fetch_query(query, post_ids, compact, query_mode=query_mode, **filters)
+        try:
+            fetch_response = await async_es.search(index=index_name, body=fetch_query)
+        except ElasticsearchConnectionError as e:
+            if not _local_fallback(e):
+                raise
+            fetch_response = await asyncio.to_thread(local_fetch_response, query, post_ids, compact)
+        merge_fetch_response(results, fetch_response, compact)
+    return results, next_cursor
+
+CURSOR_EXPIRED_MESSAGE = "Cursor has expired because its index version was removed; start the search again"
+LOCAL_CURSOR_MESSAGE = "Cursors are not supported by the local search backend"
+
+def _page_request(query, index_name, count, sort_method, weight_relevance, weight_score, weight_time, use_pagerank, compact, cursor, filters=None,
+                  query_mode=None, version=None):
+    """
+    Resolve the index and request body for one page of a search.
+    
+    'version' is the index version behind index_name (see resolve_index_version);
+    'rerank' candidates are fetched without '_source' only if it has a signal store.
+    
+    Returns:
+    - Tuple of (index to search, request body, cursor fingerprint)
+    """
+    filters = filters or {}
+    fingerprint = _cursor_fingerprint(query, count, sort_method, weight_relevance, weight_score, weight_time, use_pagerank, filters,
+                                      query_mode)
+    search_after = None
+    if cursor:
+        if sort_method in TWO_STAGE_METHODS:
+            raise ValueError(f"Cursors are not supported with sort_method '{sort_method}'")
+        index_name, search_after = decode_cursor(cursor, fingerprint)
+    
+    search_query = build_search_query(query, count, sort_method, weight_relevance, weight_score, weight_time, use_pagerank,
+                                      compact, paginate=True, search_after=search_after, query_mode=query_mode,
+                                      signals_only=has_signal_store(version), **filters)
+    return index_name, search_query, fingerprint
+
+def _next_cursor(response, count, fingerprint):
+    """
+    Cursor continuing after the last hit of a full page, or None on the last page.
+    """
+    hits = response['hits']['hits']
+    if len(hits) < count or 'sort' not in hits[-1]:
+        # Last page, or a re-ranked search that cannot be continued
+        return None
+    return encode_cursor(hits[-1]['_index'], hits[-1]['sort'], fingerprint)
+
+# Async search for many queries in one multi-search round trip
+async def search_batch_async(searches, index_name = os.getenv("ES_INDEX_NAME", "reddit_sports_data")):
+    """
+    Run several searches as one Elasticsearch multi-search request.
+    
+    Each search is ranked and formatted on its own, exactly as by
+    search_page_async, and a failing search does not fail the others.
+    Call open_async_client() first.
+    
+    Parameters:
+    - searches: List of dicts with the keyword arguments of search_page_async
+      (query, count, sort_method, weights, use_pagerank, compact, cursor, filters and query_mode)
+    - index_name: The Elasticsearch index name or alias
+    
+    Returns:
+    - List with one entry per search, in order: either
+      {"status": "success", "data": [...], "next_cursor": ...} or
+      {"status": "error", "message": ...}
+    """
+    if SEARCH_BACKEND == "local":
+        return await asyncio.to_thread(_local_batch, searches)
+    
+    if async_es is None:
+        raise RuntimeError("Async Elasticsearch client is not open. Call open_async_client() first.")
+    
+    outcomes = [None] * len(searches)
+    pending = []  # (position, search, fingerprint)
+    body = []
+    for position, search in enumerate(searches):
+        try:
+            version = None
+            if search.get("sort_method") == "rerank":
+                version = await resolve_index_version_async(index_name)
+            page_index, search_query, fingerprint = _page_request(
+                search["query"], index_name, search.get("count", 10),
+                search.get("sort_method", "relevance"), search.get("weight_relevance", 1.0),
+                search.get("weight_score", 1.0), search.get("weight_time", 1.0),
+                search.get("use_pagerank", False), search.get("compact", False), search.get("cursor"),
+                {name: search.get(name) for name in FILTER_PARAMS}, search.get("query_mode"), version)
+        except ValueError as e:
+            outcomes[position] = {"status": "error", "message": str(e)}
+            continue
+        pending.append((position, search, fingerprint))
+        body.extend([{"index": page_index}, search_query])
+    
+    if not pending:
+        return outcomes
+    
+    # One round trip for the whole batch; Elasticsearch runs the searches in parallel
+    try:
+        response = await async_es.msearch(body=body)
+    except ElasticsearchConnectionError as e:
+        if not _local_fallback(e):
+            raise
+        return await asyncio.to_thread(_local_batch, searches)
+    
+    def process_all():
+        # Rank and format every sub-response in one worker thread
+        for (position, search, fingerprint), sub_response in zip(pending, response["responses"]):
+            if "error" in sub_response:
+                message = _msearch_error(sub_response)
+                if search.get("cursor") and sub_response.get("status") == 404:
+                    message = CURSOR_EXPIRED_MESSAGE
+                outcomes[position] = {"status": "error", "message": message}
+                continue
+            try:
+                results = process_search_response(sub_response, search["query"], search.get("sort_method", "relevance"),
+                                                  search.get("use_pagerank", False), search.get("compact", False),
+                                                  search.get("count", 10), search.get("weight_relevance", 1.0),
+                                                  search.get("weight_score", 1.0), search.get("weight_time", 1.0))
+                next_cursor = _next_cursor(sub_response, search.get("count", 10), fingerprint)
+                outcomes[position] = {"status": "success", "data": results, "next_cursor": next_cursor}
+            except Exception as e:
+                outcomes[position] = {"status": "error", "message": str(e)}
+    
+    await asyncio.to_thread(process_all)
+    
+    # Complete re-ranked results with a second multi-search for all of them
+    fetches = [
+        (position, search, [hit['id'] for hit in outcomes[position]["data"]]) for position, search, _ in pending
+        if search.get("sort_method") in TWO_STAGE_METHODS and outcomes[position]["status"] == "success" and outcomes[position]["data"]
+    ]
+    if fetches:
+        body = []
+        for position, search, post_ids in fetches:
+            filters = {name: search.get(name) for name in FILTER_PARAMS}
+            body.extend([{"index": index_name}, build_fetch_query(search["query"], post_ids, search.get("compact", False),
+                                                                  query_mode=search.get("query_mode"), **filters)])
+        try:
+            sub_responses = (await async_es.msearch(body=body))["responses"]
+        except Exception as e:
+            # Only the searches that needed the fetch fail
+            if not _local_fallback(e):
+                for position, _, _ in fetches:
+                    outcomes[position] = {"status": "error", "message": str(e)}
+                return outcomes
+            sub_responses = await asyncio.to_thread(
+                lambda: [local_fetch_response(search["query"], post_ids, search.get("compact", False))
+                         for _, search, post_ids in fetches])
+        for (position, search, _), sub_response in zip(fetches, sub_responses):
+            if "error" in sub_response:
+                outcomes[position] = {"status": "error", "message": _msearch_error(sub_response)}
+            else:
+                merge_fetch_response(outcomes[position]["data"], sub_response, search.get("compact", False))
+    return outcomes
+
+def _msearch_error(sub_response):
+    """
+    Error message of a failed multi-search sub-response.
+    """
+    error = sub_response["error"]
+    return error.get("reason", str(error)) if isinstance(error, dict) else str(error)
+
+def _local_batch(searches):
+    """
+    Run the searches of search_batch_async one by one against the local index.
+    """
+    outcomes = []
+    for search in searches:
+        if search.get("cursor"):
+            outcomes.append({"status": "error", "message": LOCAL_CURSOR_MESSAGE})
+            continue
+        try:
+            results = search_local(search["query"], search.get("count", 10), search.get("sort_method", "relevance"),
+                                   search.get("weight_relevance", 1.0), search.get("weight_score", 1.0),
+                                   search.get("weight_time", 1.0), search.get("use_pagerank", False),
+                                   search.get("compact", False), query_mode=search.get("query_mode"),
+                                   **{name: search.get(name) for name in FILTER_PARAMS})
+            outcomes.append({"status": "success", "data": results, "next_cursor": None})
+        except Exception as e:
+            outcomes.append({"status": "error", "message": str(e)})
+    return outcomes
+
+# Async variant of search_documents for the API
+async def search_documents_async(query, index_name = os.getenv("ES_INDEX_NAME", "reddit_sports_data"), count=10, sort_method="relevance", weight_relevance=1.0, weight_score=1.0, weight_time=1.0, use_pagerank=False, compact=False,
+                                 sport=None, subreddit=None, time_from=None, time_to=None, query_mode=None):
+    """
+    Non-blocking version of search_documents (first page of search_page_async).
+    
+    Parameters are the same as for search_documents.
+    """
+    results, _ = await search_page_async(query, index_name, count, sort_method, weight_relevance, weight_score, weight_time, use_pagerank, compact,
+                                         sport=sport, subreddit=subreddit, time_from=time_from, time_to=time_to,
+                                         query_mode=query_mode)
+    return results
+
+# Async facet counts for the API
+async def search_facets_async(query, index_name = os.getenv("ES_INDEX_NAME", "reddit_sports_data"), sport=None, subreddit=None, time_from=None, time_to=None,
+                              query_mode=None):
+    """
+    Non-blocking facet counts for a search, served from the shard request cache when possible.
+    
+    Call open_async_client() first.
+    
+    Parameters are the query, index, filters and query mode of search_documents.
+    
+    Returns:
+    - Dict with 'sport', 'subreddit' and 'time' lists of {"value", "count"}
+    """
+    local_args = (query, sport, subreddit, time_from, time_to, query_mode)
+    if SEARCH_BACKEND == "local":
+        return process_facets_response(await asyncio.to_thread(local_facets_response, *local_args))
+    
+    if async_es is None:
+        raise RuntimeError("Async Elasticsearch client is not open. Call open_async_client() first.")
+    
+    body = build_facets_query(query, sport, subreddit, time_from, time_to, query_mode)
+    try:
+        response = await async_es.search(index=index_name, body=body, request_cache=True)
+    except ElasticsearchConnectionError as e:
+        if not _local_fallback(e):
+            raise
+        response = await asyncio.to_thread(local_facets_response, *local_args)
+    return process_facets_response(response)
+
+# Function to build the request body for typeahead suggestions
+def build_suggest_query(prefix, size=SUGGEST_SIZE):
+    """
+    Build a completion suggester request for titles, subreddits and sports starting with `prefix`.
+    
+    Parameters:
+    - prefix: Text typed so far
+    - size: Maximum number of suggestions
+    
+    Returns:
+    - Request body for es.search
+    """
+    return {
+        "_source": False,  # Only the suggestion text is needed
+        "suggest": {
+            "typeahead": {
+                "prefix": prefix,
+                "completion": {"field": "suggest", "size": size, "skip_duplicates": True}
+            }
+        }
+    }
+
+def process_suggest_response(response):
+    """
+    Extract the suggestion texts of a completion suggester response.
+    
+    Returns:
+    - List of suggestion strings, best first
+    """
+    entries = response.get('suggest', {}).get('typeahead', [])
+    return [option['text'] for entry in entries for option in entry.get('options', [])]
+
+# Async typeahead suggestions for the API
+async def suggest_async(prefix, index_name = os.getenv("ES_INDEX_NAME", "reddit_sports_data"), size=SUGGEST_SIZE):
+    """
+    Non-blocking typeahead suggestions for the search bar.
+    
+    The completion suggester answers from an in-memory FST built at index time,
+    without running a search. Call open_async_client() first.
+    
+    Parameters:
+    - prefix: Text typed so far
+    - index_name: The Elasticsearch index name or alias
+    - size: Maximum number of suggestions
+    
+    Returns:
+    - List of suggestion strings, best first
+    """
+    if async_es is None:
+        raise RuntimeError("Async Elasticsearch client is not open. Call open_async_client() first.")
+    
+    response = await async_es.search(index=index_name, body=build_suggest_query(prefix, size))
+    return process_suggest_response(response)
+
+# Async lookup of a single post for the API
+async def get_post_async(post_id, index_name = os.getenv("ES_INDEX_NAME", "reddit_sports_data")):
+    """
+    Fetch one post with all of its fields, e.g. to show the full text of a compact result.
+    
+    Parameters:
+    - post_id: Reddit post ID (the 'id' of a search result)
+    - index_name: The Elasticsearch index name or alias
+    
+    Returns:
+    - Result dictionary with the full metadata, or None if the post is not indexed
+    """
+    if SEARCH_BACKEND == "local":
+        return get_local_post(post_id)
+    
+    if async_es is None:
+        raise RuntimeError("Async Elasticsearch client is not open. Call open_async_client() first.")
+    
+    # Documents are indexed with the post ID as _id, so this is a direct lookup
+    try:
+        hit = await async_es.get(index=index_name, id=post_id)
+    except NotFoundError:
+        return None
+    except ElasticsearchConnectionError as e:
+        if not _local_fallback(e):
+            raise
+        return get_local_post(post_id)
+    return {'id': hit['_id'], **hit['_source'].get('metadata', {})}
+
+def get_local_post(post_id):
+    """
+    Look up one post in the local index, like get_post_async.
+    """
+    local = get_local_index()
+    if local is None:
+        raise RuntimeError("No local index has been built. Run `python local_index.py` first.")
+    ordinals, found = local.signals.ordinals([post_id])
+    if not found[0]:
+        return None
+    return {'id': post_id, **local.source(ordinals[0])}
+
 # Helper function to explain ranking methods
 def explain_ranking_methods():
     print("\n=== Available Ranking Methods ===")
@@ -248,6 +1308,10 @@ def explain_ranking_methods():
     print("3. time: Sort by post time (most recent first)")
     print("4. combined: Custom ranking combining relevance, score, and time")
     print("   (You'll be able to set weights for each factor)")
+    print("5. rerank: Re-scores the top candidates on relevance, votes, comments,")
+    print("   upvote ratio, awards, recency and PageRank, using the same weights")
+    print("6. hybrid: Blends keyword relevance with semantic similarity, so posts")
+    print("   phrased differently from the query can still rank")
     print("\nPageRank Option:")
     print("- You can apply PageRank-inspired ranking to any of the above methods")
     print("- This ranking considers both the number of comments and vote scores")
@@ -277,15 +1341,17 @@ if __name__ == "__main__":
             count = int(input("Enter number of results to return: "))
             
             print("\nSelect ranking method:")
-            print("1. relevance  2. score  3. time  4. combined")
-            sort_choice = input("Enter choice (1-4) [default: 1]: ").strip()
+            print("1. relevance  2. score  3. time  4. combined  5. rerank  6. hybrid")
+            sort_choice = input("Enter choice (1-6) [default: 1]: ").strip()
             
             # Map choices to sort methods
             sort_method_map = {
                 "1": "relevance", 
                 "2": "score", 
                 "3": "time", 
-                "4": "combined"
+                "4": "combined",
+                "5": "rerank",
+                "6": "hybrid"
             }
             
             # Default to relevance if empty input
@@ -296,7 +1362,7 @@ if __name__ == "__main__":
             weight_score = 1.0
             weight_time = 1.0
             
-            if sort_method == "combined":
+            if sort_method in ("combined", "rerank"):
                 print("\nEnter weights for combined ranking (0.1-10.0):")
                 weight_relevance = float(input("Relevance weight [default: 1.0]: ") or 1.0)
                 weight_score = float(input("Score/votes weight [default: 1.0]: ") or 1.0)
@@ -309,8 +1375,10 @@ if __name__ == "__main__":
                         weight_relevance = weight_score = weight_time = 1.0
                         break
             
-            # Ask if user wants to use PageRank
-            use_pagerank = input("\nApply PageRank-inspired ranking? (y/n) [default: n]: ").lower().strip() == "y"
+            # Ask if user wants to use PageRank (the hybrid blend has no PageRank ordering)
+            use_pagerank = False
+            if sort_method != "hybrid":
+                use_pagerank = input("\nApply PageRank-inspired ranking? (y/n) [default: n]: ").lower().strip() == "y"
             
             if use_pagerank:
                 print("PageRank-inspired ranking will be applied to the search results.")
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+Semantic Index
+
+Dense document vectors computed on the CPU from the same `text` field that is
+sent to Elasticsearch: TF-IDF weights projected onto their top singular
+vectors (latent semantic analysis), so posts about "goalkeeper blunders" and
+"keeper mistakes" end up close together when the corpus uses the words alike.
+
+Vectors are stored as an int8 matrix with one scale per dimension, grouped by
+an inverted file of k-means clusters. A query scores the cluster centroids,
+then only the vectors of the closest SEMANTIC_PROBES clusters; probes=None
+scans every vector. Document ordinals follow the sorted post IDs, like the
+signal store and the local index.
+"""
+
+import json
+import os
+import shutil
+import time
+from collections import Counter
+import numpy as np
+
+# Fix for numpy float type compatibility
+np.float_ = np.float64
+
+from local_index import document_text, parse_query, tokenize
+
+# Directory of the semantic index
+SEMANTIC_INDEX_DIR = os.getenv("SEMANTIC_INDEX_DIR", "./semantic_index")
+# Dimensions of the document vectors
+SEMANTIC_DIMENSIONS = int(os.getenv("SEMANTIC_DIMENSIONS", "128"))
+# Most frequent terms kept in the vocabulary; rarer terms carry little shared meaning
+SEMANTIC_VOCABULARY = int(os.getenv("SEMANTIC_VOCABULARY", "50000"))
+# Clusters scanned per query
+SEMANTIC_PROBES = int(os.getenv("SEMANTIC_PROBES", "32"))
+
+# Rows multiplied at once by the sparse products, bounding their temporary memory
+SPARSE_CHUNK_ROWS = 20000
+
+
+def _sparse_dot(indptr, indices, data, dense):
+    """
+    Multiply a CSR matrix by a dense matrix.
+
+    Args:
+        indptr, indices, data (np.ndarray): CSR arrays of the sparse matrix
+        dense (np.ndarray): Dense matrix with one row per sparse column
+
+    Returns:
+        np.ndarray: Dense product as float32
+    """
+    rows = len(indptr) - 1
+    result = np.zeros((rows, dense.shape[1]), dtype=np.float32)
+    for first in range(0, rows, SPARSE_CHUNK_ROWS):
+        last = min(first + SPARSE_CHUNK_ROWS, rows)
+        start, end = indptr[first], indptr[last]
+        if start == end:
+            continue
+        products = data[start:end, None] * dense[indices[start:end]]
+        # reduceat needs non-empty segments, so only sum rows with entries
+        offsets = indptr[first:last] - start
+        nonempty = np.flatnonzero(np.diff(indptr[first:last + 1]) > 0)
+        result[first + nonempty] = np.add.reduceat(products, offsets[nonempty], axis=0)
+    return result
+
+
+def _transpose(indptr, indices, data, columns):
+    """Convert CSR arrays to the CSR arrays of the transposed matrix."""
+    order = np.argsort(indices, kind="stable")
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    transposed_indptr = np.r_[0, np.cumsum(np.bincount(indices, minlength=columns))]
+    return transposed_indptr, rows[order], data[order]
+
+
+def _orthonormal(matrix):
+    """Orthonormal basis of the columns of a matrix."""
+    return np.linalg.qr(matrix)[0].astype(np.float32)
+
+
+def _kmeans(vectors, clusters, iterations=10, seed=0):
+    """
+    Spherical k-means on unit vectors.
+
+    Returns:
+        np.ndarray: Unit-length centroids, one per row
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # Empty clusters keep their previous centroid
+        centroids = np.where(norms > 0, sums / np.where(norms > 0, norms, 1), centroids)
+    return centroids.astype(np.float32)
+
+
+def _assign(vectors, centroids):
+    """Nearest centroid of every vector, computed in chunks."""
+    return np.concatenate([
+        np.argmax(vectors[first:first + SPARSE_CHUNK_ROWS] @ centroids.T, axis=1)
+        for first in range(0, len(vectors), SPARSE_CHUNK_ROWS)
+    ]) if len(vectors) else np.empty(0, dtype=np.int64)
+
+
+def build_semantic_index(documents, directory=SEMANTIC_INDEX_DIR, dimensions=SEMANTIC_DIMENSIONS,
+                         vocabulary_size=SEMANTIC_VOCABULARY, seed=0):
+    """
+    Compute document vectors and atomically replace the semantic index on disk.
+
+    TF-IDF rows (sublinear term frequency, L2-normalized) are reduced with a
+    randomized truncated SVD. Posts are identified by their Reddit ID, and a
+    post seen several times keeps its last version.
+
+    Args:
+        documents (iterable): Documents prepared by prepare_document
+        directory (str): Directory to write the index to
+        dimensions (int): Dimensions of the document vectors
+        vocabulary_size (int): Most frequent terms to keep
+        seed (int): Random seed
+
+    Returns:
+        str: Path of the written index
+    """
+    latest = {}
+    for doc in documents:
+        latest[doc["metadata"]["post_id"]] = document_text(doc)
+    post_ids = sorted(latest)
+    term_counts = [Counter(tokenize(latest[post_id])) for post_id in post_ids]
+    del latest
+
+    # Vocabulary: the most frequent terms occurring in at least two posts
+    document_frequency = Counter(term for counts in term_counts for term in counts)
+    kept = sorted(term for term, _ in document_frequency.most_common(vocabulary_size) if document_frequency[term] > 1)
+    term_ids = {term: position for position, term in enumerate(kept)}
+    count = len(post_ids)
+    idf = np.array([np.log((1 + count) / (1 + document_frequency[term])) + 1 for term in kept], dtype=np.float32)
+
+    # TF-IDF rows as CSR arrays
+    indptr, indices, data = [0], [], []
+    for counts in term_counts:
+        row = [(term_ids[term], tf) for term, tf in counts.items() if term in term_ids]
+        indices.extend(position for position, _ in row)
+        data.extend(1 + np.log(tf) for _, tf in row)
+        indptr.append(len(indices))
+    del term_counts
+    indptr = np.array(indptr, dtype=np.int64)
+    indices = np.array(indices, dtype=np.int64)
+    data = np.array(data, dtype=np.float32) * idf[indices] if len(indices) else np.empty(0, dtype=np.float32)
+    row_norms = np.sqrt(np.bincount(np.repeat(np.arange(count), np.diff(indptr)), weights=data.astype(np.float64) ** 2,
+                                    minlength=count))
+    data /= np.repeat(np.where(row_norms > 0, row_norms, 1), np.diff(indptr)).astype(np.float32)
+    transposed = _transpose(indptr, indices, data, len(kept))
+
+    # Randomized SVD with one power iteration
+    dimensions = max(1, min(dimensions, len(kept), count))
+    rng = np.random.default_rng(seed)
+    sketch = _sparse_dot(indptr, indices, data, rng.standard_normal((len(kept), dimensions + 10)).astype(np.float32))
+    basis = _orthonormal(sketch)
+    basis = _orthonormal(_sparse_dot(indptr, indices, data, _sparse_dot(*transposed, basis)))
+    small = _sparse_dot(*transposed, basis).T  # basis.T @ X
+    _, _, right = np.linalg.svd(small, full_matrices=False)
+    components = right[:dimensions].T.astype(np.float32)  # Terms x dimensions
+
+    vectors = _sparse_dot(indptr, indices, data, components)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.where(norms > 0, norms, 1)
+
+    # Inverted file: about sqrt(n) clusters, trained on a sample
+    clusters = max(1, min(int(np.sqrt(count)), 4096, count))
+    sample = vectors[rng.choice(count, min(count, 50 * clusters), replace=False)] if count else vectors
+    centroids = _kmeans(sample, clusters, seed=seed) if count else np.zeros((1, dimensions), dtype=np.float32)
+    assignment = _assign(vectors, centroids)
+    rows = np.argsort(assignment, kind="stable")  # Row -> document ordinal
+    list_offsets = np.r_[0, np.cumsum(np.bincount(assignment, minlength=len(centroids)))]
+
+    # Symmetric int8 quantization with one scale per dimension
+    scale = np.abs(vectors).max(axis=0) / 127 if count else np.ones(dimensions, dtype=np.float32)
+    scale = np.where(scale > 0, scale, 1).astype(np.float32)
+    quantized = np.round(vectors[rows] / scale).astype(np.int8)
+    positions = np.empty(count, dtype=np.int32)
+    positions[rows] = np.arange(count)
+
+    path = directory
+    temp_path = f"{path}.tmp"
+    shutil.rmtree(temp_path, ignore_errors=True)
+    os.makedirs(temp_path)
+    ids = np.array([post_id.encode("utf-8") for post_id in post_ids], dtype=np.bytes_)
+    arrays = {
+        "post_ids": ids if len(ids) else ids.astype("S1"),
+        "terms": np.array([term.encode("utf-8") for term in kept], dtype=np.bytes_) if kept else np.empty(0, dtype="S1"),
+        "idf": idf,
+        "components": components,
+        "centroids": centroids,
+        "list_offsets": list_offsets.astype(np.int64),
+        "vectors": quantized,
+        "scale": scale,
+        "ordinals": rows.astype(np.int32),
+        "positions": positions,
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(temp_path, f"{name}.npy"), array)
+    with open(os.path.join(temp_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"count": count, "dimensions": dimensions, "terms": len(kept), "clusters": len(centroids),
+                   "created": time.time()}, f)
+
+    old_path = f"{path}.old"
+    if os.path.exists(path):
+        shutil.rmtree(old_path, ignore_errors=True)
+        os.replace(path, old_path)
+    os.replace(temp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    print(f"✅ Built semantic index of {count} posts ({dimensions} dimensions, {len(centroids)} clusters, "
+          f"{quantized.nbytes / 1024 / 1024:.1f} MB of vectors) in '{path}'.")
+    return path
+
+
+class SemanticIndex:
+    """Read-only, memory-mapped semantic index."""
+
+    def __init__(self, path=SEMANTIC_INDEX_DIR):
+        """
+        Args:
+            path (str): Directory written by build_semantic_index
+        """
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.arrays = {
+            name[:-4]: np.load(os.path.join(path, name), mmap_mode="r")
+            for name in os.listdir(path) if name.endswith(".npy")
+        }
+        self.post_ids = self.arrays["post_ids"]
+        self.terms = self.arrays["terms"]
+        self.vectors = self.arrays["vectors"]
+        self.list_offsets = self.arrays["list_offsets"]
+        self.ordinals = self.arrays["ordinals"]
+        self.positions = self.arrays["positions"]
+        # Small and read by every query, so kept in memory
+        self.centroids = np.array(self.arrays["centroids"])
+        self.scale = np.array(self.arrays["scale"])
+
+    def __len__(self):
+        return self.meta["count"]
+
+    def embed(self, query):
+        """
+        Project a query onto the document vector space.
+
+        Args:
+            query (str): Search query, see local_index.parse_query
+
+        Returns:
+            np.ndarray: Unit-length query vector, or None if no query term is in the vocabulary
+        """
+        optional, required, _ = parse_query(query)
+        keys = np.array([term.encode("utf-8") for term in optional | required], dtype=np.bytes_)
+        if not len(keys) or not len(self.terms):
+            return None
+        positions = np.minimum(np.searchsorted(self.terms, keys), len(self.terms) - 1)
+        positions = positions[self.terms[positions] == keys]
+        if not len(positions):
+            return None
+        vector = self.arrays["idf"][positions] @ self.arrays["components"][positions]
+        norm = np.linalg.norm(vector)
+        return (vector / norm).astype(np.float32) if norm > 0 else None
+
+    def search(self, query, k=10, probes=SEMANTIC_PROBES):
+        """
+        Find the posts most similar to a query.
+
+        Args:
+            query (str): Search query
+            k (int): Number of posts to return
+            probes (int): Clusters to scan, or None to scan every vector
+
+        Returns:
+            tuple: (document ordinals, cosine similarities), best first
+        """
+        vector = self.embed(query)
+        if vector is None or not len(self):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if probes is None or probes >= len(self.centroids):
+            rows = np.arange(len(self.vectors))
+            block = self.vectors
+        else:
+            nearest = np.argpartition(-(self.centroids @ vector), probes - 1)[:probes]
+            rows = np.concatenate([np.arange(self.list_offsets[c], self.list_offsets[c + 1]) for c in nearest])
+            block = self.vectors[rows]
+        # The scales are folded into the query, so the int8 rows are used as they are
+        similarities = block.astype(np.float32) @ (vector * self.scale)
+        k = min(k, len(similarities))
+        if not k:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top], kind="stable")]
+        return self.ordinals[rows[top]].astype(np.int64), similarities[top]
+
+    def similarity(self, query, post_ids):
+        """
+        Cosine similarity of a query with specific posts.
+
+        Args:
+            query (str): Search query
+            post_ids (list): Post IDs
+
+        Returns:
+            np.ndarray: One similarity per post, 0 for posts missing from the index
+        """
+        similarities = np.zeros(len(post_ids), dtype=np.float32)
+        vector = self.embed(query)
+        if vector is None or not len(post_ids) or not len(self):
+            return similarities
+        ordinals, found = self.post_ordinals(post_ids)
+        rows = self.positions[ordinals[found]]
+        similarities[found] = self.vectors[rows].astype(np.float32) @ (vector * self.scale)
+        return similarities
+
+    def post_ordinals(self, post_ids):
+        """
+        Map post IDs to document ordinals.
+
+        Returns:
+            tuple: (ordinals as np.ndarray, boolean mask of the IDs found in the index)
+        """
+        keys = np.array([str(post_id).encode("utf-8") for post_id in post_ids], dtype=np.bytes_)
+        if not len(keys) or not len(self.post_ids):
+            return np.zeros(len(keys), dtype=np.int64), np.zeros(len(keys), dtype=bool)
+        ordinals = np.minimum(np.searchsorted(self.post_ids, keys), len(self.post_ids) - 1)
+        return ordinals, self.post_ids[ordinals] == keys
+
+    def post_id(self, ordinal):
+        """Reddit post ID of a document."""
+        return self.post_ids[ordinal].decode("utf-8")
+
+    def memory_report(self):
+        """
+        Size in bytes of each array of the index.
+
+        Returns:
+            dict: Array name -> bytes, plus "total"
+        """
+        report = {name: int(array.nbytes) for name, array in sorted(self.arrays.items())}
+        report["total"] = sum(report.values())
+        return report
+
+
+# Index opened by get_semantic_index
+_semantic_index = None
+
+
+def open_semantic_index(directory=SEMANTIC_INDEX_DIR):
+    """
+    Memory-map the semantic index in a directory and use it for hybrid searches.
+
+    Args:
+        directory (str): Directory written by build_semantic_index
+
+    Returns:
+        SemanticIndex: The opened index
+    """
+    global _semantic_index
+    _semantic_index = SemanticIndex(directory)
+    return _semantic_index
+
+
+def get_semantic_index(directory=SEMANTIC_INDEX_DIR):
+    """
+    Return the memory-mapped semantic index, opening it on first use.
+
+    Returns:
+        SemanticIndex: The index, or None if none has been built
+    """
+    if _semantic_index is None and os.path.exists(os.path.join(directory, "meta.json")):
+        return open_semantic_index(directory)
+    return _semantic_index
+
+
+def reset_semantic_index():
+    """Drop the open semantic index, so the next search maps a rebuilt one."""
+    global _semantic_index
+    _semantic_index = None
+
+
+def main():
+    """Build the semantic index from DATA_FILE."""
+    from indexer import DATA_FILE, iter_documents, iter_posts
+
+    start = time.time()
+    build_semantic_index(iter_documents(iter_posts(DATA_FILE)))
+    print(f"✅ Done in {time.time() - start:.2f} seconds.")
+
+
+if __name__ == "__main__":
+    main()
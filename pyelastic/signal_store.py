@@ -0,0 +1,276 @@
+"""
+Ranking Signal Store
+
+Columnar side-store of the per-post numbers used for ranking: vote score,
+comment count, upvote ratio, awards, post time and global PageRank. The indexer
+writes one store per index version, as fixed-width NumPy arrays indexed by a
+dense post ordinal plus the sorted post IDs that map IDs to ordinals. The
+search service memory-maps them, so the signals of any hit set are read with
+vectorized lookups instead of from `_source.metadata` of every hit.
+"""
+
+import datetime
+import json
+import os
+import shutil
+import numpy as np
+
+# Fix for numpy float type compatibility
+np.float_ = np.float64
+
+# Directory holding one store per index version
+SIGNAL_STORE_DIR = os.getenv("SIGNAL_STORE_DIR", "./signal_store")
+
+# Stored columns and their on-disk types. Missing times and PageRank scores are NaN.
+SIGNAL_COLUMNS = {
+    "score": np.int32,
+    "num_comments": np.int32,
+    "upvote_ratio": np.float32,
+    "awards": np.int32,
+    "time": np.float64,  # Epoch seconds
+    "pagerank": np.float32,
+}
+
+
+def epoch_seconds(value):
+    """Convert a post time string to epoch seconds, or NaN if missing or malformed."""
+    if not value:
+        return np.nan
+    try:
+        parsed = datetime.datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return np.nan
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+
+def metadata_signals(metadata):
+    """
+    Read the stored signals from the metadata of one document or hit.
+
+    Args:
+        metadata (dict): Document metadata as prepared by the indexer
+
+    Returns:
+        tuple: One value per column of SIGNAL_COLUMNS, in order
+    """
+    pagerank = metadata.get("pagerank")
+    return (
+        metadata.get("score") or 0,
+        metadata.get("num_comments") or 0,
+        metadata.get("upvote_ratio") or 0.0,
+        metadata.get("awards") or 0,
+        epoch_seconds(metadata.get("time")),
+        np.nan if pagerank is None else pagerank,
+    )
+
+
+class SignalStoreWriter:
+    """
+    Collects the signals of indexed documents and writes them as a store.
+
+    A post seen several times keeps its last values, like the Elasticsearch
+    document it overwrites.
+    """
+
+    def __init__(self):
+        self.ordinals = {}
+        self.rows = []
+
+    def add(self, metadata):
+        """
+        Record the signals of one document.
+
+        Args:
+            metadata (dict): Document metadata as prepared by the indexer
+        """
+        ordinal = self.ordinals.setdefault(metadata["post_id"], len(self.ordinals))
+        row = metadata_signals(metadata)
+        if ordinal == len(self.rows):
+            self.rows.append(row)
+        else:
+            self.rows[ordinal] = row
+
+    def collect(self, documents):
+        """
+        Lazily record the signals of documents streamed to the bulk loader.
+
+        Args:
+            documents (iterable): Documents prepared by prepare_document
+
+        Yields:
+            dict: The documents, unchanged
+        """
+        for doc in documents:
+            self.add(doc["metadata"])
+            yield doc
+
+    def save(self, index_name, directory=SIGNAL_STORE_DIR):
+        """
+        Atomically write the store of an index version.
+
+        Ordinals are assigned in post ID order, so the sorted IDs double as the
+        ID to ordinal map.
+
+        Args:
+            index_name (str): Concrete index version the signals describe
+            directory (str): Directory holding the stores
+
+        Returns:
+            str: Path of the written store
+        """
+        path = os.path.join(directory, index_name)
+        temp_path = f"{path}.tmp"
+        shutil.rmtree(temp_path, ignore_errors=True)
+        os.makedirs(temp_path)
+
+        post_ids = np.array([post_id.encode("utf-8") for post_id in self.ordinals], dtype=np.bytes_)
+        if not len(post_ids):
+            post_ids = post_ids.astype("S1")
+        order = np.argsort(post_ids, kind="stable")
+        np.save(os.path.join(temp_path, "post_ids.npy"), post_ids[order])
+        for position, (name, dtype) in enumerate(SIGNAL_COLUMNS.items()):
+            column = np.array([row[position] for row in self.rows], dtype=dtype)
+            np.save(os.path.join(temp_path, f"{name}.npy"), column[order])
+        with open(os.path.join(temp_path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"index": index_name, "count": len(post_ids), "columns": list(SIGNAL_COLUMNS)}, f)
+
+        # Replace a previous store of the same version (incremental runs).
+        # Readers that still map the old files keep reading them until they reopen.
+        old_path = f"{path}.old"
+        if os.path.exists(path):
+            shutil.rmtree(old_path, ignore_errors=True)
+            os.replace(path, old_path)
+        os.replace(temp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        print(f"✅ Wrote ranking signals of {len(post_ids)} posts to '{path}'.")
+        return path
+
+
+class SignalStore:
+    """Read-only, memory-mapped signal store of one index version."""
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Directory written by SignalStoreWriter.save
+        """
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.post_ids = np.load(os.path.join(path, "post_ids.npy"), mmap_mode="r")
+        self.columns = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in SIGNAL_COLUMNS}
+
+    def __len__(self):
+        return len(self.post_ids)
+
+    def ordinals(self, post_ids):
+        """
+        Map post IDs to ordinals with a binary search over the sorted IDs.
+
+        Args:
+            post_ids (list): Post IDs (the `_id` of hits)
+
+        Returns:
+            tuple: (ordinals as np.ndarray, boolean mask of the IDs found in the store)
+        """
+        keys = np.array([str(post_id).encode("utf-8") for post_id in post_ids], dtype=np.bytes_)
+        if not len(keys) or not len(self.post_ids):
+            return np.zeros(len(keys), dtype=np.int64), np.zeros(len(keys), dtype=bool)
+        positions = np.searchsorted(self.post_ids, keys)
+        ordinals = np.minimum(positions, len(self.post_ids) - 1)
+        return ordinals, self.post_ids[ordinals] == keys
+
+    def lookup(self, hits):
+        """
+        Read the signals of a hit set.
+
+        Hits missing from the store (e.g. indexed after it was written) fall back
+        to their `_source.metadata`, if it was fetched.
+
+        Args:
+            hits (list): Hits as returned by Elasticsearch
+
+        Returns:
+            dict: One np.float64 array per column of SIGNAL_COLUMNS
+        """
+        ordinals, found = self.ordinals([hit.get('_id', '') for hit in hits])
+        if len(self.post_ids):
+            signals = {name: column[ordinals].astype(np.float64) for name, column in self.columns.items()}
+        else:
+            signals = {name: np.zeros(len(hits)) for name in SIGNAL_COLUMNS}
+        for position in np.flatnonzero(~found):
+            row = metadata_signals(hits[position].get('_source', {}).get('metadata', {}))
+            for name, value in zip(SIGNAL_COLUMNS, row):
+                signals[name][position] = value
+        return signals
+
+
+# Open stores by index version
+_stores = {}
+
+
+def get_signal_store(index_name, directory=SIGNAL_STORE_DIR):
+    """
+    Return the memory-mapped store of an index version, opening it on first use.
+
+    Args:
+        index_name (str): Concrete index version (the `_index` of hits)
+        directory (str): Directory holding the stores
+
+    Returns:
+        SignalStore: The store, or None if the version has none
+    """
+    store = _stores.get(index_name)
+    if store is None:
+        path = os.path.join(directory, index_name)
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            return None
+        store = _stores[index_name] = SignalStore(path)
+    return store
+
+
+def load_signal_stores(directory=SIGNAL_STORE_DIR):
+    """
+    Memory-map every store in the directory, e.g. at service startup.
+
+    Stores opened earlier are dropped first, so this also picks up stores
+    rewritten by the indexer.
+
+    Args:
+        directory (str): Directory holding the stores
+
+    Returns:
+        int: Number of stores opened
+    """
+    global _stores
+    stores = {}
+    if os.path.isdir(directory):
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if not name.endswith((".tmp", ".old")) and os.path.exists(os.path.join(path, "meta.json")):
+                stores[name] = SignalStore(path)
+    # Swap in one step, so concurrent searches never see a partly loaded set
+    _stores = stores
+    return len(stores)
+
+
+def signal_stores_loaded():
+    """Whether any signal store is open, so searches can skip fetching `_source` for ranking."""
+    return bool(_stores)
+
+
+def remove_signal_store(index_name, directory=SIGNAL_STORE_DIR):
+    """
+    Delete the store of an index version, e.g. when the version is pruned.
+
+    Args:
+        index_name (str): Concrete index version, or "*" to delete every store
+        directory (str): Directory holding the stores
+    """
+    if index_name == "*":
+        shutil.rmtree(directory, ignore_errors=True)
+        _stores.clear()
+        return
+    shutil.rmtree(os.path.join(directory, index_name), ignore_errors=True)
+    _stores.pop(index_name, None)
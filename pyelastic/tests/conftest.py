@@ -0,0 +1,9 @@
+"""
+Shared pytest setup: the service modules live flat in pyelastic/ and import
+each other by module name, as when they are run from that directory.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,17 @@
+"""
+Background indexing jobs must not stall the search API.
+"""
+
+from benchmark import search_during_indexing
+
+# Highest accepted /search latency while a job is running, in seconds
+SEARCH_LATENCY_BOUND = 0.5
+
+
+def test_search_stays_responsive_while_indexing():
+    job, latencies, errors = search_during_indexing(n=2000, bulk_delay=0.3)
+    assert job["status"] == "succeeded", job["message"]
+    assert job["docs_processed"] == 2000
+    assert latencies, "the indexing job finished before any search was sent"
+    assert not errors
+    assert max(latencies) < SEARCH_LATENCY_BOUND
@@ -0,0 +1,36 @@
+"""
+Parity of the vectorized PageRank with the original pure-Python loop.
+"""
+
+import numpy as np
+import pytest
+
+from benchmark import _legacy_pagerank, make_synthetic_hits
+from pagerank import calculate_pagerank_score
+
+
+def _hits_without_comments(n):
+    """Hits that are all unlinked, so every post spreads its score evenly."""
+    return [{"_id": str(i), "_source": {"metadata": {"num_comments": 0, "score": i}}} for i in range(n)]
+
+
+@pytest.mark.parametrize("hits", [make_synthetic_hits(2), make_synthetic_hits(50), make_synthetic_hits(200, seed=7),
+                                  _hits_without_comments(20)])
+def test_scores_match_the_legacy_loop(hits):
+    expected = _legacy_pagerank(hits)
+    actual = calculate_pagerank_score(hits, tolerance=0)
+    assert actual.keys() == expected.keys()
+    assert np.allclose([actual[post_id] for post_id in expected], list(expected.values()), rtol=1e-9)
+
+
+def test_early_exit_keeps_the_legacy_ranking():
+    hits = make_synthetic_hits(200)
+    expected = _legacy_pagerank(hits)
+    converged = calculate_pagerank_score(hits)
+    # Early exit may only reorder posts whose legacy scores are tied
+    ranked = [converged[post_id] for post_id in sorted(expected, key=expected.get, reverse=True)]
+    assert all(a >= b * (1 - 1e-9) for a, b in zip(ranked, ranked[1:]))
+
+
+def test_no_hits():
+    assert calculate_pagerank_score([]) == {}